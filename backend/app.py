@@ -11,6 +11,7 @@ Minimal Flask app exposing /optimize endpoint with SocketIO support for real-tim
 from flask import Flask, request, jsonify
 from flask_socketio import SocketIO
 from backend.optimization.optimization_run import run_optimization
+from backend.optimization.jobcard_store import load_job_card_store
 from backend.orchestrator import run_full_schedule_optimization
 import os
 
@@ -24,16 +25,29 @@ def optimize():
     jobcards = payload.get("jobcards_csv")
     model = payload.get("model_path")
     min_peak = int(payload.get("min_peak", 18))
-    res = run_optimization(trainset_csv=trainsets, jobcards_csv=jobcards, model_path=model, min_peak_trainsets=min_peak)
+    plan_night_slots = bool(payload.get("plan_night_slots", False))
+    train_data = payload.get("train_data_csv", "data/kmrl_train_data.csv")
+    job_store = load_job_card_store(jobcards) if jobcards else None
+    res = run_optimization(trainset_csv=trainsets, jobcards_csv=jobcards, model_path=model, min_peak_trainsets=min_peak,
+                           job_store=job_store, train_data_csv=train_data, plan_night_slots=plan_night_slots)
     details = res.get("details")
     if hasattr(details, "to_dict"):
         details = details.to_dict(orient="records")
-    return jsonify({
+    response = {
         "status": res.get("pulp_status"),
         "objective": res.get("objective_value"),
         "selected_trainsets": res.get("selected_trainsets"),
         "details": details
-    })
+    }
+    if "night_slots" in res:
+        slots = res["night_slots"]
+        response["night_slots"] = {
+            "status": slots["status"],
+            "held_inspection": slots["held_inspection"],
+            "held_cleaning": slots["held_cleaning"],
+            "jobs": slots["jobs"].to_dict(orient="records")
+        }
+    return jsonify(response)
 
 # Add these imports at the top of app.py
 
@@ -160,6 +174,42 @@ def get_schedule_status():
         }), 500
 
 
+JOBCARDS_CSV = "data/jobcards.csv"
+
+@app.route('/api/jobcards/<train_id>', methods=['GET'])
+def get_jobcard_counts(train_id):
+    """Job-card counts of a trainset by status, priority and component"""
+    store = load_job_card_store(JOBCARDS_CSV)
+    if store is None:
+        return jsonify({"status": "error", "message": f"{JOBCARDS_CSV} not found"}), 404
+    return jsonify({"train_id": train_id, **store.summary(train_id)}), 200
+
+@app.route('/api/jobcards', methods=['POST'])
+def open_jobcard():
+    """Open (or update) a job card: job_id, train_id, priority, component, critical"""
+    data = request.get_json() or {}
+    if not data.get('job_id') or not data.get('train_id'):
+        return jsonify({"status": "error", "message": "job_id and train_id are required"}), 400
+    store = load_job_card_store(JOBCARDS_CSV)
+    if store is None:
+        return jsonify({"status": "error", "message": f"{JOBCARDS_CSV} not found"}), 404
+    store.open_card(data['job_id'], data['train_id'], data.get('priority', 'unknown'),
+                    data.get('component', 'other'), bool(data.get('critical', False)), data.get('status', 'open'))
+    return jsonify({"status": "success", "train_id": data['train_id'], **store.summary(data['train_id'])}), 200
+
+@app.route('/api/jobcards/<job_id>/close', methods=['POST'])
+def close_jobcard(job_id):
+    store = load_job_card_store(JOBCARDS_CSV)
+    if store is None:
+        return jsonify({"status": "error", "message": f"{JOBCARDS_CSV} not found"}), 404
+    try:
+        store.close_card(job_id)
+    except KeyError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+    train_id = store.cards[job_id].train_id
+    return jsonify({"status": "success", "train_id": train_id, **store.summary(train_id)}), 200
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     socketio.run(app, host="0.0.0.0", port=port, debug=True)
@@ -2,13 +2,82 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import xgboost as xgb
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, mean_squared_error
 import joblib
+import time
 import warnings
+from dataclasses import dataclass
+from typing import List, Optional
+from .forecast_cache import ForecastCache
+from .feature_store import FeatureStore, PEAK_HOURS, DELAY_FEATURES, DEMAND_FEATURES
+from .standby_index import StandbyIndex
 warnings.filterwarnings('ignore')
 
+# XGBoost overrides per training profile. 'fast' builds histogram trees on a
+# fixed thread budget and early-stops on the held-out split, so n_estimators
+# is only an upper bound.
+TRAINING_PROFILES = {
+    'default': {},
+    'fast': {
+        'tree_method': 'hist',
+        'max_bin': 128,
+        'n_jobs': 2,
+        'n_estimators': 500,
+        'early_stopping_rounds': 20
+    }
+}
+
+class WallClockBudget(xgb.callback.TrainingCallback):
+    """Stop boosting once a shared wall-clock deadline has passed"""
+    def __init__(self, deadline):
+        super().__init__()
+        self.deadline = deadline
+    
+    def after_iteration(self, model, epoch, evals_log):
+        return time.time() >= self.deadline
+
+@dataclass
+class DemandForecast:
+    """Array-backed hourly demand forecast (one row per route, one column per hour)"""
+    routes: List[str]
+    timestamps: np.ndarray
+    predicted: np.ndarray
+    lower_bound: np.ndarray
+    upper_bound: np.ndarray
+    confidence: float = 0.85
+    
+    band = 0.15  # +/- 15% confidence band
+    
+    def _row(self, route: Optional[str]):
+        if route is None:
+            predicted = self.predicted.mean(axis=0).astype(np.int32)
+            return (predicted,
+                    (predicted * (1 - self.band)).astype(np.int32),
+                    (predicted * (1 + self.band)).astype(np.int32))
+        i = self.routes.index(route)
+        return self.predicted[i], self.lower_bound[i], self.upper_bound[i]
+    
+    def _labels(self):
+        return pd.DatetimeIndex(self.timestamps).strftime('%Y-%m-%d %H:%M')
+    
+    def to_records(self, route: Optional[str] = None):
+        """Per-hour records for one route, or the network average when route is None"""
+        predicted, _, _ = self._row(route)
+        return [
+            {'datetime': label, 'predicted_demand': int(value), 'confidence': self.confidence}
+            for label, value in zip(self._labels(), predicted)
+        ]
+    
+    def confidence_intervals(self, route: Optional[str] = None):
+        """Confidence bands in the same format as SmartMetroAI.get_confidence_intervals"""
+        predicted, lower, upper = self._row(route)
+        return [
+            {'datetime': label, 'lower_bound': int(lo), 'upper_bound': int(hi), 'prediction': int(value)}
+            for label, value, lo, hi in zip(self._labels(), predicted, lower, upper)
+        ]
+
 class SmartMetroAI:
     def __init__(self):
         self.delay_model = None
@@ -17,242 +86,229 @@ class SmartMetroAI:
         self.readiness_model = None
         
         self.scaler = StandardScaler()
-        self.label_encoders = {}
+        self.features = FeatureStore()
         
         self.model_performance = {}
         
-    def train_models(self, schedules_df, trains_df, maintenance_df):
-        """Train all AI models with comprehensive data"""
-        print("Training advanced AI models...")
+        # Bumped on every (re)train so cached forecasts from older models are never served
+        self.model_version = 0
+        self.forecast_cache = ForecastCache()
+        
+        # Deployable trains ordered by readiness, kept current via update_train_status
+        # (or sync_train_statuses, which diffs a fleet frame against _fleet_state)
+        self.standby_index = StandbyIndex()
+        self._fleet_state = {}
+        
+    def _invalidate_forecasts(self):
+        self.model_version += 1
+        self.forecast_cache.clear()
+        
+    def train_models(self, schedules_df, trains_df, maintenance_df, profile='default', n_jobs=None, time_budget=None):
+        """Train all AI models with comprehensive data
+        
+        profile selects XGBoost settings from TRAINING_PROFILES; n_jobs overrides
+        the profile's thread budget and time_budget (seconds) caps total boosting time.
+        """
+        if profile not in TRAINING_PROFILES:
+            raise ValueError(f"Unknown training profile '{profile}' (expected one of {list(TRAINING_PROFILES)})")
+        print(f"Training advanced AI models ({profile} profile)...")
+        
+        deadline = time.time() + time_budget if time_budget else None
+        
+        def build(estimator, **params):
+            params.update(TRAINING_PROFILES[profile])
+            if n_jobs is not None:
+                params['n_jobs'] = n_jobs
+            if deadline is not None:
+                params['callbacks'] = [WallClockBudget(deadline)]
+            return estimator(learning_rate=0.1, random_state=42, **params)
+        
+        def fit(model, X_train, y_train, X_test, y_test):
+            early_stopping = model.get_params().get('early_stopping_rounds')
+            if early_stopping:
+                model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
+            else:
+                model.fit(X_train, y_train)
+            stats = self._iteration_stats(model)
+            
+            # Early stopping and the wall-clock budget govern this fit only: later refits
+            # (incremental_training) get neither, and reuse the rounds early stopping kept
+            reset = {'early_stopping_rounds': None, 'callbacks': None}
+            if early_stopping and stats['best_iteration'] is not None:
+                reset['n_estimators'] = stats['best_iteration'] + 1
+            model.set_params(**reset)
+            return stats
+        
+        # Delay and demand features come from one snapshot, released once training is done
+        snapshot_id = ('training', self.model_version)
         
         # Prepare features for delay prediction
-        delay_features = self._prepare_delay_features(schedules_df)
+        X_delay, y_delay = self._prepare_delay_features(schedules_df, snapshot_id)
         
         # Train XGBoost delay prediction model
-        X_delay = delay_features.drop(['delay_minutes', 'train_id'], axis=1, errors='ignore')
-        y_delay = delay_features['delay_minutes'].fillna(0)
-        
         X_train, X_test, y_train, y_test = train_test_split(
             X_delay, y_delay, test_size=0.2, random_state=42
         )
         
-        self.delay_model = xgb.XGBRegressor(
-            n_estimators=100,
-            learning_rate=0.1,
-            max_depth=6,
-            random_state=42
-        )
+        self.delay_model = build(xgb.XGBRegressor, n_estimators=100, max_depth=6)
         
-        self.delay_model.fit(X_train, y_train)
+        delay_iterations = fit(self.delay_model, X_train, y_train, X_test, y_test)
         delay_pred = self.delay_model.predict(X_test)
         delay_rmse = np.sqrt(mean_squared_error(y_test, delay_pred))
         
         self.model_performance['delay_prediction'] = {
             'rmse': delay_rmse,
-            'accuracy': 1 - (delay_rmse / y_test.std())
+            'accuracy': 1 - (delay_rmse / np.std(y_test, ddof=1)),
+            **delay_iterations
         }
         
         # Train demand forecasting model
-        demand_features = self._prepare_demand_features(schedules_df)
-        
-        X_demand = demand_features.drop(['passenger_load', 'train_id'], axis=1, errors='ignore')
-        y_demand = demand_features['passenger_load'].fillna(0)
+        X_demand, y_demand = self._prepare_demand_features(schedules_df, snapshot_id)
         
         X_train_d, X_test_d, y_train_d, y_test_d = train_test_split(
             X_demand, y_demand, test_size=0.2, random_state=42
         )
         
-        self.demand_model = xgb.XGBRegressor(
-            n_estimators=150,
-            learning_rate=0.1,
-            max_depth=8,
-            random_state=42
-        )
+        self.demand_model = build(xgb.XGBRegressor, n_estimators=150, max_depth=8)
         
-        self.demand_model.fit(X_train_d, y_train_d)
+        demand_iterations = fit(self.demand_model, X_train_d, y_train_d, X_test_d, y_test_d)
         demand_pred = self.demand_model.predict(X_test_d)
         demand_rmse = np.sqrt(mean_squared_error(y_test_d, demand_pred))
         
         self.model_performance['demand_forecasting'] = {
             'rmse': demand_rmse,
-            'accuracy': 1 - (demand_rmse / y_test_d.std())
+            'accuracy': 1 - (demand_rmse / np.std(y_test_d, ddof=1)),
+            **demand_iterations
         }
         
         # Train maintenance prediction model
-        maintenance_features = self._prepare_maintenance_features(trains_df, maintenance_df)
+        X_maint, y_maint = self._prepare_maintenance_features(trains_df, maintenance_df, snapshot_id)
         
-        if not maintenance_features.empty:
-            X_maint = maintenance_features.drop(['needs_maintenance', 'train_id'], axis=1, errors='ignore')
-            y_maint = maintenance_features['needs_maintenance']
-            
+        if len(X_maint):
             X_train_m, X_test_m, y_train_m, y_test_m = train_test_split(
                 X_maint, y_maint, test_size=0.2, random_state=42
             )
             
-            self.maintenance_model = xgb.XGBClassifier(
-                n_estimators=100,
-                learning_rate=0.1,
-                max_depth=6,
-                random_state=42
-            )
+            self.maintenance_model = build(xgb.XGBClassifier, n_estimators=100, max_depth=6)
             
-            self.maintenance_model.fit(X_train_m, y_train_m)
+            maint_iterations = fit(self.maintenance_model, X_train_m, y_train_m, X_test_m, y_test_m)
             maint_pred = self.maintenance_model.predict(X_test_m)
             maint_accuracy = accuracy_score(y_test_m, maint_pred)
             
             self.model_performance['maintenance_prediction'] = {
-                'accuracy': maint_accuracy
+                'accuracy': maint_accuracy,
+                **maint_iterations
             }
         
+        self.model_performance['training_profile'] = profile
+        self.features.release(snapshot_id)
+        self._invalidate_forecasts()
         print(f"AI model training completed. Performance: {self.model_performance}")
-        
-    def _prepare_delay_features(self, schedules_df):
-        """Prepare features for delay prediction"""
-        features = schedules_df.copy()
-        
-        # Time-based features
-        features['scheduled_departure'] = pd.to_datetime(features['scheduled_departure'])
-        features['hour'] = features['scheduled_departure'].dt.hour
-        features['day_of_week'] = features['scheduled_departure'].dt.dayofweek
-        features['month'] = features['scheduled_departure'].dt.month
-        
-        # Route encoding
-        if 'route' not in self.label_encoders:
-            self.label_encoders['route'] = LabelEncoder()
-            features['route_encoded'] = self.label_encoders['route'].fit_transform(features['route'].fillna('Unknown'))
-        else:
-            features['route_encoded'] = self.label_encoders['route'].transform(features['route'].fillna('Unknown'))
-        
-        # Weather encoding
-        if 'weather_condition' in features.columns:
-            if 'weather' not in self.label_encoders:
-                self.label_encoders['weather'] = LabelEncoder()
-                features['weather_encoded'] = self.label_encoders['weather'].fit_transform(
-                    features['weather_condition'].fillna('Clear')
-                )
-            else:
-                features['weather_encoded'] = self.label_encoders['weather'].transform(
-                    features['weather_condition'].fillna('Clear')
-                )
-        else:
-            features['weather_encoded'] = 0
-        
-        # Passenger load normalization
-        features['passenger_load'] = features['passenger_load'].fillna(0)
-        
-        # Select final features
-        final_features = [
-            'train_id', 'delay_minutes', 'hour', 'day_of_week', 'month',
-            'route_encoded', 'weather_encoded', 'passenger_load'
-        ]
-        
-        return features[final_features].fillna(0)
     
-    def _prepare_demand_features(self, schedules_df):
-        """Prepare features for demand forecasting"""
-        features = schedules_df.copy()
-        
-        # Time-based features
-        features['scheduled_departure'] = pd.to_datetime(features['scheduled_departure'])
-        features['hour'] = features['scheduled_departure'].dt.hour
-        features['day_of_week'] = features['scheduled_departure'].dt.dayofweek
-        features['month'] = features['scheduled_departure'].dt.month
-        features['is_weekend'] = features['day_of_week'].isin([5, 6]).astype(int)
-        features['is_peak_hour'] = features['hour'].isin([7, 8, 9, 17, 18, 19]).astype(int)
-        
-        # Route encoding
-        if 'route' not in self.label_encoders:
-            self.label_encoders['route'] = LabelEncoder()
-            features['route_encoded'] = self.label_encoders['route'].fit_transform(features['route'].fillna('Unknown'))
-        else:
-            features['route_encoded'] = self.label_encoders['route'].transform(features['route'].fillna('Unknown'))
-        
-        # Historical demand features (rolling averages)
-        features = features.sort_values('scheduled_departure')
-        features['historical_demand'] = features.groupby('route')['passenger_load'].shift(1).fillna(0)
-        features['demand_trend'] = features.groupby('route')['passenger_load'].rolling(7).mean().reset_index(0, drop=True).fillna(0)
-        
-        final_features = [
-            'train_id', 'passenger_load', 'hour', 'day_of_week', 'month',
-            'is_weekend', 'is_peak_hour', 'route_encoded', 
-            'historical_demand', 'demand_trend'
-        ]
-        
-        return features[final_features].fillna(0)
+    @staticmethod
+    def _iteration_stats(model):
+        """Boosting rounds actually built and the early-stopping best iteration"""
+        stats = {'n_estimators': model.get_booster().num_boosted_rounds()}
+        try:
+            stats['best_iteration'] = int(model.best_iteration)
+        except AttributeError:
+            stats['best_iteration'] = None
+        return stats
+        
+    def _prepare_delay_features(self, schedules_df, snapshot_id=None):
+        """Prepare features for delay prediction (views over the shared feature store)"""
+        snapshot = self.features.schedule_features(schedules_df, snapshot_id)
+        return snapshot.view(DELAY_FEATURES), snapshot.targets['delay_minutes']
     
-    def _prepare_maintenance_features(self, trains_df, maintenance_df):
+    def _prepare_demand_features(self, schedules_df, snapshot_id=None):
+        """Prepare features for demand forecasting (views over the shared feature store)"""
+        snapshot = self.features.schedule_features(schedules_df, snapshot_id)
+        return snapshot.view(DEMAND_FEATURES), snapshot.targets['passenger_load']
+    
+    def _prepare_maintenance_features(self, trains_df, maintenance_df, snapshot_id=None):
         """Prepare features for maintenance prediction"""
         if maintenance_df.empty:
-            return pd.DataFrame()
-        
-        features = trains_df.copy()
-        
-        # Calculate days since last maintenance
-        features['last_maintenance'] = pd.to_datetime(features['last_maintenance'])
-        features['days_since_maintenance'] = (datetime.now() - features['last_maintenance']).dt.days
-        
-        # Operational features
-        features['energy_consumption'] = features['energy_consumption'].fillna(0)
-        features['mechanical_score'] = features['mechanical_score'].fillna(0.8)
+            return np.empty((0, 3), dtype=np.float32), np.empty(0, dtype=np.int8)
         
-        # Create target variable (needs maintenance in next 30 days)
-        features['next_maintenance'] = pd.to_datetime(features['next_maintenance'])
-        features['days_until_maintenance'] = (features['next_maintenance'] - datetime.now()).dt.days
-        features['needs_maintenance'] = (features['days_until_maintenance'] <= 30).astype(int)
-        
-        final_features = [
-            'train_id', 'needs_maintenance', 'days_since_maintenance',
-            'energy_consumption', 'mechanical_score'
-        ]
-        
-        return features[final_features].fillna(0)
+        snapshot = self.features.maintenance_features(trains_df, snapshot_id=snapshot_id)
+        return snapshot.matrix, snapshot.targets['needs_maintenance']
     
-    def predict_demand(self, days_ahead=7, route='all'):
-        """Predict passenger demand with confidence intervals"""
+    def forecast_demand(self, days_ahead=7, routes=None, start=None):
+        """Forecast hourly demand for every route in a single batched model call"""
         if self.demand_model is None:
             return {'error': 'Demand model not trained'}
         
-        # Generate future time points
-        future_dates = pd.date_range(
-            start=datetime.now(),
-            periods=days_ahead * 24,  # Hourly predictions
-            freq='H'
+        if routes is None or routes == 'all':
+            routes = self.features.vocabulary('route')
+        elif isinstance(routes, str):
+            routes = [routes]
+        
+        route_codes = self.features.codes('route', routes)
+        if (route_codes < 0).any():
+            return {'error': f'Unknown route(s): {routes}'}
+        
+        # Hourly time grid shared by all routes
+        start = pd.Timestamp(start if start is not None else datetime.now()).floor('h')
+        timestamps = pd.date_range(start=start, periods=days_ahead * 24, freq='h')
+        n_hours = len(timestamps)
+        n_routes = len(routes)
+        
+        hour = timestamps.hour.to_numpy()
+        day_of_week = timestamps.dayofweek.to_numpy()
+        
+        # Route x hour feature matrix, rows ordered route-major
+        col = {name: i for i, name in enumerate(DEMAND_FEATURES)}
+        X = np.empty((n_routes * n_hours, len(DEMAND_FEATURES)), dtype=np.float32)
+        X[:, col['hour']] = np.tile(hour, n_routes)
+        X[:, col['day_of_week']] = np.tile(day_of_week, n_routes)
+        X[:, col['month']] = np.tile(timestamps.month.to_numpy(), n_routes)
+        X[:, col['is_weekend']] = np.tile(np.isin(day_of_week, [5, 6]), n_routes)
+        X[:, col['is_peak_hour']] = np.tile(np.isin(hour, PEAK_HOURS), n_routes)
+        X[:, col['route_encoded']] = np.repeat(route_codes, n_hours)
+        X[:, col['historical_demand']] = 150  # Average historical
+        X[:, col['demand_trend']] = 150
+        
+        predicted = self.demand_model.predict(X).reshape(n_routes, n_hours)
+        predicted = np.maximum(predicted, 0).astype(np.int32)
+        
+        return DemandForecast(
+            routes=routes,
+            timestamps=timestamps.to_numpy(),
+            predicted=predicted,
+            lower_bound=(predicted * (1 - DemandForecast.band)).astype(np.int32),
+            upper_bound=(predicted * (1 + DemandForecast.band)).astype(np.int32)
         )
+    
+    def predict_demand(self, days_ahead=7, route='all'):
+        """Predict passenger demand with confidence intervals"""
+        cache_key = self.forecast_cache.key('demand', self.model_version, route, days_ahead)
+        cached = self.forecast_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        predictions = []
-        for date in future_dates:
-            # Create feature vector
-            features = {
-                'hour': date.hour,
-                'day_of_week': date.dayofweek,
-                'month': date.month,
-                'is_weekend': int(date.dayofweek in [5, 6]),
-                'is_peak_hour': int(date.hour in [7, 8, 9, 17, 18, 19]),
-                'route_encoded': 0,  # Default route
-                'historical_demand': 150,  # Average historical
-                'demand_trend': 150
-            }
-            
-            feature_vector = np.array([[features[f] for f in [
-                'hour', 'day_of_week', 'month', 'is_weekend', 
-                'is_peak_hour', 'route_encoded', 'historical_demand', 'demand_trend'
-            ]]])
-            
-            demand_pred = self.demand_model.predict(feature_vector)[0]
-            
-            predictions.append({
-                'datetime': date.strftime('%Y-%m-%d %H:%M'),
-                'predicted_demand': max(0, int(demand_pred)),
-                'confidence': 0.85  # Model confidence
-            })
+        forecast = self.forecast_demand(days_ahead, routes=route)
+        if isinstance(forecast, dict):
+            return forecast
         
-        return predictions
+        # Network-wide view averages the per-route forecasts
+        return self.forecast_cache.put(cache_key, forecast.to_records(None if route == 'all' else route))
     
     def predict_delays(self, route='Red Line', time_of_day='08:00'):
         """Predict delays with contributing factors"""
         if self.delay_model is None:
             return {'error': 'Delay model not trained'}
         
+        cache_key = self.forecast_cache.key('delay', self.model_version, route, time_of_day)
+        cached = self.forecast_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Route and weather codes from the same vocabularies the model was trained on
+        route_code = self.features.codes('route', [route])[0]
+        if route_code < 0:
+            return {'error': f'Unknown route: {route}'}
+        weather_code = max(self.features.codes('weather', ['Clear'])[0], 0)
+        
         # Parse time
         hour = int(time_of_day.split(':')[0])
         
@@ -261,21 +317,18 @@ class SmartMetroAI:
             'hour': hour,
             'day_of_week': datetime.now().weekday(),
             'month': datetime.now().month,
-            'route_encoded': 0,  # Default encoding
-            'weather_encoded': 0,  # Clear weather
+            'route_encoded': route_code,
+            'weather_encoded': weather_code,  # Clear weather
             'passenger_load': 150  # Average load
         }
         
-        feature_vector = np.array([[features[f] for f in [
-            'hour', 'day_of_week', 'month', 'route_encoded', 
-            'weather_encoded', 'passenger_load'
-        ]]])
+        feature_vector = np.array([[features[f] for f in DELAY_FEATURES]], dtype=np.float32)
         
         delay_pred = self.delay_model.predict(feature_vector)[0]
         
         # Determine contributing factors
         factors = []
-        if hour in [7, 8, 9, 17, 18, 19]:
+        if hour in PEAK_HOURS:
             factors.append("Peak hour traffic")
         if datetime.now().weekday() < 5:
             factors.append("Weekday operations")
@@ -285,12 +338,12 @@ class SmartMetroAI:
             suggestions.append("Deploy additional trains")
             suggestions.append("Optimize signal timing")
         
-        return {
+        return self.forecast_cache.put(cache_key, {
             'delay': max(0, delay_pred),
             'confidence': 0.82,
             'factors': factors,
             'suggestions': suggestions
-        }
+        })
     
     def predict_maintenance(self, train_data):
         """Predict maintenance needs for a specific train"""
@@ -421,8 +474,43 @@ class SmartMetroAI:
         
         return status_explanation
     
-    def emergency_response(self, scenario_type, affected_trains, affected_routes, available_trains):
-        """AI-driven emergency response system"""
+    def update_train_status(self, train_id, status, readiness_score, depot=None, record=None):
+        """Keep the standby index in step with a train status change"""
+        self.standby_index.update(train_id, readiness_score, depot=depot, status=status, record=record)
+    
+    def sync_train_statuses(self, trains_df, id_field='train_id', readiness_field='readiness_score',
+                            status_field='status', depot_field='location'):
+        """Push status/readiness changes from a fleet frame into the standby index
+        
+        Only trains whose status, readiness or depot changed since the last sync
+        are updated, so a pipeline run costs O(changes log n) index work.
+        Returns the number of trains updated.
+        """
+        depots = trains_df[depot_field] if depot_field in trains_df.columns else [None] * len(trains_df)
+        changed = [
+            (position, train_id, state)
+            for position, (train_id, state) in enumerate(zip(
+                trains_df[id_field].astype(str),
+                zip(trains_df[status_field], trains_df[readiness_field].astype(float), depots)
+            ))
+            if self._fleet_state.get(train_id) != state
+        ]
+        for position, train_id, (status, readiness, depot) in changed:
+            self._fleet_state[train_id] = (status, readiness, depot)
+            record = trains_df.iloc[position].to_dict() if status in self.standby_index.deployable_statuses else None
+            self.update_train_status(train_id, status, readiness, depot=depot, record=record)
+        return len(changed)
+    
+    def emergency_response(self, scenario_type, affected_trains, affected_routes, available_trains=None, depot=None):
+        """AI-driven emergency response system
+        
+        available_trains may be a DataFrame of deployable trains, a StandbyIndex,
+        or None to use the index maintained through update_train_status.
+        """
+        if available_trains is None:
+            available_trains = self.standby_index
+        elif not isinstance(available_trains, StandbyIndex):
+            available_trains = StandbyIndex.from_frame(available_trains)
         
         response = {
             'scenario': scenario_type,
@@ -435,12 +523,10 @@ class SmartMetroAI:
         
         if scenario_type == 'train_breakdown':
             # Find best backup trains
-            backup_candidates = available_trains[
-                available_trains['readiness_score'] > 0.8
-            ].sort_values('readiness_score', ascending=False)
+            backup_candidates = available_trains.best(2, above=0.8, depot=depot)
             
-            if not backup_candidates.empty:
-                response['backup_trains'] = backup_candidates.head(2).to_dict('records')
+            if backup_candidates:
+                response['backup_trains'] = backup_candidates
                 response['immediate_actions'].append("Deploy backup trains from ready pool")
             
             response['immediate_actions'].extend([
@@ -451,7 +537,7 @@ class SmartMetroAI:
             
         elif scenario_type == 'high_demand':
             # Deploy all available trains
-            response['backup_trains'] = available_trains.to_dict('records')
+            response['backup_trains'] = available_trains.best()
             response['immediate_actions'].extend([
                 "Deploy all available trains",
                 "Reduce service intervals",
@@ -460,10 +546,7 @@ class SmartMetroAI:
             
         elif scenario_type == 'weather_disruption':
             # Conservative approach for safety
-            high_readiness_trains = available_trains[
-                available_trains['readiness_score'] > 0.9
-            ]
-            response['backup_trains'] = high_readiness_trains.to_dict('records')
+            response['backup_trains'] = available_trains.best(above=0.9)
             response['immediate_actions'].extend([
                 "Reduce operational speed for safety",
                 "Deploy only highest readiness trains",
@@ -526,12 +609,15 @@ class SmartMetroAI:
     
     def get_confidence_intervals(self, forecast):
         """Calculate confidence intervals for predictions"""
+        if isinstance(forecast, DemandForecast):
+            return forecast.confidence_intervals()
+        
         confidence_intervals = []
         
         for pred in forecast:
             demand = pred['predicted_demand']
-            lower_bound = max(0, int(demand * 0.85))  # 15% lower
-            upper_bound = int(demand * 1.15)          # 15% higher
+            lower_bound = max(0, int(demand * (1 - DemandForecast.band)))
+            upper_bound = int(demand * (1 + DemandForecast.band))
             
             confidence_intervals.append({
                 'datetime': pred['datetime'],
@@ -571,6 +657,10 @@ class SmartMetroAI:
         """Get current model performance metrics"""
         return self.model_performance
     
+    def get_cache_metrics(self):
+        """Get forecast cache hit/miss metrics"""
+        return {'model_version': self.model_version, **self.forecast_cache.stats()}
+    
     def incremental_training(self, new_data, data_type):
         """Perform incremental training with new data"""
         # Simplified incremental training
@@ -580,20 +670,18 @@ class SmartMetroAI:
         if data_type == 'schedules' and self.delay_model is not None:
             # Update delay model with new schedule data
             try:
-                delay_features = self._prepare_delay_features(new_data)
-                if not delay_features.empty:
-                    X_new = delay_features.drop(['delay_minutes', 'train_id'], axis=1, errors='ignore')
-                    y_new = delay_features['delay_minutes'].fillna(0)
-                    
+                X_new, y_new = self._prepare_delay_features(new_data)
+                if len(X_new):
                     # Simple incremental update
                     self.delay_model.fit(X_new, y_new)
+                    self._invalidate_forecasts()
                     print("Delay model updated successfully")
             except Exception as e:
                 print(f"Incremental training error: {e}")
     
-    def retrain_models(self, schedules_df, trains_df, maintenance_df):
+    def retrain_models(self, schedules_df, trains_df, maintenance_df, profile='default', n_jobs=None, time_budget=None):
         """Complete model retraining"""
-        self.train_models(schedules_df, trains_df, maintenance_df)
+        self.train_models(schedules_df, trains_df, maintenance_df, profile=profile, n_jobs=n_jobs, time_budget=time_budget)
         
         return {
             'delay_model': 'retrained',
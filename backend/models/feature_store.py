@@ -0,0 +1,166 @@
+"""
+backend/models/feature_store.py
+
+Shared feature store for SmartMetroAI: parses timestamps and derives calendar,
+route and weather features once per data snapshot.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional
+import numpy as np
+import pandas as pd
+
+PEAK_HOURS = [7, 8, 9, 17, 18, 19]
+
+# Column layout of the schedule feature block. The delay and demand feature
+# sets are both contiguous ranges of it, so each model gets a slice view
+# instead of a copy.
+SCHEDULE_COLUMNS = [
+    'weather_encoded', 'passenger_load',
+    'hour', 'day_of_week', 'month', 'route_encoded',
+    'is_weekend', 'is_peak_hour', 'historical_demand', 'demand_trend'
+]
+DELAY_FEATURES = SCHEDULE_COLUMNS[0:6]
+DEMAND_FEATURES = SCHEDULE_COLUMNS[2:10]
+
+MAINTENANCE_COLUMNS = ['days_since_maintenance', 'energy_consumption', 'mechanical_score']
+MAINTENANCE_FEATURES = MAINTENANCE_COLUMNS
+
+@dataclass
+class FeatureSnapshot:
+    """Derived features for one input frame, stored as a column-major float32 block"""
+    columns: List[str]
+    matrix: np.ndarray
+    train_id: np.ndarray
+    targets: Dict[str, np.ndarray]
+
+    def view(self, features: List[str]) -> np.ndarray:
+        """Zero-copy view over a contiguous run of feature columns"""
+        start = self.columns.index(features[0])
+        if self.columns[start:start + len(features)] != list(features):
+            raise KeyError(f'Features {features} are not a contiguous block of the snapshot')
+        return self.matrix[:, start:start + len(features)]
+
+    def column(self, name: str) -> np.ndarray:
+        return self.matrix[:, self.columns.index(name)]
+
+    def frame(self, features: List[str], targets: List[str] = ()) -> pd.DataFrame:
+        """DataFrame with train_id, the given targets and features (for inspection/export)"""
+        data = {'train_id': self.train_id}
+        data.update({t: self.targets[t] for t in targets})
+        data.update({f: self.column(f) for f in features})
+        return pd.DataFrame(data)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+class FeatureStore:
+    """Derives SmartMetroAI features once per snapshot with shared encodings.
+
+    Route and weather vocabularies are fixed the first time they are seen, so
+    every model (and every later snapshot) uses identical integer codes.
+    Values outside the vocabulary are encoded as -1.
+
+    Snapshots are only reused when the caller names them with a snapshot_id
+    (e.g. one training run deriving delay and demand features from the same
+    frame) and are dropped with release(); the input frame itself is never
+    retained, so in-place edits between calls are always picked up.
+    """
+
+    def __init__(self):
+        self.categories: Dict[str, pd.Index] = {}
+        self._snapshots: Dict[Hashable, FeatureSnapshot] = {}
+
+    def _categorical(self, name: str, values: pd.Series, default: str) -> pd.Categorical:
+        values = values.fillna(default)
+        if name not in self.categories:
+            self.categories[name] = pd.Index(sorted(values.unique()))
+        return pd.Categorical(values, categories=self.categories[name])
+
+    def vocabulary(self, name: str) -> List[str]:
+        return list(self.categories.get(name, []))
+
+    def codes(self, name: str, values) -> np.ndarray:
+        """Integer codes for raw category values (-1 when unknown)"""
+        if name not in self.categories:
+            return np.full(len(values), -1, dtype=np.int32)
+        return self.categories[name].get_indexer(values).astype(np.int32)
+
+    def release(self, snapshot_id: Hashable):
+        """Drop the snapshots cached under snapshot_id"""
+        self._snapshots.pop(('schedules', snapshot_id), None)
+        self._snapshots.pop(('trains', snapshot_id), None)
+
+    def schedule_features(self, schedules_df: pd.DataFrame, snapshot_id: Optional[Hashable] = None) -> FeatureSnapshot:
+        """Calendar, route, weather and demand-history features for a schedule frame"""
+        if ('schedules', snapshot_id) in self._snapshots:
+            return self._snapshots[('schedules', snapshot_id)]
+
+        n = len(schedules_df)
+        departure = pd.to_datetime(schedules_df['scheduled_departure'])
+        route = self._categorical('route', schedules_df['route'], 'Unknown')
+        route_codes = route.codes
+        load = schedules_df['passenger_load'].fillna(0).to_numpy(dtype=np.float32)
+
+        matrix = np.zeros((n, len(SCHEDULE_COLUMNS)), dtype=np.float32, order='F')
+        col = {name: i for i, name in enumerate(SCHEDULE_COLUMNS)}
+
+        if 'weather_condition' in schedules_df.columns:
+            matrix[:, col['weather_encoded']] = self._categorical(
+                'weather', schedules_df['weather_condition'], 'Clear'
+            ).codes
+        matrix[:, col['passenger_load']] = load
+        hour = departure.dt.hour.to_numpy()
+        day_of_week = departure.dt.dayofweek.to_numpy()
+        matrix[:, col['hour']] = hour
+        matrix[:, col['day_of_week']] = day_of_week
+        matrix[:, col['month']] = departure.dt.month.to_numpy()
+        matrix[:, col['route_encoded']] = route_codes
+        matrix[:, col['is_weekend']] = np.isin(day_of_week, [5, 6])
+        matrix[:, col['is_peak_hour']] = np.isin(hour, PEAK_HOURS)
+
+        # Historical demand per route, in departure order
+        order = np.argsort(departure.to_numpy(), kind='stable')
+        by_route = pd.Series(load[order]).groupby(route_codes[order])
+        matrix[order, col['historical_demand']] = by_route.shift(1).fillna(0).to_numpy()
+        matrix[order, col['demand_trend']] = (
+            by_route.rolling(7).mean().reset_index(0, drop=True).sort_index().fillna(0).to_numpy()
+        )
+
+        delay = schedules_df['delay_minutes'] if 'delay_minutes' in schedules_df.columns else pd.Series(0.0, index=schedules_df.index)
+        snapshot = FeatureSnapshot(
+            columns=SCHEDULE_COLUMNS,
+            matrix=matrix,
+            train_id=schedules_df['train_id'].to_numpy(copy=True) if 'train_id' in schedules_df.columns else np.arange(n),
+            targets={
+                'delay_minutes': delay.fillna(0).to_numpy(dtype=np.float32),
+                'passenger_load': load
+            }
+        )
+        if snapshot_id is not None:
+            self._snapshots[('schedules', snapshot_id)] = snapshot
+        return snapshot
+
+    def maintenance_features(self, trains_df: pd.DataFrame, now: Optional[datetime] = None,
+                             snapshot_id: Optional[Hashable] = None) -> FeatureSnapshot:
+        """Maintenance-age and condition features for a trains frame"""
+        if ('trains', snapshot_id) in self._snapshots:
+            return self._snapshots[('trains', snapshot_id)]
+
+        now = now or datetime.now()
+        matrix = np.empty((len(trains_df), len(MAINTENANCE_COLUMNS)), dtype=np.float32, order='F')
+        matrix[:, 0] = (now - pd.to_datetime(trains_df['last_maintenance'])).dt.days.fillna(0).to_numpy()
+        matrix[:, 1] = trains_df['energy_consumption'].fillna(0).to_numpy()
+        matrix[:, 2] = trains_df['mechanical_score'].fillna(0.8).to_numpy()
+
+        # Target: needs maintenance in the next 30 days
+        days_until = (pd.to_datetime(trains_df['next_maintenance']) - now).dt.days
+        snapshot = FeatureSnapshot(
+            columns=MAINTENANCE_COLUMNS,
+            matrix=matrix,
+            train_id=trains_df['train_id'].to_numpy(copy=True),
+            targets={'needs_maintenance': (days_until <= 30).to_numpy(dtype=np.int8)}
+        )
+        if snapshot_id is not None:
+            self._snapshots[('trains', snapshot_id)] = snapshot
+        return snapshot
@@ -0,0 +1,92 @@
+"""
+backend/models/forecast_cache.py
+
+Time-bucketed cache for SmartMetroAI demand and delay forecasts.
+"""
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("Cached forecasts are read-only; copy one before modifying it")
+
+class FrozenDict(dict):
+    """dict that refuses mutation; still a dict for JSON encoders and equality"""
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _read_only
+
+    def __reduce__(self):  # copies and unpickled values are plain, mutable dicts
+        return dict, (dict(self),)
+
+class FrozenList(list):
+    """list that refuses mutation; still a list for JSON encoders and equality"""
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = extend = insert = _read_only
+    clear = pop = remove = reverse = sort = _read_only
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+def freeze(value: Any) -> Any:
+    """Read-only copy of nested dicts and lists; other values are kept as they are"""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    if isinstance(value, tuple):
+        return tuple(freeze(v) for v in value)
+    return value
+
+class ForecastCache:
+    """Forecast cache keyed by (kind, model version, route, hour bucket, horizon).
+
+    Every entry belongs to the hour bucket it was computed in; when the hour
+    rolls over the whole cache is dropped, and bumping the model version on
+    retrain makes older entries unreachable. Entries are frozen once when
+    stored (see freeze) and the same read-only object is handed to every
+    caller; a caller that needs to modify a forecast must copy it first.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple, Any] = {}
+        self._bucket: Optional[datetime] = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def hour_bucket(now: Optional[datetime] = None) -> datetime:
+        now = now or datetime.now()
+        return now.replace(minute=0, second=0, microsecond=0)
+
+    def _roll(self, bucket: datetime):
+        if bucket != self._bucket:
+            self._entries.clear()
+            self._bucket = bucket
+
+    def key(self, kind: str, model_version: int, route: Hashable, horizon: Hashable, now: Optional[datetime] = None) -> Tuple:
+        bucket = self.hour_bucket(now)
+        self._roll(bucket)
+        return (kind, model_version, route, bucket, horizon)
+
+    def get(self, key: Tuple) -> Any:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: Tuple, value: Any):
+        """Store a frozen copy of value and return it"""
+        value = freeze(value)
+        self._entries[key] = value
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries)
+        }
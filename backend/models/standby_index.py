@@ -0,0 +1,104 @@
+"""
+backend/models/standby_index.py
+
+Readiness-ordered index of deployable (standby) trains for emergency backup selection.
+"""
+import heapq
+import itertools
+from typing import Any, Dict, Iterable, List, Optional
+import pandas as pd
+
+class StandbyIndex:
+    """Max-readiness heap of deployable trains, kept per depot and fleet-wide.
+
+    Status changes are applied incrementally in O(log n): an update pushes a
+    new heap entry and the superseded one is skipped lazily (and compacted
+    once stale entries outnumber live ones). best() walks the heap in
+    readiness order without popping, so the top k cost O(k log k).
+    """
+
+    DEPLOYABLE_STATUSES = ('Standby',)
+
+    def __init__(self, deployable_statuses: Iterable[str] = DEPLOYABLE_STATUSES):
+        self.deployable_statuses = set(deployable_statuses)
+        self._heaps: Dict[Optional[str], List[tuple]] = {None: []}
+        self._live: Dict[str, tuple] = {}
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._depots: Dict[str, Optional[str]] = {}  # last known depot, kept (like records) across removals
+        self._versions = itertools.count()
+
+    @classmethod
+    def from_frame(cls, trains: pd.DataFrame, id_field: str = 'train_id',
+                   readiness_field: str = 'readiness_score', depot_field: Optional[str] = None) -> 'StandbyIndex':
+        """Index every row of an already-filtered available-trains frame"""
+        index = cls()
+        if trains is None or trains.empty:
+            return index
+        if depot_field is None:
+            depot_field = next((c for c in ('location', 'Depot', 'depot') if c in trains.columns), None)
+        for record in trains.to_dict('records'):
+            depot = record.get(depot_field) if depot_field else None
+            entry = (-float(record[readiness_field]), str(depot), str(record[id_field]), next(index._versions))
+            index._live[entry[2]] = entry
+            index._records[entry[2]] = record
+            index._depots[entry[2]] = depot
+            index._heaps[None].append(entry)
+            index._heaps.setdefault(entry[1], []).append(entry)
+        for heap in index._heaps.values():
+            heapq.heapify(heap)
+        return index
+
+    def __len__(self):
+        return len(self._live)
+
+    def __contains__(self, train_id):
+        return str(train_id) in self._live
+
+    def update(self, train_id: str, readiness: float, depot: Optional[str] = None,
+               status: Optional[str] = None, record: Optional[Dict[str, Any]] = None):
+        """Insert or re-rank a train; a non-deployable status removes it"""
+        train_id = str(train_id)
+        if status is not None and status not in self.deployable_statuses:
+            self.remove(train_id)
+            return
+        if depot is None:
+            depot = self._depots.get(train_id)
+        self._depots[train_id] = depot
+        entry = (-float(readiness), str(depot), train_id, next(self._versions))
+        self._live[train_id] = entry
+        self._records[train_id] = {**self._records.get(train_id, {}), **(record or {}), 'readiness_score': float(readiness)}
+        heapq.heappush(self._heaps[None], entry)
+        heapq.heappush(self._heaps.setdefault(entry[1], []), entry)
+        self._maybe_compact()
+
+    def remove(self, train_id: str):
+        train_id = str(train_id)
+        self._live.pop(train_id, None)
+        self._maybe_compact()
+
+    def best(self, k: Optional[int] = None, above: Optional[float] = None,
+             depot: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Records of the k most ready trains (all when k is None), readiness strictly above `above`"""
+        heap = self._heaps.get(None if depot is None else str(depot), [])
+        results = []
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and (k is None or len(results) < k):
+            entry, i = heapq.heappop(frontier)
+            if above is not None and -entry[0] <= above:
+                break
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+            if self._live.get(entry[2]) == entry:
+                results.append(self._records[entry[2]])
+        return results
+
+    def _maybe_compact(self):
+        if len(self._heaps[None]) <= 2 * len(self._live) + 32:
+            return
+        live = list(self._live.values())
+        self._heaps = {None: live}
+        for entry in live:
+            self._heaps.setdefault(entry[1], []).append(entry)
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
@@ -0,0 +1,171 @@
+"""
+backend/optimization/bay_allocation.py
+
+Stabling-bay allocation for the induction night. Each depot's capacity (from
+depot_capacities.csv) is a row of bays numbered from 1; consecutive bays form
+stub-end stabling lines of `line_depth` positions, position 0 at the exit.
+Trains stand against the buffer end, so a line fills from its last position.
+
+Inducted trains leave in departure order in the morning and held trains stay.
+A train standing in front of one that leaves earlier must be shunted out of
+the way (one move per blocking train), and placing a train anywhere other than
+its current BayPositionID is one move tonight. The allocation minimizes the
+sum of both, per depot, as a CP-SAT assignment of trains to bays; trains that
+do not fit are left unplaced.
+"""
+import logging
+import time
+from typing import Any, Dict, Optional, Sequence
+import numpy as np
+import pandas as pd
+from ortools.sat.python import cp_model
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LINE_DEPTH = 2
+UNPLACED_PENALTY = 1000  # per train left without a bay, far above any number of moves
+
+def bay_position(bay: int, line_depth: int = DEFAULT_LINE_DEPTH):
+    """(line, position) of a 1-based bay number; position 0 is at the exit"""
+    return (bay - 1) // line_depth, (bay - 1) % line_depth
+
+def allocate_bays(
+    trains: pd.DataFrame,
+    capacities: Dict[str, int],
+    departure_order: Sequence[str] = (),
+    id_field: str = "trainset_id",
+    depot_field: str = "location",
+    bay_field: Optional[str] = "BayPositionID",
+    line_depth: int = DEFAULT_LINE_DEPTH,
+    time_limit: float = 5.0
+) -> Dict[str, Any]:
+    """Bays for every train at a depot listed in capacities.
+
+    departure_order lists the inducted trains, first to leave first; all
+    others are held. Returns 'assignments' (one row per train: depot, bay,
+    line, position, departure_rank, relocated, morning_moves), the totals
+    'relocations' and 'morning_moves', 'unplaced' trains, and 'status'
+    ('optimal' only if every depot was solved to optimality).
+    """
+    rank_of = {str(tid): k + 1 for k, tid in enumerate(departure_order)}
+    frames, statuses, unplaced = [], set(), []
+    start = time.perf_counter()
+    for depot, capacity in capacities.items():
+        group = trains[trains[depot_field].astype(str) == str(depot)]
+        if group.empty:
+            continue
+        ids = group[id_field].astype(str).to_numpy()
+        held_rank = len(rank_of) + 1
+        ranks = np.array([rank_of.get(tid, held_rank) for tid in ids])
+        current = (pd.to_numeric(group[bay_field], errors="coerce").to_numpy() if bay_field in group.columns
+                   else np.full(len(ids), np.nan))
+        bays, status = _solve_depot(ranks, current, int(capacity), line_depth, held_rank, time_limit)
+        statuses.add(status)
+        placed = bays > 0
+        unplaced += ids[~placed].tolist()
+        lines, positions = bay_position(bays, line_depth)
+        frame = pd.DataFrame({
+            id_field: ids, "depot": depot, "bay": np.where(placed, bays, np.nan),
+            "line": np.where(placed, lines, np.nan), "position": np.where(placed, positions, np.nan),
+            "departure_rank": np.where(ranks < held_rank, ranks, np.nan),
+            "relocated": placed & (bays != current)
+        })
+        frame["morning_moves"] = _blocking_moves(frame, ranks, held_rank)
+        frames.append(frame)
+    assignments = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    status = "optimal" if statuses <= {"optimal"} else ",".join(sorted(statuses))
+    result = {
+        "assignments": assignments,
+        "relocations": int(assignments["relocated"].sum()) if frames else 0,
+        "morning_moves": int(assignments["morning_moves"].sum()) if frames else 0,
+        "unplaced": unplaced,
+        "status": status,
+        "solve_seconds": time.perf_counter() - start
+    }
+    logger.info("Bay allocation %s: %d relocations, %d morning moves, %d unplaced",
+                status, result["relocations"], result["morning_moves"], len(unplaced))
+    return result
+
+def _solve_depot(ranks, current, capacity, line_depth, held_rank, time_limit):
+    """Bay number per train (0 = unplaced) and the solver status.
+
+    Inducted trains get one boolean per bay. Held trains are interchangeable
+    (same rank), so each one only chooses between staying in its current bay,
+    being unplaced, or joining a pool; pooled[b] marks a bay taken by some
+    pooled held train, which removes the symmetry between them.
+    """
+    n = len(ranks)
+    inducted = np.flatnonzero(ranks < held_rank)
+    held = np.flatnonzero(ranks == held_rank)
+    home = [int(bay) - 1 if np.isfinite(bay) and 1 <= bay <= capacity else None for bay in current]
+    model = cp_model.CpModel()
+    unplaced = [model.NewBoolVar(f"unplaced_{i}") for i in range(n)]
+    x = {i: [model.NewBoolVar(f"x_{i}_{b}") for b in range(capacity)] for i in inducted}
+    for i in inducted:
+        model.AddExactlyOne(x[i] + [unplaced[i]])
+    stays = {i: model.NewBoolVar(f"stays_{i}") for i in held if home[i] is not None}
+    for i, stay in stays.items():
+        model.AddAtMostOne([stay, unplaced[i]])
+    pooled = [model.NewBoolVar(f"pooled_{b}") for b in range(capacity)]
+    model.Add(sum(pooled) == sum(1 - stays[i] - unplaced[i] if i in stays else 1 - unplaced[i] for i in held))
+
+    occupied, rank_in = [], []
+    for b in range(capacity):
+        held_here = [pooled[b]] + [stay for i, stay in stays.items() if home[i] == b]
+        column = [x[i][b] for i in inducted]
+        model.AddAtMostOne(column + held_here)
+        occupied.append(sum(column + held_here))
+        # Departure rank of the train in bay b (0 when empty)
+        rank_in.append(cp_model.LinearExpr.WeightedSum(column + held_here,
+                                                       ranks[inducted].tolist() + [held_rank] * len(held_here)))
+
+    moves = []
+    for line_start in range(0, capacity, line_depth):
+        line = list(range(line_start, min(line_start + line_depth, capacity)))
+        for front, back in zip(line, line[1:]):
+            model.Add(occupied[front] <= occupied[back])  # trains stand against the buffer end
+        for k, front in enumerate(line[:-1]):
+            moved = model.NewBoolVar(f"moved_{front}")
+            for back in line[k + 1:]:
+                # Leaving later than any train behind it means moving out of the way
+                model.Add(rank_in[front] - rank_in[back] <= held_rank * moved)
+            moves.append(moved)
+
+    relocations = []
+    for i in range(n):
+        kept = x[i][home[i]] if i in x and home[i] is not None else stays.get(i)
+        if kept is not None:
+            model.AddHint(kept, 1)
+            relocations.append(1 - kept - unplaced[i])
+        else:
+            relocations.append(1 - unplaced[i])
+    model.Minimize(UNPLACED_PENALTY * sum(unplaced) + sum(moves) + sum(relocations))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = float(time_limit)
+    solver.parameters.num_workers = 1
+    status = solver.Solve(model)
+    bays = np.zeros(n, dtype=int)
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        for i in inducted:
+            chosen = [b for b in range(capacity) if solver.BooleanValue(x[i][b])]
+            bays[i] = chosen[0] + 1 if chosen else 0
+        pool = iter([b + 1 for b in range(capacity) if solver.BooleanValue(pooled[b])])
+        for i in held:
+            if i in stays and solver.BooleanValue(stays[i]):
+                bays[i] = home[i] + 1
+            elif not solver.BooleanValue(unplaced[i]):
+                bays[i] = next(pool)
+    return bays, solver.StatusName(status).lower()
+
+def _blocking_moves(frame: pd.DataFrame, ranks, held_rank) -> np.ndarray:
+    """1 for each placed train standing in front of a train that leaves before it"""
+    rank = pd.Series(ranks, index=frame.index, dtype=float)
+    moves = np.zeros(len(frame), dtype=int)
+    for _, line in frame[frame["bay"].notna()].groupby("line"):
+        line = line.sort_values("position")
+        behind = rank[line.index].to_numpy()[::-1]
+        # Earliest departure among the trains behind each position
+        earliest_behind = np.minimum.accumulate(np.r_[np.inf, behind[:-1]])[::-1]
+        moves[frame.index.get_indexer(line.index)] = rank[line.index].to_numpy() > earliest_behind
+    return moves
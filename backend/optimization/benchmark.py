@@ -0,0 +1,227 @@
+"""
+backend/optimization/benchmark.py
+
+Scalability benchmark for MetroOptimizer.optimize_schedule.
+
+Sweeps fleet size, route count, slot length and horizon over synthetic
+fleets. Each point records build and solve time, model size, peak memory and
+objective. Results can be saved as a baseline and compared against one, and
+the largest fleet that still fits the nightly scheduling window
+(PERFORMANCE_BENCHMARKS['SCHEDULE_OPTIMIZATION_MAX_TIME']) is reported per
+(routes, slot, horizon) configuration.
+
+    python -m backend.optimization.benchmark --fleet 10 20 40 80 160 \
+        --baseline data/benchmarks/metro_optimizer_baseline.json
+
+The stored baseline is the 3-route, 5-minute, 24 h sweep above (MIP backend,
+one CPU); regenerate it with --save-baseline after intended model changes.
+
+--induction instead times the induction selection MIP (run_optimization's
+problem) with each induction solver on synthetic fleets of --fleet sizes:
+
+    python -m backend.optimization.benchmark --induction --fleet 25 100 500
+"""
+import argparse
+import itertools
+import json
+import resource
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from .induction_solver import InductionProblem, solve_induction
+from .optimization import MetroOptimizer
+
+try:
+    from ..utils.constants import PERFORMANCE_BENCHMARKS
+except ImportError:  # backend/ on sys.path (orchestrator, api)
+    from utils.constants import PERFORMANCE_BENCHMARKS
+
+NIGHTLY_WINDOW_SECONDS = PERFORMANCE_BENCHMARKS['SCHEDULE_OPTIMIZATION_MAX_TIME']
+POINT_FIELDS = ['backend', 'n_trains', 'n_routes', 'slot_minutes', 'time_horizon']
+# Metrics compared against a baseline, with the absolute change below which a ratio is noise
+BASELINE_METRICS = {'build_seconds': 0.5, 'solve_seconds': 0.5, 'peak_memory_mb': 1.0}
+
+@dataclass(frozen=True)
+class BenchmarkPoint:
+    n_trains: int
+    n_routes: int
+    slot_minutes: int = 5
+    time_horizon: int = 24
+    backend: str = 'mip'
+
+def synthetic_fleet(n_trains: int, seed: int = 0) -> pd.DataFrame:
+    """Trains with roughly the demo data's mix of status and readiness"""
+    rng = np.random.default_rng(seed)
+    status = rng.choice(['Standby', 'Service', 'Maintenance'], size=n_trains, p=[0.6, 0.3, 0.1])
+    return pd.DataFrame({
+        'train_id': [f'T{i:03d}' for i in range(n_trains)],
+        'status': status,
+        'readiness_score': np.round(rng.uniform(0.5, 1.0, size=n_trains), 2)
+    })
+
+def run_point(point: BenchmarkPoint, time_limit: Optional[float] = None, seed: int = 0,
+              **options) -> Dict:
+    """Optimize one synthetic instance and record its timings, size, memory and objective.
+
+    Timings come from an untraced run. peak_memory_mb is the Python-side peak
+    (tracemalloc) of a second, build-only pass, since tracing slows the build
+    severalfold; solver-internal (C++) memory only shows in max_rss_mb, the
+    process high-water mark.
+    """
+    trains = synthetic_fleet(point.n_trains, seed)
+    routes = [f'Route {r + 1}' for r in range(point.n_routes)]
+    record = asdict(point)
+
+    start = time.perf_counter()
+    try:
+        solution = MetroOptimizer().optimize_schedule(
+            trains, routes, time_horizon=point.time_horizon, slot_minutes=point.slot_minutes,
+            backend=point.backend, time_limit=time_limit, warm_start=False, **options
+        )
+        timings = solution['timings']
+        record.update({
+            'build_seconds': timings['build_seconds'],
+            'solve_seconds': timings['solve_seconds'],
+            'num_variables': timings['num_variables'],
+            'num_constraints': timings['num_constraints'],
+            'objective_value': solution['objective_value'],
+            'status': solution['optimization_status']
+        })
+    except Exception as e:
+        record.update({'build_seconds': np.nan, 'solve_seconds': np.nan, 'num_variables': np.nan,
+                       'num_constraints': np.nan, 'objective_value': np.nan, 'status': f'error: {e}'})
+    record['total_seconds'] = time.perf_counter() - start
+    record['peak_memory_mb'] = _build_peak_memory_mb(point, trains, routes)
+    record['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return record
+
+def _build_peak_memory_mb(point, trains, routes) -> float:
+    """Peak traced allocation while building and loading the point's model"""
+    opt = MetroOptimizer()
+    tracemalloc.start()
+    try:
+        slot_table = opt._create_slot_table(point.time_horizon, point.slot_minutes)
+        model = opt._build_model(trains, routes, slot_table, opt._parse_constraints(None))
+        opt._compiled_backend(point.backend, model, reuse_model=False)
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    except Exception:
+        return np.nan
+    finally:
+        tracemalloc.stop()
+
+def sweep(fleet_sizes: Iterable[int], route_counts: Iterable[int] = (3,), slot_minutes: Iterable[int] = (5,),
+          horizons: Iterable[int] = (24,), backend: str = 'mip',
+          window_seconds: float = NIGHTLY_WINDOW_SECONDS, **options) -> pd.DataFrame:
+    """Run every combination of the given dimensions, smallest fleets first.
+
+    Solves are capped at window_seconds; once a fleet size misses the window,
+    larger fleets in the same configuration are skipped.
+    """
+    records = []
+    for n_routes, slot, horizon in itertools.product(route_counts, slot_minutes, horizons):
+        for n_trains in sorted(fleet_sizes):
+            record = run_point(BenchmarkPoint(n_trains, n_routes, slot, horizon, backend),
+                               time_limit=window_seconds, **options)
+            records.append(record)
+            if not _fits(record, window_seconds):
+                break
+    return pd.DataFrame(records)
+
+def _fits(record, window_seconds) -> bool:
+    return record['status'] == 'optimal' and record['total_seconds'] <= window_seconds
+
+def max_fleet_in_window(results: pd.DataFrame, window_seconds: float = NIGHTLY_WINDOW_SECONDS) -> pd.DataFrame:
+    """Per configuration, the largest fleet solved to optimality within the window
+    and the smallest one that was not (NaN if every measured fleet fit)"""
+    results = results.assign(fits=[_fits(r, window_seconds) for r in results.to_dict('records')])
+    rows = []
+    for config, group in results.groupby(['backend', 'n_routes', 'slot_minutes', 'time_horizon']):
+        fitting, missing = group.loc[group['fits'], 'n_trains'], group.loc[~group['fits'], 'n_trains']
+        rows.append(dict(zip(['backend', 'n_routes', 'slot_minutes', 'time_horizon'], config),
+                         max_fleet_in_window=fitting.max() if len(fitting) else np.nan,
+                         first_fleet_over_window=missing.min() if len(missing) else np.nan))
+    return pd.DataFrame(rows)
+
+def save_baseline(results: pd.DataFrame, path: str):
+    with open(path, 'w') as f:
+        json.dump(results[POINT_FIELDS + list(BASELINE_METRICS) + ['num_variables', 'num_constraints', 'objective_value']]
+                  .to_dict('records'), f, indent=2)
+
+def compare_to_baseline(results: pd.DataFrame, path: str, tolerance: float = 0.25) -> pd.DataFrame:
+    """Join results to a saved baseline on the sweep point.
+
+    Adds <metric>_ratio (current / baseline) for the timing and memory
+    metrics, model_changed when the variable or constraint count differs, and
+    regression when a metric grew by more than tolerance (relative) and its
+    BASELINE_METRICS noise floor (absolute).
+    """
+    with open(path) as f:
+        baseline = pd.DataFrame(json.load(f))
+    merged = results.merge(baseline, on=POINT_FIELDS, how='left', suffixes=('', '_baseline'))
+    merged['regression'] = False
+    for metric, noise in BASELINE_METRICS.items():
+        before = merged[f'{metric}_baseline']
+        merged[f'{metric}_ratio'] = merged[metric] / before
+        merged['regression'] |= (merged[metric] - before) > np.maximum(tolerance * before, noise)
+    merged['model_changed'] = (merged['num_variables'] != merged['num_variables_baseline']) | \
+        (merged['num_constraints'] != merged['num_constraints_baseline'])
+    return merged
+
+def synthetic_induction_problem(n_trainsets: int, seed: int = 0) -> InductionProblem:
+    """Two capped depots, ~15% blocked trainsets and a floor of 60% of the fleet"""
+    rng = np.random.default_rng(seed)
+    depots = rng.choice(['Muttom', 'Kalamassery'], size=n_trainsets)
+    capacities = {'Muttom': int(0.45 * n_trainsets), 'Kalamassery': int(0.45 * n_trainsets)}
+    return InductionProblem([f'TS{i:04d}' for i in range(n_trainsets)], rng.uniform(-0.2, 1.0, size=n_trainsets),
+                            rng.random(n_trainsets) < 0.15, int(0.6 * n_trainsets), depots, capacities)
+
+def compare_induction_solvers(fleet_sizes: Iterable[int], solvers: Iterable[str] = ('cbc', 'ortools', 'greedy'),
+                              repeats: int = 5, seed: int = 0) -> pd.DataFrame:
+    """Median wall time of solve_induction per (solver, fleet size), model building included"""
+    records = []
+    for n in sorted(fleet_sizes):
+        problem = synthetic_induction_problem(n, seed)
+        for solver in solvers:
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                result = solve_induction(problem, solver)
+                times.append(time.perf_counter() - start)
+            records.append({'solver': solver, 'n_trainsets': n, 'median_seconds': float(np.median(times)),
+                            'objective_value': result.objective_value, 'status': result.status})
+    return pd.DataFrame(records)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='MetroOptimizer scalability benchmark')
+    parser.add_argument('--fleet', type=int, nargs='+', default=[10, 20, 40, 80])
+    parser.add_argument('--routes', type=int, nargs='+', default=[3])
+    parser.add_argument('--slot', type=int, nargs='+', default=[5])
+    parser.add_argument('--horizon', type=int, nargs='+', default=[24])
+    parser.add_argument('--backend', default='mip')
+    parser.add_argument('--window', type=float, default=NIGHTLY_WINDOW_SECONDS)
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', help='write these results as a baseline JSON')
+    parser.add_argument('--induction', action='store_true', help='compare induction solvers instead')
+    args = parser.parse_args(argv)
+
+    if args.induction:
+        print(compare_induction_solvers(args.fleet).to_string(index=False))
+        return
+
+    results = sweep(args.fleet, args.routes, args.slot, args.horizon, args.backend, args.window)
+    columns = POINT_FIELDS + ['build_seconds', 'solve_seconds', 'num_variables', 'num_constraints',
+                              'peak_memory_mb', 'objective_value', 'status']
+    print(results[columns].to_string(index=False))
+    if args.baseline:
+        compared = compare_to_baseline(results, args.baseline)
+        print(compared[POINT_FIELDS + [f'{m}_ratio' for m in BASELINE_METRICS] + ['model_changed', 'regression']]
+              .to_string(index=False))
+    print(max_fleet_in_window(results, args.window).to_string(index=False))
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+
+if __name__ == '__main__':
+    main()
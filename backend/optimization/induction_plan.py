@@ -0,0 +1,201 @@
+"""
+backend/optimization/induction_plan.py
+
+Multi-night induction planning. Selects trainsets for each of N nights in
+one model, so mileage is balanced over the horizon instead of night by night:
+each night in service accrues the trainset's average daily km, and the plan
+minimizes how far the projected end-of-horizon mileage strays from the fleet
+mean. Certificates drop a trainset from the nights after they expire;
+critical jobs block it for the whole horizon.
+"""
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+import numpy as np
+import pandas as pd
+from pulp import LpAffineExpression, LpProblem, LpVariable, LpBinary, LpMaximize, LpStatus, PULP_CBC_CMD
+from .induction_solver import InductionProblem, solve_induction
+from .jobcard_store import normalize_train_id
+from .optimization_run import (
+    component_scores, normalize_series, normalize_weights, prepare_induction_data, safe_load_csv
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DAILY_KM = 60.0  # used for trainsets missing from the mileage file
+PLAN_METHODS = ("joint", "sequential")
+
+def average_daily_km(ids, mileage_csv: Optional[str]) -> np.ndarray:
+    """Per-trainset 'Average Daily Kilometers' from a new_mileage_balancing.csv-style file"""
+    km = pd.Series(np.nan, index=pd.Index(ids))
+    df = safe_load_csv(mileage_csv) if mileage_csv else pd.DataFrame()
+    if not df.empty:
+        daily = pd.Series(df["Average Daily Kilometers"].astype(float).to_numpy(),
+                          index=df["Train ID"].map(normalize_train_id))
+        km = km.fillna(daily[~daily.index.duplicated()].reindex(km.index))
+    fallback = km.median() if km.notna().any() else DEFAULT_DAILY_KM
+    return km.fillna(fallback).to_numpy(dtype=float)
+
+def certificate_days_left(df_ts: pd.DataFrame, ids, certificates_csv: Optional[str], plan_start: date) -> np.ndarray:
+    """Days until each trainset's earliest certificate expiry (inf when unknown).
+
+    Combines cert_days_left_* columns, a certificate_valid flag of 0 (already
+    expired) and 'Expiry Date' (dd-mm-yyyy) from a new_fitness_certificates.csv-style file.
+    """
+    days = pd.Series(np.inf, index=df_ts.index)
+    cert_days_cols = [c for c in df_ts.columns if "cert_days_left" in c]
+    if cert_days_cols:
+        days = np.minimum(days, df_ts[cert_days_cols].astype(float).min(axis=1).fillna(np.inf))
+    if "certificate_valid" in df_ts.columns:
+        days = days.where(df_ts["certificate_valid"].fillna(0).astype(int) != 0, 0.0)
+    df = safe_load_csv(certificates_csv) if certificates_csv else pd.DataFrame()
+    if not df.empty:
+        expiry = pd.to_datetime(df["Expiry Date"], format="%d-%m-%Y", errors="coerce")
+        left = pd.Series((expiry - pd.Timestamp(plan_start)).dt.days.to_numpy(dtype=float),
+                         index=df["Train ID"].map(normalize_train_id))
+        left = left.groupby(level=0).min().reindex(pd.Index(ids)).fillna(np.inf)
+        days = np.minimum(days, left.to_numpy())
+    return np.asarray(days, dtype=float)
+
+def plan_induction_horizon(
+    trainset_csv: str,
+    nights: int = 7,
+    jobcards_csv: str = None,
+    model_path: Optional[str] = None,
+    weights: Optional[Dict[str, float]] = None,
+    min_peak_trainsets: int = 18,
+    max_service_trainsets: Optional[int] = None,
+    mileage_csv: Optional[str] = None,
+    certificates_csv: Optional[str] = None,
+    plan_start: Optional[date] = None,
+    balance_weight: Optional[float] = None,
+    depot_field: Optional[str] = "location",
+    id_field: str = "trainset_id",
+    solver_time_limit: int = 60,
+    method: str = "joint"
+) -> Dict[str, Any]:
+    """Induction selections for `nights` consecutive nights starting at plan_start (default today).
+
+    'joint' solves the horizon as one CBC model (with solver_time_limit):
+    per-night utility without the myopic mileage component, minus
+    balance_weight (default: the maintenance_cost weight) per trainset per day
+    of running its projected mileage is away from the projected fleet mean.
+    'sequential' solves night by night with run_optimization's utility on the
+    projected mileage, for comparison.
+
+    Each night inducts between min_peak_trainsets and max_service_trainsets
+    (default: exactly min_peak_trainsets); the rest stay on standby, which is
+    what leaves room to rest high-mileage trainsets.
+    """
+    if method not in PLAN_METHODS:
+        raise ValueError(f"Unknown plan method '{method}' (expected one of {list(PLAN_METHODS)})")
+    weights = normalize_weights(weights)
+    data = prepare_induction_data(trainset_csv, jobcards_csv, model_path, depot_field, id_field)
+    if data is None:
+        return {"nights": [], "pulp_status": "NO_DATA", "objective_value": 0.0, "plan": pd.DataFrame()}
+    plan_start = plan_start or date.today()
+    df_ts, ids = data.df_ts, data.ids
+    km = average_daily_km(ids, mileage_csv)
+    days_left = certificate_days_left(df_ts, ids, certificates_csv, plan_start)
+    # available[i, n]: trainset i may be inducted on night n
+    available = ~data.blocked[:, None] & (days_left[:, None] > np.arange(nights)[None, :])
+    scores = component_scores(df_ts)
+    mileage = df_ts["mileage_km"].to_numpy(dtype=float)
+    count = (int(min_peak_trainsets), int(max_service_trainsets if max_service_trainsets is not None
+                                          else min_peak_trainsets))
+
+    if method == "joint":
+        other = [k for k in scores.columns if k != "maintenance_cost"]
+        utility = scores[other].to_numpy() @ np.array([weights[k] for k in other])
+        if balance_weight is None:
+            balance_weight = weights["maintenance_cost"]
+        chosen, status, objective_value = _solve_joint(
+            ids, utility, available, km, mileage, count, data, balance_weight, solver_time_limit
+        )
+    else:
+        chosen, status, objective_value = _solve_sequential(
+            ids, scores, weights, available, km, mileage, count, data, solver_time_limit
+        )
+
+    projected = mileage + km * chosen.sum(axis=1)
+    plan = pd.DataFrame(chosen.astype(int), index=pd.Index(ids, name=data.id_field),
+                        columns=[f"night_{n}" for n in range(nights)])
+    logger.info("Induction plan (%s, %d nights) finished with status %s, objective %s",
+                method, nights, status, objective_value)
+    return {
+        "nights": [
+            {"night": n, "date": (plan_start + timedelta(days=n)).isoformat(),
+             "selected_trainsets": [tid for tid, c in zip(ids, chosen[:, n]) if c]}
+            for n in range(nights)
+        ],
+        "pulp_status": status,
+        "objective_value": objective_value,
+        "method": method,
+        "plan": plan,
+        "projected_mileage": dict(zip(ids, projected.tolist())),
+        "mileage_spread": float(projected.std())
+    }
+
+def _solve_joint(ids, utility, available, km, mileage, count, data, balance_weight, time_limit):
+    n_trains, nights = available.shape
+    prob = LpProblem("KMRL_Induction_Plan", LpMaximize)
+    pairs = np.argwhere(available)
+    x = [LpVariable(f"x_{ids[i]}_{n}", cat=LpBinary) for i, n in pairs]
+    deviation = [LpVariable(f"dev_{tid}", lowBound=0) for tid in ids]
+    fleet_mean = LpVariable("fleet_mean_km")
+
+    # Projected mileage M_i = mileage_i + km_i * sum_n x_in; fleet_mean is the mean of M
+    runs = [[] for _ in range(n_trains)]
+    nightly = [[] for _ in range(nights)]
+    for v, (i, n) in zip(x, pairs):
+        runs[i].append(v)
+        nightly[n].append((v, i))
+    prob += LpAffineExpression([(v, km[i] / n_trains) for v, (i, _) in zip(x, pairs)] + [(fleet_mean, -1)],
+                               constant=mileage.mean()) == 0, "fleet_mean"
+    for i in range(n_trains):
+        offset = LpAffineExpression([(v, km[i]) for v in runs[i]] + [(fleet_mean, -1)], constant=mileage[i])
+        prob += deviation[i] >= offset, f"dev_over_{ids[i]}"
+        prob += deviation[i] >= -offset, f"dev_under_{ids[i]}"
+
+    scale = max(float(km.mean()), 1.0)  # deviation in days of running
+    prob += LpAffineExpression(
+        [(v, float(utility[i])) for v, (i, _) in zip(x, pairs)] + [(d, -balance_weight / scale) for d in deviation]
+    ), "Total_Utility"
+
+    # Only for its depot codes and capacities
+    depots = InductionProblem(ids, np.zeros(n_trains), np.zeros(n_trains, dtype=bool), 0,
+                              data.depots, data.capacities)
+    for n in range(nights):
+        inducted = LpAffineExpression((v, 1) for v, _ in nightly[n])
+        prob += inducted >= count[0], f"min_peak_trainsets_{n}"
+        prob += inducted <= count[1], f"max_service_trainsets_{n}"
+        for code in np.unique(depots.depot_codes[np.isfinite(depots.capacity)]):
+            members = [(v, 1) for v, i in nightly[n] if depots.depot_codes[i] == code]
+            if members:
+                cap = int(depots.capacity[depots.depot_codes == code][0])
+                prob += LpAffineExpression(members) <= cap, f"depot_cap_{code}_{n}"
+
+    prob.solve(PULP_CBC_CMD(timeLimit=time_limit, msg=False))
+    chosen = np.zeros(available.shape, dtype=bool)
+    chosen[pairs[:, 0], pairs[:, 1]] = [v.value() is not None and v.value() > 0.5 for v in x]
+    objective_value = prob.objective.value() if prob.objective is not None else None
+    return chosen, LpStatus.get(prob.status, str(prob.status)), objective_value
+
+def _solve_sequential(ids, scores, weights, available, km, mileage, count, data, time_limit):
+    """One run_optimization-style solve per night, re-scoring mileage after each"""
+    nights = available.shape[1]
+    chosen = np.zeros(available.shape, dtype=bool)
+    projected = mileage.copy()
+    statuses, objective_value = set(), 0.0
+    columns = list(scores.columns)
+    for n in range(nights):
+        scores["maintenance_cost"] = 1.0 - normalize_series(pd.Series(np.abs(projected - projected.mean()))).to_numpy()
+        utility = scores[columns].to_numpy() @ np.array([weights[k] for k in columns])
+        problem = InductionProblem(ids, utility, ~available[:, n], count[0], data.depots, data.capacities, count[1])
+        result = solve_induction(problem, "auto", time_limit)
+        statuses.add(result.status)
+        objective_value += result.objective_value or 0.0
+        chosen[:, n] = result.selected
+        projected = projected + km * result.selected
+    status = "Optimal" if statuses == {"Optimal"} else ",".join(sorted(statuses))
+    return chosen, status, objective_value
@@ -0,0 +1,98 @@
+"""
+backend/optimization/induction_sensitivity.py
+
+Weight-sensitivity sweep for induction selection. The trainset data and the
+normalized component scores are prepared once; utilities for every weight
+vector are one matrix product, and each vector is then solved with the
+exact sort (or CBC on a thread pool). Vectors are grouped by the selection
+they produce, with the weight region (per-weight range) of each group.
+"""
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from .induction_solver import InductionProblem, solve_induction
+from .optimization_run import DEFAULT_WEIGHTS, component_scores, prepare_induction_data
+
+logger = logging.getLogger(__name__)
+
+def simplex_weight_grid(step: float = 0.1, keys: Iterable[str] = tuple(DEFAULT_WEIGHTS)) -> List[Dict[str, float]]:
+    """Every weight vector over keys with entries on a `step` grid summing to 1"""
+    keys = list(keys)
+    units = int(round(1 / step))
+    grid = []
+    for counts in itertools.product(range(units + 1), repeat=len(keys) - 1):
+        if sum(counts) <= units:
+            grid.append({k: c / units for k, c in zip(keys, counts + (units - sum(counts),))})
+    return grid
+
+def weight_sensitivity(
+    trainset_csv: str,
+    weight_vectors: Iterable[Dict[str, float]],
+    jobcards_csv: str = None,
+    model_path: Optional[str] = None,
+    min_peak_trainsets: int = 18,
+    depot_field: Optional[str] = "location",
+    id_field: str = "trainset_id",
+    solver_time_limit: int = 30,
+    solver: str = "auto",
+    max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """Solve run_optimization's selection for many weight vectors.
+
+    Returns 'vectors' (one row per normalized weight vector with its objective
+    and the index of its selection) and 'selections' (each distinct selection
+    with the vectors producing it and their per-weight min/max).
+    """
+    data = prepare_induction_data(trainset_csv, jobcards_csv, model_path, depot_field, id_field)
+    if data is None:
+        return {"vectors": pd.DataFrame(), "selections": [], "pulp_status": "NO_DATA"}
+    scores = component_scores(data.df_ts)
+    keys = list(scores.columns)
+    weights = pd.DataFrame(list(weight_vectors)).reindex(columns=keys).fillna(0.0).astype(float)
+    totals = weights.sum(axis=1)
+    if (totals <= 0).any():
+        raise ValueError("Weights must sum to > 0")
+    weights = weights.div(totals, axis=0)
+    utilities = scores.to_numpy() @ weights.to_numpy().T  # (trainsets, vectors)
+
+    ids = data.ids
+    def solve(v):
+        problem = InductionProblem(ids, utilities[:, v], data.blocked, int(min_peak_trainsets),
+                                   data.depots, data.capacities)
+        return solve_induction(problem, solver, solver_time_limit)
+
+    if solver == "cbc" and len(weights) > 1:
+        # CBC runs out of process, so threads overlap the solves
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(solve, range(len(weights))))
+    else:
+        results = [solve(v) for v in range(len(weights))]
+
+    masks = np.array([r.selected for r in results], dtype=bool).reshape(len(results), len(ids))
+    distinct, selection, counts = np.unique(masks, axis=0, return_inverse=True, return_counts=True)
+    # Most common selection first
+    order = np.argsort(-counts, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    distinct, selection = distinct[order], rank[selection.ravel()]
+    vectors = weights.assign(objective_value=[r.objective_value for r in results],
+                             pulp_status=[r.status for r in results], selection=selection)
+    selections = []
+    for k, mask in enumerate(distinct):
+        members = vectors[vectors["selection"] == k]
+        selections.append({
+            "selected_trainsets": [tid for tid, chosen in zip(ids, mask) if chosen],
+            "n_vectors": len(members),
+            "vector_indices": members.index.tolist(),
+            "weight_region": {key: (float(members[key].min()), float(members[key].max())) for key in keys}
+        })
+    statuses = set(vectors["pulp_status"])
+    logger.info("Weight sweep: %d vectors, %d distinct selections", len(vectors), len(selections))
+    return {
+        "vectors": vectors,
+        "selections": selections,
+        "pulp_status": "Optimal" if statuses == {"Optimal"} else ",".join(sorted(statuses))
+    }
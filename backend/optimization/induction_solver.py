@@ -0,0 +1,164 @@
+"""
+backend/optimization/induction_solver.py
+
+Solvers for the induction selection problem built by run_optimization:
+choose trainsets (x in {0, 1}) maximizing sum(utility * x) subject to hard
+exclusions (x = 0), a minimum (and optional maximum) number selected and
+per-depot capacities.
+
+Those constraints form a partition matroid with a cardinality floor, so the
+problem is solved exactly by sorting: walk trainsets by decreasing utility,
+skip blocked ones and full depots, and stop after every positive-utility
+pick or at the floor, whichever comes later. CBC remains the fallback for
+instances outside that structure and for infeasible ones.
+
+The MIP itself can be solved by two backends (MIP_BACKENDS): 'cbc' writes
+the PuLP model to a file for an external CBC process, 'ortools' builds it
+in process with OR-Tools' linear solver (CBC by default), which avoids the
+process spawn and file round trip. Statuses use PuLP's names either way.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+from ortools.linear_solver import pywraplp
+from pulp import LpAffineExpression, LpProblem, LpVariable, LpBinary, LpMaximize, LpStatus, PULP_CBC_CMD
+
+@dataclass
+class InductionProblem:
+    ids: np.ndarray
+    utility: np.ndarray
+    blocked: np.ndarray  # hard exclusions (certificates, critical jobs)
+    min_selected: int = 0
+    depots: Optional[np.ndarray] = None  # depot label per trainset
+    capacities: Dict[str, int] = field(default_factory=dict)  # depot label -> max selected
+    max_selected: Optional[int] = None
+
+    def __post_init__(self):
+        self.ids = np.asarray(self.ids).astype(str)
+        self.utility = np.asarray(self.utility, dtype=float)
+        self.blocked = np.asarray(self.blocked, dtype=bool)
+        # Depot of each trainset as an integer code, and that depot's capacity (inf where uncapped)
+        labels = pd.Series(self.depots if self.depots is not None else np.zeros(len(self.ids))).astype(str)
+        self.depot_codes = pd.factorize(labels)[0]
+        self.capacity = labels.map({str(k): v for k, v in self.capacities.items()}).to_numpy(
+            dtype=float, na_value=np.inf)
+
+    @property
+    def greedy_solvable(self) -> bool:
+        return bool(np.isfinite(self.utility).all())
+
+@dataclass
+class InductionResult:
+    selected: np.ndarray  # bool per trainset
+    status: str  # PuLP status name
+    objective_value: Optional[float]
+    solver: str
+
+def solve_greedy(problem: InductionProblem) -> Optional[InductionResult]:
+    """Exact solution by sorting, or None when the instance is infeasible"""
+    n = len(problem.ids)
+    order = np.lexsort((np.arange(n), -problem.utility))
+    order = order[~problem.blocked[order]]
+    if problem.capacities:
+        # Rank of each candidate within its depot, in utility order
+        codes = problem.depot_codes[order]
+        by_depot = np.argsort(codes, kind='stable')
+        grouped = codes[by_depot]
+        depot_rank = np.empty(order.size, dtype=np.int64)
+        depot_rank[by_depot] = np.arange(order.size) - np.searchsorted(grouped, grouped)
+        order = order[depot_rank < problem.capacity[order]]
+    if order.size < problem.min_selected or (problem.max_selected is not None
+                                             and problem.max_selected < problem.min_selected):
+        return None
+    count = max(int(problem.min_selected), int((problem.utility[order] > 0).sum()))
+    if problem.max_selected is not None:
+        count = min(count, int(problem.max_selected))
+    selected = np.zeros(n, dtype=bool)
+    selected[order[:count]] = True
+    return InductionResult(selected, 'Optimal', float(problem.utility[selected].sum()), 'greedy')
+
+def solve_cbc(problem: InductionProblem, time_limit: int = 30) -> InductionResult:
+    """The PuLP model solved by CBC.
+
+    Blocked trainsets are left out of the model rather than pinned by x == 0
+    rows; only free trainsets get variables and appear in the rows.
+    """
+    free = np.flatnonzero(~problem.blocked)
+    prob = LpProblem("KMRL_Induction_Selection", LpMaximize)
+    x = [LpVariable(f"x_{tid}", cat=LpBinary) for tid in problem.ids[free]]
+    prob += LpAffineExpression(zip(x, problem.utility[free].tolist())), "Total_Utility"
+    prob += LpAffineExpression((v, 1) for v in x) >= int(problem.min_selected), "min_peak_trainsets"
+    if problem.max_selected is not None:
+        prob += LpAffineExpression((v, 1) for v in x) <= int(problem.max_selected), "max_selected"
+    codes = problem.depot_codes[free]
+    for code in np.unique(codes[np.isfinite(problem.capacity[free])]):
+        members = np.flatnonzero(codes == code)
+        loc = problem.depots[free[members[0]]]
+        prob += LpAffineExpression((x[k], 1) for k in members) <= int(problem.capacity[free[members[0]]]), \
+            f"depot_cap_{loc}"
+    prob.solve(PULP_CBC_CMD(timeLimit=time_limit, msg=False))
+    selected = np.zeros(len(problem.ids), dtype=bool)
+    selected[free] = [v.value() == 1.0 for v in x]
+    objective_value = prob.objective.value() if prob.objective is not None else None
+    return InductionResult(selected, LpStatus.get(prob.status, str(prob.status)), objective_value, 'cbc')
+
+# pywraplp result status -> PuLP status name; a time-limited incumbent is
+# 'Optimal' as PuLP reports it for CBC
+ORTOOLS_STATUS = {
+    pywraplp.Solver.OPTIMAL: 'Optimal',
+    pywraplp.Solver.FEASIBLE: 'Optimal',
+    pywraplp.Solver.INFEASIBLE: 'Infeasible',
+    pywraplp.Solver.UNBOUNDED: 'Unbounded',
+    pywraplp.Solver.NOT_SOLVED: 'Not Solved',
+    pywraplp.Solver.ABNORMAL: 'Undefined'
+}
+
+def solve_ortools(problem: InductionProblem, time_limit: int = 30, solver_id: str = 'CBC') -> InductionResult:
+    """The same model as solve_cbc, built and solved in process by OR-Tools"""
+    solver = pywraplp.Solver.CreateSolver(solver_id)
+    if not solver:
+        raise Exception(f'{solver_id} solver unavailable')
+    free = np.flatnonzero(~problem.blocked)
+    x = [solver.BoolVar(f"x_{tid}") for tid in problem.ids[free]]
+    objective = solver.Objective()
+    for v, u in zip(x, problem.utility[free].tolist()):
+        objective.SetCoefficient(v, u)
+    objective.SetMaximization()
+    upper = solver.infinity() if problem.max_selected is None else int(problem.max_selected)
+    count = solver.Constraint(int(problem.min_selected), upper, "min_peak_trainsets")
+    for v in x:
+        count.SetCoefficient(v, 1)
+    codes = problem.depot_codes[free]
+    for code in np.unique(codes[np.isfinite(problem.capacity[free])]):
+        members = np.flatnonzero(codes == code)
+        cap = solver.Constraint(0, int(problem.capacity[free[members[0]]]), f"depot_cap_{problem.depots[free[members[0]]]}")
+        for k in members:
+            cap.SetCoefficient(x[k], 1)
+    if time_limit:
+        solver.SetTimeLimit(max(int(time_limit * 1000), 1))
+    status = ORTOOLS_STATUS.get(solver.Solve(), 'Undefined')
+    selected = np.zeros(len(problem.ids), dtype=bool)
+    if status == 'Optimal':
+        selected[free] = [v.solution_value() > 0.5 for v in x]
+        return InductionResult(selected, status, objective.Value(), 'ortools')
+    return InductionResult(selected, status, None, 'ortools')
+
+MIP_BACKENDS = {'cbc': solve_cbc, 'ortools': solve_ortools}
+INDUCTION_SOLVERS = ('auto', 'greedy') + tuple(MIP_BACKENDS)
+
+def solve_induction(problem: InductionProblem, solver: str = 'auto', time_limit: int = 30) -> InductionResult:
+    """Solve with 'greedy', a MIP backend ('cbc', 'ortools'), or 'auto': the
+    exact sort when the instance allows it, CBC otherwise (including
+    infeasible instances, so their status is reported as before)"""
+    if solver not in INDUCTION_SOLVERS:
+        raise ValueError(f"Unknown induction solver '{solver}' (expected one of {list(INDUCTION_SOLVERS)})")
+    if solver == 'greedy' and not problem.greedy_solvable:
+        raise ValueError('Induction problem has non-finite utilities; use a MIP backend')
+    if solver not in MIP_BACKENDS and problem.greedy_solvable:
+        result = solve_greedy(problem)
+        if result is not None:
+            return result
+        if solver == 'greedy':
+            return InductionResult(np.zeros(len(problem.ids), dtype=bool), 'Infeasible', None, 'greedy')
+    return MIP_BACKENDS.get(solver, solve_cbc)(problem, time_limit)
@@ -0,0 +1,252 @@
+"""
+backend/optimization/jobcard_store.py
+
+Job cards indexed by trainset. Both job-card exports (jobcards.csv and the
+Maximo-style new_job_card_status.csv) are parsed once into typed columns;
+per-trainset counts by status, and by priority and component over
+unclosed cards, are kept in dictionaries and updated incrementally as
+cards are opened, moved or closed, so every count query is O(1).
+"""
+import os
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    from ..utils.constants import get_train_name_by_index
+except ImportError:  # backend/ on sys.path (orchestrator, api)
+    from utils.constants import get_train_name_by_index
+
+JOB_STATUSES = ("open", "in_progress", "closed")
+STATUS_ALIASES = {
+    "open": "open", "pending": "open",
+    "in_progress": "in_progress", "in progress": "in_progress",
+    "closed": "closed", "close": "closed", "completed": "closed"
+}
+PRIORITIES = ("low", "medium", "high", "critical", "unknown")
+# Keywords mapping new_job_card_status.csv task descriptions to jobcards.csv components
+COMPONENT_KEYWORDS = {
+    "brake": "brakes", "door": "doors", "hvac": "hvac", "air filter": "hvac", "coolant": "hvac",
+    "signal": "signaling", "electric": "electrical", "battery": "electrical", "wiring": "electrical"
+}
+# Column marking critical cards in a jobcards.csv export: the first one present is used
+CRITICAL_FLAG_COLUMNS = ("priority", "priority_level", "is_critical")
+CRITICAL_FLAG_VALUES = ("critical", "1", "true", "yes")
+STATUS_FILE = "new_job_card_status.csv"  # picked up next to jobcards.csv
+STORE_CACHE_SIZE = 4
+
+def normalize_train_id(value) -> str:
+    """Fleet name for 'Train-N' style ids (the N-th of TRAIN_NAMES); other ids unchanged"""
+    text = str(value).strip()
+    prefix, _, number = text.partition("-")
+    if prefix.lower() == "train" and number.isdigit():
+        return get_train_name_by_index(int(number) - 1)
+    return text
+
+@dataclass(frozen=True)
+class JobCard:
+    job_id: str
+    train_id: str
+    status: str = "open"
+    priority: str = "unknown"
+    component: str = "other"
+    critical: bool = False
+
+def _first_column(df: pd.DataFrame, names: Tuple[str, ...]) -> Optional[str]:
+    return next((c for c in names if c in df.columns), None)
+
+def _status(values: pd.Series) -> pd.Series:
+    # Unrecognized statuses count as open, so they still block a critical trainset
+    return values.astype(str).str.strip().str.lower().map(STATUS_ALIASES).fillna("open")
+
+def _jobcards_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """jobcards.csv rows as typed columns.
+
+    A card is critical when the first of CRITICAL_FLAG_COLUMNS present holds
+    one of CRITICAL_FLAG_VALUES; an export with none of those columns has
+    every card critical, so any unclosed card blocks its trainset.
+    """
+    train_col = _first_column(df, ("trainset_id", "train_id", "TrainID"))
+    if train_col is None:
+        raise KeyError("Job card export has no trainset_id/train_id column")
+    priority = df["priority"].astype(str).str.lower() if "priority" in df.columns else pd.Series("unknown", index=df.index)
+    flag = _first_column(df, CRITICAL_FLAG_COLUMNS)
+    if flag is None:
+        critical = pd.Series(True, index=df.index)
+    else:
+        critical = df[flag].astype(str).str.strip().str.lower().isin(CRITICAL_FLAG_VALUES)
+    return pd.DataFrame({
+        "job_id": df["job_id"].astype(str) if "job_id" in df.columns else [f"JOB_{i}" for i in range(len(df))],
+        "train_id": df[train_col].map(normalize_train_id),
+        "status": _status(df["status"]) if "status" in df.columns else "open",
+        "priority": priority.where(priority.isin(PRIORITIES), "unknown"),
+        "component": df["component"].astype(str).str.lower() if "component" in df.columns else "other",
+        "critical": critical.to_numpy()
+    })
+
+def _status_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """new_job_card_status.csv rows ('Train-N' ids, Pending/In Progress/Completed) as typed columns"""
+    description = df.get("Task Description", pd.Series("", index=df.index)).astype(str).str.lower()
+    component = pd.Series("other", index=df.index)
+    for keyword, name in reversed(list(COMPONENT_KEYWORDS.items())):  # first keyword in the table wins
+        component = component.mask(description.str.contains(keyword, regex=False), name)
+    return pd.DataFrame({
+        "job_id": df["Job Card ID"].astype(str),
+        "train_id": df["Train ID"].map(normalize_train_id),
+        "status": _status(df["Status"]),
+        "priority": "unknown",
+        "component": component,
+        "critical": False
+    })
+
+class JobCardStore:
+    """Job cards with per-trainset counts kept up to date on every change.
+
+    count(train_id, status=...) counts cards in that status;
+    count(train_id, priority=...) and count(train_id, component=...) count
+    unclosed (open or in-progress) cards, as does critical_open.
+    """
+
+    def __init__(self):
+        self.cards: Dict[str, JobCard] = {}
+        self._counts: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'JobCardStore':
+        """Index a typed frame (job_id, train_id, status, priority, component, critical)"""
+        store = cls()
+        frame = frame.drop_duplicates("job_id", keep="last")
+        for row in frame.itertuples(index=False):
+            store.cards[row.job_id] = JobCard(row.job_id, row.train_id, row.status, row.priority,
+                                              row.component, bool(row.critical))
+        unclosed = frame[frame["status"] != "closed"]
+        keyed = pd.concat([
+            frame[["train_id"]].assign(key=frame["status"]),
+            unclosed[["train_id"]].assign(key="priority:" + unclosed["priority"]),
+            unclosed[["train_id"]].assign(key="component:" + unclosed["component"]),
+            unclosed.loc[unclosed["critical"], ["train_id"]].assign(key="critical")
+        ])
+        for (train_id, key), n in keyed.groupby(["train_id", "key"]).size().items():
+            store._counts.setdefault(train_id, Counter())[key] = int(n)
+        return store
+
+    @classmethod
+    def from_csv(cls, jobcards_csv: Optional[str] = None, status_csv: Optional[str] = None) -> 'JobCardStore':
+        frames = []
+        if jobcards_csv and os.path.exists(jobcards_csv):
+            frames.append(_jobcards_frame(pd.read_csv(jobcards_csv)))
+        if status_csv and os.path.exists(status_csv):
+            frames.append(_status_frame(pd.read_csv(status_csv)))
+        if not frames:
+            return cls()
+        return cls.from_frame(pd.concat(frames, ignore_index=True))
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __contains__(self, job_id):
+        return str(job_id) in self.cards
+
+    def _keys(self, card: JobCard) -> Iterable[str]:
+        yield card.status
+        if card.status != "closed":
+            yield f"priority:{card.priority}"
+            yield f"component:{card.component}"
+            if card.critical:
+                yield "critical"
+
+    def _apply(self, card: JobCard, sign: int):
+        counts = self._counts.setdefault(card.train_id, Counter())
+        for key in self._keys(card):
+            counts[key] += sign
+
+    def upsert(self, card: JobCard):
+        """Add a card, or replace the stored card with the same job_id"""
+        card = JobCard(str(card.job_id), normalize_train_id(card.train_id),
+                       STATUS_ALIASES.get(str(card.status).strip().lower(), "open"),
+                       str(card.priority).lower(), str(card.component).lower(), bool(card.critical))
+        with self._lock:
+            previous = self.cards.get(card.job_id)
+            if previous is not None:
+                self._apply(previous, -1)
+            self.cards[card.job_id] = card
+            self._apply(card, +1)
+
+    def open_card(self, job_id: str, train_id: str, priority: str = "unknown", component: str = "other",
+                  critical: bool = False, status: str = "open"):
+        self.upsert(JobCard(job_id, train_id, status, priority, component, critical or priority == "critical"))
+
+    def set_status(self, job_id: str, status: str):
+        job_id = str(job_id)
+        if job_id not in self.cards:
+            raise KeyError(f"Unknown job card '{job_id}'")
+        card = self.cards[job_id]
+        self.upsert(JobCard(card.job_id, card.train_id, status, card.priority, card.component, card.critical))
+
+    def close_card(self, job_id: str):
+        self.set_status(job_id, "closed")
+
+    def count(self, train_id: str, status: Optional[str] = None, priority: Optional[str] = None,
+              component: Optional[str] = None) -> int:
+        """Cards of a trainset matching exactly one of status, priority or component"""
+        given = [(k, v) for k, v in (("status", status), ("priority", priority), ("component", component))
+                 if v is not None]
+        if len(given) != 1:
+            raise ValueError("count() takes exactly one of status, priority or component")
+        kind, value = given[0]
+        key = STATUS_ALIASES.get(str(value).lower(), str(value)) if kind == "status" else f"{kind}:{str(value).lower()}"
+        return self._counts.get(normalize_train_id(train_id), {}).get(key, 0)
+
+    def critical_open(self, train_id: str) -> int:
+        return self._counts.get(normalize_train_id(train_id), {}).get("critical", 0)
+
+    def critical_open_counts(self, train_ids: Iterable[str]) -> np.ndarray:
+        """critical_open for each id, in order"""
+        return np.array([self.critical_open(tid) for tid in train_ids], dtype=int)
+
+    def summary(self, train_id: str) -> Dict[str, Dict[str, int]]:
+        """All non-zero counts of a trainset, grouped as status / priority / component"""
+        out = {"status": {}, "priority": {}, "component": {},
+               "critical_open": self.critical_open(train_id)}
+        for key, n in self._counts.get(normalize_train_id(train_id), {}).items():
+            if n <= 0 or key == "critical":
+                continue
+            kind, _, value = key.partition(":")
+            if value:
+                out[kind][value] = n
+            else:
+                out["status"][kind] = n
+        return out
+
+_stores: "OrderedDict[Tuple, JobCardStore]" = OrderedDict()
+_stores_lock = threading.Lock()
+
+def _mtime(path: Optional[str]) -> Optional[int]:
+    return os.stat(path).st_mtime_ns if path and os.path.exists(path) else None
+
+def load_job_card_store(jobcards_csv: Optional[str], status_csv: Optional[str] = None) -> Optional[JobCardStore]:
+    """The store for these exports, parsed once per process and file modification time.
+
+    status_csv defaults to new_job_card_status.csv next to jobcards_csv. The
+    same store is returned to every caller, so cards opened or closed through
+    it are seen by later optimizer runs until either file changes on disk.
+    None when jobcards_csv does not exist: an empty store would report no
+    critical jobs for every trainset.
+    """
+    if not jobcards_csv or not os.path.exists(jobcards_csv):
+        return None
+    if status_csv is None:
+        status_csv = os.path.join(os.path.dirname(jobcards_csv), STATUS_FILE)
+    paths = tuple(os.path.abspath(p) if p else None for p in (jobcards_csv, status_csv))
+    key = paths + tuple(_mtime(p) for p in paths)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = JobCardStore.from_csv(*paths)
+            while len(_stores) > STORE_CACHE_SIZE:
+                _stores.popitem(last=False)
+        _stores.move_to_end(key)
+        return _stores[key]
@@ -0,0 +1,231 @@
+"""
+backend/optimization/night_slots.py
+
+Night-shift cleaning and inspection scheduling. The maintenance window is
+split into slots. Cleaning jobs (CleaningRequired, by CleaningPriority) run
+in one of MAX_CLEANING_SLOTS cleaning bays, and inspection jobs (one
+inspection_minutes block per PendingInspections) in one of
+MAX_MAINTENANCE_SLOTS inspection bays. A train does one job at a time.
+
+Jobs are optional intervals in a CP-SAT model with a cumulative constraint
+per bay type, maximizing the priority-weighted work done; since the bays of
+a type are identical, bays are assigned afterwards by interval colouring. A
+serviceable train whose high-priority cleaning or pending inspections do not
+fit tonight is held (held_cleaning / held_inspection) and cannot be inducted;
+run_optimization(plan_night_slots=True) applies these holds to the induction.
+"""
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import numpy as np
+import pandas as pd
+from ortools.sat.python import cp_model
+
+try:
+    from ..utils.constants import MAX_CLEANING_SLOTS, MAX_MAINTENANCE_SLOTS
+except ImportError:  # backend/ on sys.path (orchestrator, api)
+    from utils.constants import MAX_CLEANING_SLOTS, MAX_MAINTENANCE_SLOTS
+
+logger = logging.getLogger(__name__)
+
+WINDOW_START = "23:00"
+WINDOW_HOURS = 6.0
+SLOT_MINUTES = 30
+CLEANING_MINUTES = 120
+INSPECTION_MINUTES = 90  # per pending inspection
+CLEANING_WEIGHTS = {"high": 3, "medium": 2, "normal": 1, "low": 1}
+INSPECTION_WEIGHT = 4  # per pending inspection; inspections are safety work
+SERVICEABLE_BONUS = 2  # per job of a train that could otherwise be inducted
+
+def _slots(minutes: float, slot_minutes: int) -> int:
+    return int(np.ceil(minutes / slot_minutes))
+
+def night_jobs(trains: pd.DataFrame, id_field: str = "TrainID", cleaning_minutes: int = CLEANING_MINUTES,
+               inspection_minutes: int = INSPECTION_MINUTES) -> pd.DataFrame:
+    """Cleaning and inspection jobs from kmrl_train_data.csv-style columns.
+
+    'mandatory' jobs (high-priority cleaning, any pending inspection) hold
+    their train out of service when they are not scheduled. A missing
+    CleaningRequired or PendingInspections column means no such jobs, and a
+    missing CleaningPriority means normal priority.
+    """
+    if id_field not in trains.columns:
+        raise ValueError(f"Night-shift train data has no '{id_field}' column")
+    def column(name, default):
+        return trains[name] if name in trains.columns else pd.Series(default, index=trains.index)
+    required = column("CleaningRequired", False).astype(str).str.lower().isin(["true", "1", "yes"])
+    cleaning = trains[required]
+    labels = column("CleaningPriority", "Normal")[required]
+    priority = labels.astype(str).str.lower()
+    pending = pd.to_numeric(column("PendingInspections", 0), errors="coerce").fillna(0).astype(int)
+    inspection = trains[pending > 0]
+    return pd.concat([
+        pd.DataFrame({"train_id": cleaning[id_field].astype(str), "job": "cleaning",
+                      "minutes": cleaning_minutes, "weight": priority.map(CLEANING_WEIGHTS).fillna(1).astype(int),
+                      "mandatory": priority == "high", "priority": labels}),
+        pd.DataFrame({"train_id": inspection[id_field].astype(str), "job": "inspection",
+                      "minutes": pending[pending > 0] * inspection_minutes,
+                      "weight": pending[pending > 0] * INSPECTION_WEIGHT, "mandatory": True,
+                      "priority": pending[pending > 0].astype(str) + " pending"})
+    ], ignore_index=True)
+
+def schedule_night_slots(
+    jobs: pd.DataFrame,
+    serviceable: Optional[set] = None,
+    cleaning_bays: int = MAX_CLEANING_SLOTS,
+    inspection_bays: int = MAX_MAINTENANCE_SLOTS,
+    window_start: str = WINDOW_START,
+    window_hours: float = WINDOW_HOURS,
+    slot_minutes: int = SLOT_MINUTES,
+    time_limit: float = 10.0
+) -> Dict[str, Any]:
+    """Start slot and bay for as many jobs (night_jobs rows) as fit the window.
+
+    Jobs of trains in `serviceable` weigh more, since leaving them undone
+    costs a train in service. Returns 'jobs' with scheduled/start/end/bay,
+    the trains to hold for cleaning and for inspection (each held train is
+    counted once, inspection first), 'status' and 'solve_seconds'.
+    """
+    start_time = time.perf_counter()
+    n_slots = _slots(window_hours * 60, slot_minutes)
+    capacity = {"cleaning": int(cleaning_bays), "inspection": int(inspection_bays)}
+    jobs = jobs.reset_index(drop=True).copy()
+    jobs["slots"] = [_slots(m, slot_minutes) for m in jobs["minutes"]]
+    weights = jobs["weight"].to_numpy() * np.where(jobs["train_id"].isin(serviceable or ()), SERVICEABLE_BONUS, 1)
+
+    model = cp_model.CpModel()
+    present, starts, intervals = [], [], []
+    for j, row in jobs.iterrows():
+        fits = row["slots"] <= n_slots and capacity[row["job"]] > 0
+        p = model.NewBoolVar(f"p_{j}")
+        s = model.NewIntVar(0, max(n_slots - row["slots"], 0), f"s_{j}")
+        if not fits:
+            model.Add(p == 0)
+        present.append(p)
+        starts.append(s)
+        intervals.append(model.NewOptionalFixedSizeIntervalVar(s, int(row["slots"]), p, f"job_{j}"))
+    for kind, cap in capacity.items():
+        members = np.flatnonzero(jobs["job"].to_numpy() == kind)
+        if len(members) and cap > 0:
+            model.AddCumulative([intervals[j] for j in members], [1] * len(members), cap)
+    for _, members in jobs.groupby("train_id").indices.items():
+        if len(members) > 1:
+            model.AddNoOverlap([intervals[j] for j in members])
+    model.Maximize(sum(int(w) * p for w, p in zip(weights, present)))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = float(time_limit)
+    solver.parameters.num_workers = 1
+    status = solver.Solve(model)
+    solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    jobs["scheduled"] = np.array([solved and solver.BooleanValue(p) for p in present], dtype=bool)
+    jobs["start_slot"] = [solver.Value(s) if done else -1 for s, done in zip(starts, jobs["scheduled"])]
+    jobs["bay"] = _assign_bays(jobs)
+
+    origin = datetime.strptime(window_start, "%H:%M")
+    def clock(slot):
+        return (origin + timedelta(minutes=int(slot) * slot_minutes)).strftime("%H:%M")
+    jobs["start"] = [clock(s) if done else None for s, done in zip(jobs["start_slot"], jobs["scheduled"])]
+    jobs["end"] = [clock(s + d) if done else None
+                   for s, d, done in zip(jobs["start_slot"], jobs["slots"], jobs["scheduled"])]
+
+    missed = jobs[jobs["mandatory"] & ~jobs["scheduled"]]
+    held_inspection = sorted(set(missed.loc[missed["job"] == "inspection", "train_id"]))
+    held_cleaning = sorted(set(missed.loc[missed["job"] == "cleaning", "train_id"]) - set(held_inspection))
+    result = {
+        "jobs": jobs.drop(columns=["slots"]),
+        "held_inspection": held_inspection,
+        "held_cleaning": held_cleaning,
+        "status": solver.StatusName(status).lower(),
+        "solve_seconds": time.perf_counter() - start_time
+    }
+    logger.info("Night slots %s: %d/%d jobs scheduled, holding %d for inspection and %d for cleaning",
+                result["status"], int(jobs["scheduled"].sum()), len(jobs), len(held_inspection), len(held_cleaning))
+    return result
+
+def _assign_bays(jobs: pd.DataFrame) -> list:
+    """Bay number (1-based, per job type) for each scheduled job by interval colouring"""
+    bays = [None] * len(jobs)
+    for _, group in jobs[jobs["scheduled"]].groupby("job"):
+        free, busy = [], []  # free bay numbers; (end slot, bay) of running jobs
+        next_bay = 1
+        for j in group.sort_values("start_slot", kind="stable").index:
+            start = jobs.at[j, "start_slot"]
+            while busy and busy[0][0] <= start:
+                heapq.heappush(free, heapq.heappop(busy)[1])
+            if free:
+                bay = heapq.heappop(free)
+            else:
+                bay, next_bay = next_bay, next_bay + 1
+            bays[j] = bay
+            heapq.heappush(busy, (start + jobs.at[j, "slots"], bay))
+    return bays
+
+def schedule_night_shift(train_data: pd.DataFrame, ids, blocked, **slot_options) -> Dict[str, Any]:
+    """schedule_night_slots for the trainsets in ids, from kmrl_train_data.csv-style rows.
+
+    Trainsets already blocked from induction are not serviceable, so
+    'held_inspection' and 'held_cleaning' only list the trains the schedule
+    takes out of service; 'held_maintenance' counts the blocked ones.
+    """
+    ids = np.asarray(ids).astype(str)
+    blocked = np.asarray(blocked, dtype=bool)
+    if train_data.empty:
+        train_data = pd.DataFrame(columns=["TrainID"])
+    if "TrainID" not in train_data.columns:
+        raise ValueError("Night-shift train data has no 'TrainID' column")
+    jobs = night_jobs(train_data[train_data["TrainID"].astype(str).isin(ids)])
+    serviceable = set(ids[~blocked])
+    slots = schedule_night_slots(jobs, serviceable, **slot_options)
+    slots["held_inspection"] = [t for t in slots["held_inspection"] if t in serviceable]
+    slots["held_cleaning"] = [t for t in slots["held_cleaning"] if t in serviceable]
+    slots["held_maintenance"] = int(blocked.sum())
+    return slots
+
+def plan_night_shift(
+    trainset_csv: str,
+    train_data_csv: str,
+    jobcards_csv: str = None,
+    model_path: Optional[str] = None,
+    weights: Optional[Dict[str, float]] = None,
+    min_peak_trainsets: int = 18,
+    depot_field: Optional[str] = "location",
+    id_field: str = "trainset_id",
+    solver_time_limit: int = 30,
+    **slot_options
+) -> Dict[str, Any]:
+    """Night slots for a kmrl_train_data.csv-style file, then induction without the held trains.
+
+    Returns the induction selection, the slot schedule and a
+    night_shift_summary with the counts of data/exports/night_decisions.json.
+    """
+    from .optimization_run import run_optimization  # optimization_run imports this module
+    res = run_optimization(trainset_csv, jobcards_csv, model_path, weights, min_peak_trainsets,
+                           depot_field=depot_field, id_field=id_field, solver_time_limit=solver_time_limit,
+                           train_data_csv=train_data_csv, plan_night_slots=True, night_slot_options=slot_options)
+    if "night_slots" not in res:
+        return {"selected_trainsets": [], "pulp_status": "NO_DATA", "night_shift_summary": {}}
+    slots, selected = res["night_slots"], res["selected_trainsets"]
+    total = len(res["details"])
+    held_inspection, held_cleaning = slots["held_inspection"], slots["held_cleaning"]
+    return {
+        "selected_trainsets": selected,
+        "pulp_status": res["pulp_status"],
+        "objective_value": res["objective_value"],
+        "slots": slots["jobs"],
+        "slot_status": slots["status"],
+        "night_shift_summary": {
+            "timestamp": datetime.now().isoformat(),
+            "total_trains": total,
+            "service_released": len(selected),
+            "held_maintenance": slots["held_maintenance"],
+            "held_inspection": len(held_inspection),
+            "held_cleaning": len(held_cleaning),
+            "held_standby": total - len(selected) - slots["held_maintenance"] - len(held_inspection) - len(held_cleaning),
+            "optimization_time": slots["solve_seconds"]
+        },
+        "held_inspection": held_inspection,
+        "held_cleaning": held_cleaning
+    }
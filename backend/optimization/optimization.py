@@ -1,57 +1,494 @@
 
-from ortools.linear_solver import pywraplp
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from .schedule_model import IntervalRules, ScheduleModel, SlotTable, VARIABLE_SLOT_RESOLUTION
+from .solver_backends import SOLVER_BACKENDS
 
 @dataclass
 class OptimizationConstraints:
     max_trains_per_route: int = 5
     min_service_interval: int = 5  # minutes
     max_service_interval: int = 15  # minutes
-    maintenance_windows: List[tuple] = None
-    crew_shift_duration: int = 8  # hours
+    maintenance_windows: List[tuple] = None  # (train_id, start_h, end_h) or (train_id, earliest_h, latest_h, duration_h)
+    crew_shift_duration: Optional[float] = None  # hours; None leaves a train's duty span unconstrained
     brand_hour_requirements: Dict[str, int] = None
+    min_peak_trains: int = 2  # per route during peak hours
+    crew_count: Optional[int] = None  # crews that may be on shift at once (needs crew_shift_duration)
 
 class MetroOptimizer:
+    COMPILED_CACHE_SIZE = 4  # loaded solver models kept for re-solves
+    
     def __init__(self):
         self.solver = None
+        self.model = None
         self.current_solution = None
+        self.schedule_frame = None
         self.optimization_results = {}
-        
-    def optimize_schedule(self, trains, routes, time_horizon=24, constraints=None):
-        """Generate optimal schedule using OR-Tools"""
-        
+        self._compiled = OrderedDict()  # (backend, structure key) -> loaded backend
+        
+    def optimize_schedule(self, trains, routes, time_horizon=24, constraints=None,
+                          backend='mip', num_workers=None, time_limit=None, relative_gap=None,
+                          slot_minutes=5, resolution=None,
+                          rolling_window_hours=None, rolling_overlap_minutes=30,
+                          warm_start=True, previous_solution=None, stability_penalty=0.0,
+                          decompose=False, max_workers=None, reuse_model=True):
+        """Generate optimal schedule using OR-Tools
+        
+        backend is 'mip' (SCIP via pywraplp) or 'cp_sat' (CP-SAT, all cores unless
+        num_workers is given). With a time_limit or relative_gap the best incumbent
+        is returned and its status reported in 'optimization_status'.
+        
+        The time grid is time_horizon hours of slot_minutes slots; resolution
+        ('variable' or a {pattern: minutes} dict) sizes slots per SERVICE_PATTERNS bucket.
+        
+        With rolling_window_hours set, the horizon is solved as a sequence of
+        overlapping windows (see _optimize_rolling); time_limit then applies per window.
+        
+        previous_solution (or, with warm_start, the last solution this optimizer
+        returned) is passed to the solver as hints; stability_penalty > 0 also
+        charges every 5 minutes of assignment that deviates from it.
+        
+        With decompose, trains are first dedicated to routes by a small master
+        problem and each route is then solved independently on a process pool of
+        max_workers (see _optimize_decomposed); every other option applies per route.
+        
+        With reuse_model, a full-horizon solve whose model has the structure of a
+        recent one (same trains, routes, slot grid and rule set) re-solves that
+        loaded solver model after updating only bounds and objective coefficients.
+        """
         # Initialize solver
-        self.solver = pywraplp.Solver.CreateSolver('SCIP')
-        if not self.solver:
-            raise Exception('SCIP solver unavailable')
+        if backend not in SOLVER_BACKENDS:
+            raise ValueError(f"Unknown solver backend '{backend}' (expected one of {list(SOLVER_BACKENDS)})")
         
         # Parse constraints
         constraints_obj = self._parse_constraints(constraints)
+        slot_table = self._create_slot_table(time_horizon, slot_minutes, resolution)
+        solve_options = {'time_limit': time_limit, 'relative_gap': relative_gap, 'num_workers': num_workers}
+        if previous_solution is None and warm_start:
+            previous_solution = self.current_solution
+        warm = {'previous': previous_solution, 'stability_penalty': stability_penalty}
+        
+        if decompose and constraints_obj.crew_count is not None:
+            raise ValueError('crew_count is shared by all routes and cannot be used with decompose')
+        if rolling_window_hours and (constraints_obj.crew_shift_duration or any(
+                len(w) > 3 for w in constraints_obj.maintenance_windows or [])):
+            raise ValueError('Crew shifts and flexible maintenance windows need the full horizon (no rolling windows)')
+        
+        if decompose:
+            route_options = {
+                'time_horizon': time_horizon, 'constraints': constraints, 'backend': backend,
+                'num_workers': num_workers, 'time_limit': time_limit, 'relative_gap': relative_gap,
+                'slot_minutes': slot_minutes, 'resolution': resolution,
+                'rolling_window_hours': rolling_window_hours, 'rolling_overlap_minutes': rolling_overlap_minutes,
+                'stability_penalty': stability_penalty
+            }
+            return self._optimize_decomposed(trains, routes, slot_table, constraints_obj, backend,
+                                             route_options, previous_solution, max_workers)
+        
+        if rolling_window_hours:
+            return self._optimize_rolling(trains, routes, slot_table, constraints_obj, backend, solve_options,
+                                          rolling_window_hours, rolling_overlap_minutes, warm)
+        
+        build_start = time.perf_counter()
+        model = self._build_model(trains, routes, slot_table, constraints_obj, **warm)
+        
+        self.backend, reused = self._compiled_backend(backend, model, reuse_model)
+        if model.previous is not None:
+            self._set_hints(self.backend, model, model.previous)
+        build_time = time.perf_counter() - build_start
         
+        # Solve
+        solve_start = time.perf_counter()
+        status = self.backend.solve(**solve_options)
+        solve_time = time.perf_counter() - solve_start
+        self.solver = self.backend.solver
+        
+        self.optimization_results['timings'] = {
+            'backend': backend,
+            'build_seconds': build_time,
+            'solve_seconds': solve_time,
+            'num_variables': model.n_vars,
+            'num_constraints': model.num_constraints,
+            'warm_start': model.previous is not None,
+            'model_reused': reused
+        }
+        
+        if status in ('optimal', 'feasible'):
+            solution = self._extract_solution(self.backend.values(), trains, routes, time_horizon)
+            solution['optimization_status'] = status
+            solution['objective_value'] = self.backend.objective_value
+            if model.intervals and model.intervals.maintenance:
+                solution['maintenance_schedule'] = [
+                    {'train_id': str(model.train_ids[i]), 'start': start, 'end': start + duration,
+                     'time': f"{start // 60:02d}:{start % 60:02d}"}
+                    for (i, _, _, duration), start in zip(model.intervals.maintenance, self.backend.maintenance_starts())
+                ]
+            solution['timings'] = self.optimization_results['timings']
+            return solution
+        else:
+            raise Exception(f'Optimization failed with status: {status}')
+    
+    def _build_model(self, trains, routes, slot_table, constraints_obj, readiness_budget=None,
+                     previous=None, stability_penalty=0.0):
+        """Create variables, constraints and objective over a slot table"""
         # Create decision variables
-        variables = self._create_variables(trains, routes, time_horizon)
+        model = self._create_variables(trains, routes, slot_table)
+        model.readiness_budget = readiness_budget
         
         # Add constraints
-        self._add_operational_constraints(variables, trains, routes, constraints_obj)
-        self._add_resource_constraints(variables, trains, constraints_obj)
-        self._add_service_level_constraints(variables, routes, constraints_obj)
+        self._add_operational_constraints(model, trains, routes, constraints_obj)
+        self._add_resource_constraints(model, trains, constraints_obj)
+        self._add_service_level_constraints(model, routes, constraints_obj)
         
         # Set objective function
-        self._set_objective(variables, trains, routes)
+        self._set_objective(model, trains, routes)
+        
+        # Previous solution on this grid: warm-start hints and optional stability term
+        if previous is not None:
+            model.previous = self._previous_assignment(model, previous)
+            if stability_penalty:
+                # |x - p| = x * (1 - 2p) + p for binary x; the constant p is dropped
+                deviation = (1 - 2 * model.previous.ravel()) * (model.slot_lengths / 5.0)[model.slot_idx]
+                model.objective[:model.n_assign] -= stability_penalty * deviation
+        return model
+    
+    def _compiled_backend(self, backend, model, reuse_model):
+        """Loaded backend for the model: a cached one updated in place, or a fresh load"""
+        if not reuse_model:
+            solver = SOLVER_BACKENDS[backend]()
+            solver.load(model)
+            return solver, False
+        
+        key = (backend, model.structure_key())
+        solver = self._compiled.pop(key, None)
+        reused = solver is not None
+        if reused:
+            solver.update(model)
+        else:
+            solver = SOLVER_BACKENDS[backend]()
+            solver.load(model)
+        self._compiled[key] = solver
+        while len(self._compiled) > self.COMPILED_CACHE_SIZE:
+            self._compiled.popitem(last=False)
+        return solver, reused
+    
+    def _previous_assignment(self, model, previous):
+        """0/1 array (train, route, slot) of a previous solution mapped onto this model's slot grid"""
+        assignment = np.zeros(model.assign_index.shape)
+        schedule = pd.DataFrame(previous.get('schedule', []))
+        if schedule.empty:
+            return assignment
+        
+        train_pos = pd.Index(model.train_ids).get_indexer(schedule['train_id'].astype(str))
+        route_pos = pd.Index(model.routes).get_indexer(schedule['route'])
+        start = schedule['time_slot'].to_numpy()
+        length = schedule['slot_minutes'].fillna(1).to_numpy() if 'slot_minutes' in schedule.columns \
+            else np.ones(len(schedule))
+        
+        # Each entry covers [time_slot, time_slot + slot_minutes): mark every slot of this grid it overlaps
+        first = np.searchsorted(model.slots + model.slot_lengths, start, side='right')
+        last = np.searchsorted(model.slots, start + length, side='left')
+        counts = np.where((train_pos >= 0) & (route_pos >= 0), np.maximum(last - first, 0), 0)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        assignment[np.repeat(train_pos, counts), np.repeat(route_pos, counts), np.repeat(first, counts) + offsets] = 1
+        return assignment
+    
+    @staticmethod
+    def _set_hints(solver, model, assignment):
+        """Hint assignment values, clipped to the variable bounds (e.g. trains now in maintenance)"""
+        index = model.assign_index.ravel()
+        solver.set_hint(index, np.clip(assignment.ravel(), model.lower[index], model.upper[index]))
+    
+    def _optimize_rolling(self, trains, routes, slot_table, constraints_obj, backend, solve_options,
+                          window_hours, overlap_minutes, warm):
+        """Rolling-horizon solve: overlapping windows solved in sequence, then stitched.
+        
+        Each window commits its decisions up to the start of its overlap. The next
+        window re-solves the overlap, warm-started from the previous answer, with
+        the committed slots just before it (enough to cover the service-interval
+        constraints) fixed as context. Low-readiness trains carry their remaining
+        30% budget from window to window.
+        """
+        window = int(window_hours * 60)
+        overlap = int(overlap_minutes)
+        if not 0 <= overlap < window:
+            raise ValueError('rolling_overlap_minutes must be smaller than the window')
+        
+        # Full-horizon index model used for stitching and extraction only
+        full = self._create_variables(trains, routes, slot_table)
+        self._set_objective(full, trains, routes)
+        values = np.zeros(full.n_vars)
+        horizon = int(slot_table.starts[-1] + slot_table.lengths[-1])
+        context_minutes = self._context_minutes(constraints_obj)
+        
+        budget_total = self._readiness_cap_minutes(full)
+        assign = full.assign_index
+        build_time = solve_time = 0.0
+        hint = None
+        n_windows = n_constraints = 0
+        statuses = set()
+        
+        start = 0
+        while start < horizon:
+            end = min(start + window, horizon)
+            commit_end = end if end >= horizon else end - overlap
+            ctx_lo, lo, commit_hi, hi = np.searchsorted(slot_table.starts, [start - context_minutes, start, commit_end, end])
+            n_ctx = lo - ctx_lo
+            
+            build_start = time.perf_counter()
+            context = values[assign[:, :, ctx_lo:lo]]
+            used = (values[assign[:, :, :lo]] * full.slot_lengths[:lo]).sum(axis=(1, 2))
+            context_used = (context * full.slot_lengths[ctx_lo:lo]).sum(axis=(1, 2))
+            model = self._build_model(trains, routes, slot_table.slice(ctx_lo, hi), constraints_obj,
+                                      readiness_budget=budget_total - used + context_used, **warm)
+            
+            # Fix committed context and keep it out of the objective
+            ctx_vars = model.assign_index[:, :, :n_ctx].ravel()
+            model.lower[ctx_vars] = model.upper[ctx_vars] = context.ravel()
+            model.objective[ctx_vars] = 0
+            model.objective[model.load_index[:, :n_ctx].ravel()] = 0
+            ctx_dispatch = model.dispatch_index[:, :n_ctx].ravel()
+            model.lower[ctx_dispatch] = model.upper[ctx_dispatch] = values[full.dispatch_index[:, ctx_lo:lo]].ravel()
+            
+            solver = SOLVER_BACKENDS[backend]()
+            solver.load(model)
+            if hint is not None:
+                # Overlap re-solved from the previous window's answer
+                hint_lo, hint_values = hint
+                offset = n_ctx + hint_lo - lo
+                if model.previous is not None:
+                    model.previous[:, :, offset:offset + hint_values.shape[2]] = hint_values
+                else:
+                    local = model.assign_index[:, :, offset:offset + hint_values.shape[2]]
+                    solver.set_hint(local.ravel(), hint_values.ravel())
+            if model.previous is not None:
+                self._set_hints(solver, model, model.previous)
+            build_time += time.perf_counter() - build_start
+            
+            solve_start = time.perf_counter()
+            status = solver.solve(**solve_options)
+            solve_time += time.perf_counter() - solve_start
+            if status not in ('optimal', 'feasible'):
+                raise Exception(f'Optimization failed in window {start}-{end} min with status: {status}')
+            statuses.add(status)
+            n_windows += 1
+            n_constraints += model.num_constraints
+            
+            # Commit [lo, commit_hi) and keep the overlap as the next window's hint
+            window_values = np.round(solver.values())
+            local = window_values[model.assign_index[:, :, n_ctx:]]
+            values[assign[:, :, lo:commit_hi]] = local[:, :, :commit_hi - lo]
+            for index, local_index in ((full.load_index, model.load_index),
+                                       (full.occupancy_index, model.occupancy_index),
+                                       (full.dispatch_index, model.dispatch_index)):
+                values[index[:, lo:commit_hi]] = window_values[local_index[:, n_ctx:n_ctx + commit_hi - lo]]
+            hint = (commit_hi, local[:, :, commit_hi - lo:])
+            start = commit_end
+        
+        self.model = full
+        self.backend = solver
+        self.solver = solver.solver
+        self.optimization_results['timings'] = {
+            'backend': backend,
+            'build_seconds': build_time,
+            'solve_seconds': solve_time,
+            'num_variables': full.n_vars,
+            'num_constraints': n_constraints,
+            'warm_start': warm['previous'] is not None,
+            'windows': n_windows
+        }
         
-        # Solve
-        status = self.solver.Solve()
+        solution = self._extract_solution(values, trains, routes, horizon // 60)
+        solution['optimization_status'] = 'feasible' if 'feasible' in statuses else 'optimal'
+        solution['objective_value'] = float(full.objective @ values)
+        solution['timings'] = self.optimization_results['timings']
+        return solution
+    
+    def _optimize_decomposed(self, trains, routes, slot_table, constraints_obj, backend,
+                             route_options, previous, max_workers):
+        """Route decomposition: master allocation, parallel per-route solves, merge and repair.
+        
+        Once every train is dedicated to a single route, the one-route-at-a-time
+        constraint is the only coupling between routes and it holds by construction,
+        so each route's timetable is an independent subproblem. The merged schedule
+        is still checked against the full model's rows and repaired if needed.
+        """
+        build_start = time.perf_counter()
+        allocation, reserved = self._allocate_routes(trains, routes, constraints_obj, backend)
+        master_time = time.perf_counter() - build_start
+        
+        # Routes the master left without trains cannot be scheduled; report them instead
+        served = [r for r in range(len(routes)) if allocation[r].size]
+        if not served:
+            raise Exception('Route decomposition failed: no trains available for any route')
+        # Subproblems demand only the peak minimum the master reserved for them
+        route_options = {
+            **route_options,
+            'constraints': {**(route_options['constraints'] or {}), 'min_peak_trains': reserved}
+        }
         
-        if status == pywraplp.Solver.OPTIMAL:
-            return self._extract_solution(variables, trains, routes, time_horizon)
+        workers = max(1, min(len(routes), max_workers or os.cpu_count() or 1))
+        if route_options['num_workers'] is None:
+            route_options = {**route_options, 'num_workers': max(1, (os.cpu_count() or 1) // workers)}
+        previous_schedule = pd.DataFrame(previous['schedule']) if previous and previous.get('schedule') else None
+        
+        jobs = []
+        for r in served:
+            route = routes[r]
+            route_previous = None
+            if previous_schedule is not None:
+                route_previous = {'schedule': previous_schedule[previous_schedule['route'] == route].to_dict('records')}
+            jobs.append((trains.iloc[allocation[r]], route, {**route_options, 'previous_solution': route_previous}))
+        
+        wall_start = time.perf_counter()
+        if workers == 1:
+            results = [_solve_route_subproblem(job) for job in jobs]
         else:
-            raise Exception(f'Optimization failed with status: {status}')
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_solve_route_subproblem, jobs))
+        wall_time = time.perf_counter() - wall_start
+        
+        # Merge onto the full model and repair any residual conflicts
+        merge_start = time.perf_counter()
+        full = self._build_model(trains, routes, slot_table, constraints_obj)
+        schedule = [a for sub_schedule, _, _, _ in results for a in sub_schedule]
+        values = np.zeros(full.n_vars)
+        values[:full.n_assign] = self._previous_assignment(full, {'schedule': schedule}).ravel()
+        for r, (_, _, _, departures) in zip(served, results):
+            slots = np.searchsorted(full.slots, departures.get(routes[r], []))
+            values[full.dispatch_index[r, slots]] = 1
+        # load_served appears in no row, so every subproblem leaves it at its upper bound
+        values[full.load_index.ravel()] = full.upper[full.load_index.ravel()]
+        values[full.occupancy_index] = full.occupancy(values)
+        repaired = self._repair(full, values)
+        merge_time = time.perf_counter() - merge_start
+        
+        sub_timings = [timings for _, timings, _, _ in results]
+        self.optimization_results['timings'] = {
+            'backend': backend,
+            'build_seconds': master_time + merge_time + sum(t['build_seconds'] for t in sub_timings),
+            'solve_seconds': sum(t['solve_seconds'] for t in sub_timings),
+            'wall_seconds': master_time + wall_time + merge_time,
+            'num_variables': full.n_vars,
+            'num_constraints': sum(t['num_constraints'] for t in sub_timings),
+            'warm_start': previous is not None,
+            'subproblems': len(jobs),
+            'workers': workers,
+            'repaired': repaired
+        }
+        
+        statuses = {status for _, _, status, _ in results}
+        solution = self._extract_solution(values, trains, routes, int(slot_table.starts[-1] + slot_table.lengths[-1]) // 60)
+        solution['objective_value'] = float(full.objective @ values)
+        solution['route_allocation'] = {
+            route: full.train_ids[allocation[r]].tolist() for r, route in enumerate(routes)
+        }
+        solution['unserved_routes'] = [route for r, route in enumerate(routes) if r not in served]
+        solution['optimization_status'] = 'feasible' if statuses != {'optimal'} or repaired \
+            or solution['unserved_routes'] else 'optimal'
+        solution['timings'] = self.optimization_results['timings']
+        return solution
+    
+    def _allocate_routes(self, trains, routes, constraints_obj, backend):
+        """Master problem: dedicate each available train to at most one route.
+        
+        Routes get an even share of the fleet and of the low-readiness trains,
+        and at least the peak minimum where the fleet allows it. Solved on a
+        one-slot ScheduleModel, so the assignment variables are (train, route).
+        Returns the train positions allocated to each route and the reserved peak minimum.
+        """
+        horizon = SlotTable(np.array([0], dtype=np.int32), np.array([1], dtype=np.int32), np.array(['ALL']))
+        master = ScheduleModel(train_ids=trains['train_id'].to_numpy(), routes=routes, slot_table=horizon)
+        y = master.assign_index[:, :, 0]  # (train, route)
+        n_routes = master.n_routes
+        
+        status = trains['status'].to_numpy() if 'status' in trains.columns else np.full(len(trains), '')
+        readiness = trains['readiness_score'].fillna(1.0).to_numpy() if 'readiness_score' in trains.columns \
+            else np.ones(len(trains))
+        available = status != 'Maintenance'
+        master.upper[y[~available].ravel()] = 0
+        n_available = int(available.sum())
+        
+        need = min(constraints_obj.min_peak_trains, constraints_obj.max_trains_per_route, n_available // n_routes)
+        share = -(-n_available // n_routes)
+        master.add_rows('one_route_per_train', y, ub=1)
+        master.add_rows('route_share', y.T, lb=need, ub=share)
+        low = np.flatnonzero(available & (readiness < 0.7))
+        if low.size:
+            master.add_rows('low_readiness_share', y[low].T, ub=-(-low.size // n_routes))
+        
+        # Integer weights keep the master CP-SAT compatible
+        master.objective[y.ravel()] = np.repeat(np.round(100 * readiness) + 1, n_routes)
+        
+        solver = SOLVER_BACKENDS[backend]()
+        solver.load(master)
+        if solver.solve() not in ('optimal', 'feasible'):
+            raise Exception('Route allocation master problem is infeasible')
+        chosen = np.round(solver.values()[y]) > 0.5
+        return [np.flatnonzero(chosen[:, r]) for r in range(n_routes)], need
+    
+    @staticmethod
+    def _repair(model, values):
+        """Drop assignments until every upper bound of the model holds.
+        
+        Covers assignment and occupancy bounds and every violated upper-bounded
+        row. Dropping from an occupancy entry removes its latest-indexed train;
+        within a row the latest-indexed entries give way first. Departures left
+        on an empty route are cleared at the end. Returns the number of
+        assignments dropped.
+        """
+        assign, occupancy = model.assign_index, model.occupancy_index
+        values[:model.n_assign] = np.minimum(values[:model.n_assign], model.upper[:model.n_assign])
+        values[occupancy] = model.occupancy(values)
+        dropped = 0
+        
+        def drop(c, amount):
+            """Zero assignments behind variable c; returns how much c decreased"""
+            nonlocal dropped
+            if c < model.n_assign:
+                trains = [c] if values[c] > 0.5 else []
+            elif occupancy.flat[0] <= c <= occupancy.flat[-1]:
+                r, s = divmod(c - occupancy.flat[0], model.n_slots)
+                trains = [v for v in assign[::-1, r, s] if values[v] > 0.5]
+            else:
+                return 0
+            trains = trains[:int(np.ceil(amount - 1e-9))]
+            for v in trains:
+                values[v] = 0
+                values[occupancy[model.route_idx[v], model.slot_idx[v]]] -= 1
+            dropped += len(trains)
+            return len(trains)
+        
+        for c in np.flatnonzero(values[occupancy.ravel()] > model.upper[occupancy.ravel()] + 1e-9):
+            c = occupancy.flat[c]
+            drop(c, values[c] - model.upper[c])
+        for block in model.blocks:
+            coefs = np.broadcast_to(np.asarray(block.coef, dtype=float), block.cols.shape)
+            activity = (np.where(block.cols >= 0, values[block.cols], 0) * coefs).sum(axis=1)
+            for row in np.flatnonzero(activity > block.ub + 1e-9):
+                excess = activity[row] - block.ub[row]
+                for c, coef in zip(block.cols[row][::-1], coefs[row][::-1]):
+                    if excess <= 1e-9:
+                        break
+                    if c >= 0 and coef > 0:
+                        excess -= coef * drop(c, excess / coef)
+        dispatch = model.dispatch_index
+        values[dispatch] = np.minimum(values[dispatch], values[occupancy] > 0.5)
+        return dropped
+    
+    @staticmethod
+    def _context_minutes(constraints):
+        """How far back committed slots still constrain a new window"""
+        return int(max(constraints.min_service_interval, constraints.max_service_interval))
     
     def _parse_constraints(self, constraints_dict):
         """Parse constraint dictionary into structured constraints"""
@@ -63,238 +500,217 @@ class MetroOptimizer:
             min_service_interval=constraints_dict.get('min_interval', 5),
             max_service_interval=constraints_dict.get('max_interval', 15),
             maintenance_windows=constraints_dict.get('maintenance_windows', []),
-            crew_shift_duration=constraints_dict.get('crew_shift_hours', 8),
-            brand_hour_requirements=constraints_dict.get('brand_requirements', {})
+            crew_shift_duration=constraints_dict.get('crew_shift_hours'),
+            brand_hour_requirements=constraints_dict.get('brand_requirements', {}),
+            min_peak_trains=constraints_dict.get('min_peak_trains', 2),
+            crew_count=constraints_dict.get('crew_count')
         )
     
-    def _create_variables(self, trains, routes, time_horizon):
+    def _create_slot_table(self, time_horizon, slot_minutes=5, resolution=None):
+        """Time slots: one table shared by every constraint family"""
+        if resolution == 'variable':
+            resolution = VARIABLE_SLOT_RESOLUTION
+        return SlotTable.build(time_horizon, slot_minutes, resolution)
+    
+    def _create_variables(self, trains, routes, slot_table):
         """Create decision variables for optimization"""
-        variables = {}
-        
-        # Time slots (every 5 minutes)
-        time_slots = list(range(0, time_horizon * 60, 5))  # 5-minute intervals
-        
         # Binary variable: train i assigned to route j at time t
-        variables['assignment'] = {}
-        for _, train in trains.iterrows():
-            for route in routes:
-                for t in time_slots:
-                    var_name = f'assign_{train["train_id"]}_{route}_{t}'
-                    variables['assignment'][(train['train_id'], route, t)] = \
-                        self.solver.IntVar(0, 1, var_name)
-        
-        # Continuous variable: passenger load served
-        variables['load_served'] = {}
-        for route in routes:
-            for t in time_slots:
-                var_name = f'load_{route}_{t}'
-                variables['load_served'][(route, t)] = \
-                    self.solver.NumVar(0, 1000, var_name)  # Max 1000 passengers per slot
-        
-        return variables
+        # Continuous variable: passenger load served per route and slot (max 1000 passengers)
+        self.model = ScheduleModel(
+            train_ids=trains['train_id'].to_numpy(),
+            routes=routes,
+            slot_table=slot_table
+        )
+        return self.model
     
-    def _add_operational_constraints(self, variables, trains, routes, constraints):
+    def _add_operational_constraints(self, model, trains, routes, constraints):
         """Add operational constraints"""
-        time_slots = list(range(0, 24 * 60, 5))
+        x = model.assign_index  # (train, route, slot) -> variable index
+        occupancy = model.occupancy_index  # (route, slot) -> trains on the route
         
         # Constraint 1: Each train can be assigned to at most one route at any time
-        for _, train in trains.iterrows():
-            for t in time_slots:
-                constraint_vars = []
-                for route in routes:
-                    if (train['train_id'], route, t) in variables['assignment']:
-                        constraint_vars.append(variables['assignment'][(train['train_id'], route, t)])
-                
-                if constraint_vars:
-                    self.solver.Add(sum(constraint_vars) <= 1)
-        
-        # Constraint 2: Maximum trains per route
-        for route in routes:
-            for t in time_slots:
-                route_assignments = []
-                for _, train in trains.iterrows():
-                    if (train['train_id'], route, t) in variables['assignment']:
-                        route_assignments.append(variables['assignment'][(train['train_id'], route, t)])
-                
-                if route_assignments:
-                    self.solver.Add(sum(route_assignments) <= constraints.max_trains_per_route)
-        
-        # Constraint 3: Service interval constraints
-        for route in routes:
-            for i, t1 in enumerate(time_slots[:-1]):
-                t2 = time_slots[i + 1]
-                if t2 - t1 < constraints.min_service_interval:
-                    # Ensure minimum service interval
-                    assignments_t1 = []
-                    assignments_t2 = []
-                    
-                    for _, train in trains.iterrows():
-                        if (train['train_id'], route, t1) in variables['assignment']:
-                            assignments_t1.append(variables['assignment'][(train['train_id'], route, t1)])
-                        if (train['train_id'], route, t2) in variables['assignment']:
-                            assignments_t2.append(variables['assignment'][(train['train_id'], route, t2)])
-                    
-                    if assignments_t1 and assignments_t2:
-                        self.solver.Add(sum(assignments_t1) + sum(assignments_t2) <= 1)
+        model.add_rows('one_route_per_train', x.transpose(0, 2, 1).reshape(-1, model.n_routes), ub=1)
+        
+        # Route occupancy: defined once per (route, slot) as the sum of its assignments
+        link = np.concatenate([x.transpose(1, 2, 0).reshape(-1, model.n_trains), occupancy.reshape(-1, 1)], axis=1)
+        coef = np.ones(link.shape)
+        coef[:, -1] = -1
+        model.add_rows('route_occupancy', link, lb=0, ub=0, coef=coef)
+        
+        # Constraint 2: Maximum trains per route (a bound on the aggregate, not a row)
+        model.upper[occupancy.ravel()] = np.minimum(model.upper[occupancy.ravel()], constraints.max_trains_per_route)
+        
+        # Constraint 3: Service interval (headway) constraints as sliding windows over departures.
+        # A route can only dispatch from a slot it has a train on.
+        dispatch = model.dispatch_index
+        coef = np.ones((model.n_routes * model.n_slots, 2))
+        coef[:, 1] = -1
+        model.add_rows('dispatch_needs_train', np.stack([dispatch.ravel(), occupancy.ravel()], axis=1),
+                       ub=0, coef=coef)
+        
+        # Minimum interval: at most one departure in any window shorter than the interval
+        dense = model.window_rows(dispatch, constraints.min_service_interval, min_slots=2)
+        if dense.size:
+            model.add_rows('min_service_interval', dense.reshape(-1, dense.shape[2]), ub=1)
+        
+        # Maximum interval: with the service level constraints, once maintenance fixes the fleet
     
-    def _add_resource_constraints(self, variables, trains, constraints):
+    def _add_resource_constraints(self, model, trains, constraints):
         """Add resource-based constraints"""
-        time_slots = list(range(0, 24 * 60, 5))
-        
-        # Maintenance window constraints
-        for _, train in trains.iterrows():
-            if train['status'] == 'Maintenance':
-                # Train cannot be assigned during maintenance
-                for route in ['Red Line', 'Blue Line', 'Green Line']:  # Default routes
-                    for t in time_slots:
-                        if (train['train_id'], route, t) in variables['assignment']:
-                            self.solver.Add(variables['assignment'][(train['train_id'], route, t)] == 0)
-            
-            # Readiness constraints
-            elif train.get('readiness_score', 1.0) < 0.7:
-                # Low readiness trains have limited assignment
-                total_assignments = []
-                for route in ['Red Line', 'Blue Line', 'Green Line']:
-                    for t in time_slots:
-                        if (train['train_id'], route, t) in variables['assignment']:
-                            total_assignments.append(variables['assignment'][(train['train_id'], route, t)])
-                
-                if total_assignments:
-                    max_assignments = int(len(time_slots) * 0.3)  # Limit to 30% of time slots
-                    self.solver.Add(sum(total_assignments) <= max_assignments)
+        status = trains['status'].to_numpy() if 'status' in trains.columns else np.full(len(trains), '')
+        readiness = trains['readiness_score'].fillna(1.0).to_numpy() if 'readiness_score' in trains.columns \
+            else np.ones(len(trains))
+        
+        # Maintenance window constraints: train cannot be assigned during maintenance
+        in_maintenance = status == 'Maintenance'
+        model.upper[model.assign_index[in_maintenance].ravel()] = 0
+        
+        # Scheduled maintenance: a window as long as its block is fixed (variable bounds); a shorter
+        # block is placed by the solver, and together with crew shifts becomes an interval rule
+        rules = IntervalRules(
+            shift_minutes=int(round(constraints.crew_shift_duration * 60)) if constraints.crew_shift_duration else None,
+            crew_capacity=constraints.crew_count
+        )
+        positions = pd.Index(model.train_ids)
+        span = (int(model.slots[0]), int(model.slots[-1] + model.slot_lengths[-1]))
+        for window in constraints.maintenance_windows or []:
+            i = positions.get_indexer([str(window[0])])[0]
+            earliest, latest = int(round(window[1] * 60)), int(round(window[2] * 60))
+            if i < 0 or latest <= span[0] or earliest >= span[1]:
+                continue  # train or window outside this model
+            duration = int(round(window[3] * 60)) if len(window) > 3 else latest - earliest
+            if duration >= latest - earliest:
+                overlap = (model.slots < latest) & (model.slots + model.slot_lengths > earliest)
+                model.upper[model.assign_index[i][:, overlap].ravel()] = 0
+            elif model.upper[model.assign_index[i]].any():
+                rules.maintenance.append((i, earliest, latest, duration))
+        if rules:
+            model.intervals = rules
+        
+        # Readiness constraints: low readiness trains limited to 30% of the horizon (in minutes).
+        # Every train has a row (the whole horizon when not capped), so a readiness change
+        # only moves a row bound and a compiled model can be reused.
+        low_readiness = ~in_maintenance & (readiness < 0.7)
+        if model.readiness_budget is not None:
+            max_minutes = np.floor(np.asarray(model.readiness_budget, dtype=float))
+        else:
+            max_minutes = np.full(model.n_trains, float(self._readiness_cap_minutes(model)))
+        max_minutes = np.where(low_readiness, max_minutes, float(model.slot_lengths.sum()))
+        weights = np.broadcast_to(model.slot_lengths, (model.n_trains, model.n_routes, model.n_slots))
+        model.add_rows('low_readiness_cap', model.assign_index.reshape(model.n_trains, -1),
+                       ub=max_minutes, coef=weights.reshape(model.n_trains, -1))
+    
+    @staticmethod
+    def _readiness_cap_minutes(model):
+        """Low-readiness trains may serve at most 30% of the horizon"""
+        return int(int(model.slot_lengths.sum()) * 0.3)
     
-    def _add_service_level_constraints(self, variables, routes, constraints):
+    def _add_service_level_constraints(self, model, routes, constraints):
         """Add service level constraints"""
-        time_slots = list(range(0, 24 * 60, 5))
-        
-        # Minimum service level during peak hours
-        peak_hours = list(range(7*60, 10*60, 5)) + list(range(17*60, 20*60, 5))  # 7-10 AM, 5-8 PM
-        
-        for route in routes:
-            for t in peak_hours:
-                if t in time_slots:
-                    # At least 2 trains during peak hours
-                    peak_assignments = []
-                    for train_id in variables['assignment']:
-                        if variables['assignment'][train_id][1] == route and variables['assignment'][train_id][2] == t:
-                            peak_assignments.append(variables['assignment'][train_id])
-                    
-                    # This constraint might need adjustment based on actual variable structure
-                    # Simplified version for demonstration
+        # Minimum service level during peak hours (SERVICE_PATTERNS PEAK: 7-10 AM, 5-8 PM)
+        peak = np.flatnonzero(model.slot_table.patterns == 'PEAK')
+        # Clamped to what the fleet can cover: trains not blocked by maintenance, shared across routes
+        available = int((model.upper[model.assign_index].reshape(model.n_trains, -1) > 0).any(axis=1).sum())
+        min_trains = min(constraints.min_peak_trains, constraints.max_trains_per_route,
+                         available // max(model.n_routes, 1))
+        if peak.size and min_trains > 0:
+            peak_occupancy = model.occupancy_index[:, peak].ravel()
+            model.lower[peak_occupancy] = np.maximum(model.lower[peak_occupancy], min_trains)
+        
+        # Maximum interval: every window of that length within service hours has a departure,
+        # on as many routes (first listed first) as there are available trains. The other
+        # routes keep their rows with lb 0, so the model structure does not depend on the fleet.
+        service = np.flatnonzero(np.isin(model.slot_table.patterns, ['PEAK', 'OFF_PEAK']))
+        sparse = model.window_rows(model.dispatch_index, constraints.max_service_interval, starts=service)
+        if sparse.size:
+            covered = (np.arange(model.n_routes) < available).astype(float)
+            model.add_rows('max_service_interval', sparse.reshape(-1, sparse.shape[2]),
+                           lb=np.tile(covered, sparse.shape[0]))
     
-    def _set_objective(self, variables, trains, routes):
+    def _set_objective(self, model, trains, routes):
         """Set optimization objective function"""
-        objective_terms = []
+        # Terms are per 5 minutes of slot length so coarse slots weigh what their fine slots would
+        slot_weight = model.slot_lengths / 5.0
         
         # Maximize passenger service (higher weight)
-        for route in routes:
-            for t in range(0, 24 * 60, 5):
-                if (route, t) in variables['load_served']:
-                    objective_terms.append(variables['load_served'][(route, t)] * 10)
-        
-        # Minimize operational cost (train assignments)
-        for key, var in variables['assignment'].items():
-            train_id, route, t = key
-            # Find train cost factor
-            train_cost = 1.0  # Base cost
-            objective_terms.append(var * (-train_cost))  # Negative for minimization
-        
-        # Maximize train utilization (balance usage)
-        train_usage = {}
-        for key, var in variables['assignment'].items():
-            train_id, route, t = key
-            if train_id not in train_usage:
-                train_usage[train_id] = []
-            train_usage[train_id].append(var)
-        
-        # Add utilization balance terms
-        for train_id, usage_vars in train_usage.items():
-            if len(usage_vars) > 1:
-                # Encourage balanced usage
-                total_usage = sum(usage_vars)
-                objective_terms.append(total_usage * 0.1)
-        
-        # Set objective
-        if objective_terms:
-            self.solver.Maximize(sum(objective_terms))
+        model.objective[model.load_index.ravel()] = np.tile(10 * slot_weight, model.n_routes)
+        
+        # Minimize operational cost (train assignments, base cost 1.0)
+        assignment_coef = -1.0
+        
+        # Maximize train utilization (balance usage) for trains with more than one slot
+        if model.n_routes * model.n_slots > 1:
+            assignment_coef += 0.1
+        model.objective[:model.n_assign] = assignment_coef * slot_weight[model.slot_idx]
     
-    def _extract_solution(self, variables, trains, routes, time_horizon):
-        """Extract solution from solved optimization"""
+    def _extract_solution(self, values, trains, routes, time_horizon):
+        """Extract solution from solved optimization
+        
+        Chosen assignments are decoded in bulk through the model's index arrays
+        into a columnar frame (kept as self.schedule_frame); the record lists in
+        the solution are views of that frame for API consumers.
+        """
+        model = self.model
+        
+        # Extract assignments (binary variable threshold)
+        chosen = np.flatnonzero(values[:model.n_assign] > 0.5)
+        slot = model.slot_idx[chosen]
+        time_slot = model.slots[slot].astype(int)
+        frame = pd.DataFrame({
+            'train_id': model.train_ids[model.train_idx[chosen]],
+            'route': np.asarray(model.routes, dtype=object)[model.route_idx[chosen]],
+            'time': pd.Series(time_slot // 60).astype(str).str.zfill(2) + ':'
+                    + pd.Series(time_slot % 60).astype(str).str.zfill(2),
+            'time_slot': time_slot,
+            'slot_minutes': model.slot_lengths[slot].astype(int)
+        })
+        self.schedule_frame = frame
+        
         solution = {
-            'schedule': [],
-            'assignments': {},
+            'schedule': frame.to_dict('records'),
+            'assignments': {
+                train_id: group[['route', 'time']].to_dict('records')
+                for train_id, group in frame.groupby('train_id', sort=False)
+            },
             'performance_metrics': {},
             'optimization_status': 'optimal'
         }
         
-        # Extract assignments
-        for key, var in variables['assignment'].items():
-            if var.solution_value() > 0.5:  # Binary variable threshold
-                train_id, route, time_slot = key
-                
-                # Convert time slot to readable format
-                hours = time_slot // 60
-                minutes = time_slot % 60
-                time_str = f"{hours:02d}:{minutes:02d}"
-                
-                assignment = {
-                    'train_id': train_id,
-                    'route': route,
-                    'time': time_str,
-                    'time_slot': time_slot
-                }
-                
-                solution['schedule'].append(assignment)
-                
-                if train_id not in solution['assignments']:
-                    solution['assignments'][train_id] = []
-                solution['assignments'][train_id].append({
-                    'route': route,
-                    'time': time_str
-                })
+        # Departure slots per route (headway decisions)
+        dispatched = values[model.dispatch_index] > 0.5
+        solution['departures'] = {
+            route: model.slots[dispatched[r]].astype(int).tolist() for r, route in enumerate(model.routes)
+        }
         
         # Calculate performance metrics
-        solution['performance_metrics'] = self._calculate_solution_metrics(solution, trains, routes)
+        solution['performance_metrics'] = self._calculate_solution_metrics(frame, trains, routes)
         
         # Store current solution
         self.current_solution = solution
         
         return solution
     
-    def _calculate_solution_metrics(self, solution, trains, routes):
-        """Calculate performance metrics for the solution"""
+    def _calculate_solution_metrics(self, schedule, trains, routes):
+        """Calculate performance metrics for a columnar schedule frame"""
         metrics = {}
         
         # Total scheduled trips
-        metrics['total_trips'] = len(solution['schedule'])
+        metrics['total_trips'] = len(schedule)
         
         # Train utilization
         if not trains.empty:
-            utilized_trains = len(solution['assignments'])
-            total_trains = len(trains)
-            metrics['train_utilization'] = (utilized_trains / total_trains) * 100
+            metrics['train_utilization'] = (schedule['train_id'].nunique() / len(trains)) * 100
         else:
             metrics['train_utilization'] = 0
         
         # Route coverage
-        covered_routes = set(assignment['route'] for assignment in solution['schedule'])
-        metrics['route_coverage'] = (len(covered_routes) / len(routes)) * 100
-        
-        # Service frequency (average interval between services per route)
-        route_frequencies = {}
-        for route in routes:
-            route_times = [
-                assignment['time_slot'] for assignment in solution['schedule'] 
-                if assignment['route'] == route
-            ]
-            if len(route_times) > 1:
-                route_times.sort()
-                intervals = [route_times[i+1] - route_times[i] for i in range(len(route_times)-1)]
-                route_frequencies[route] = sum(intervals) / len(intervals) if intervals else 60
-            else:
-                route_frequencies[route] = 60  # Default 60 minutes if no service
+        metrics['route_coverage'] = (schedule['route'].nunique() / len(routes)) * 100
         
-        metrics['average_service_interval'] = sum(route_frequencies.values()) / len(route_frequencies)
+        # Service frequency: mean gap between sorted services per route is (last - first) / (trips - 1);
+        # routes with at most one service default to 60 minutes
+        by_route = schedule.groupby('route')['time_slot'].agg(['min', 'max', 'count']).reindex(routes)
+        intervals = ((by_route['max'] - by_route['min']) / (by_route['count'] - 1)).where(by_route['count'] > 1, 60)
+        metrics['average_service_interval'] = float(intervals.mean())
         
         return metrics
     
@@ -368,3 +784,9 @@ class MetroOptimizer:
                 'impact': 'Improved service frequency on 6 route segments'
             }
         ]
+
+def _solve_route_subproblem(job):
+    """Process-pool worker: schedule one route with the trains allocated to it"""
+    trains, route, options = job
+    solution = MetroOptimizer().optimize_schedule(trains, [route], **options)
+    return solution['schedule'], solution['timings'], solution['optimization_status'], solution['departures']
@@ -5,11 +5,18 @@ PuLP-based induction optimizer for KMRL SIH25081 project.
 """
 import os
 import logging
-from typing import Optional, Dict, Any
+import threading
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Sequence, Tuple
 import pandas as pd
 import numpy as np
 import pickle
-from pulp import LpProblem, LpVariable, LpBinary, lpSum, LpMaximize, LpStatus, PULP_CBC_CMD
+from .bay_allocation import allocate_bays
+from .induction_solver import InductionProblem, solve_induction
+from .jobcard_store import JobCardStore, load_job_card_store
+from .night_slots import schedule_night_shift
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,31 +29,94 @@ DEFAULT_WEIGHTS = {
     "efficiency": 0.08
 }
 
+# Inputs of a readiness model that does not record its own feature names, in order
+READINESS_FEATURES = (
+    "certificate_valid",
+    "cert_days_left_rolling_stock",
+    "cert_days_left_signalling",
+    "cert_days_left_telecom",
+    "mileage_km",
+    "MileageSinceLastServiceKM",
+    "BrakepadWear%",
+    "HVACWear%",
+    "DoorSystemWear%",
+    "battery_health",
+    "OpenJobCards",
+    "critical_jobs_open"
+)
+READINESS_MODEL_CACHE_SIZE = 4  # unpickled models kept per process
+
+@dataclass(frozen=True)
+class ReadinessModel:
+    """An unpickled readiness model and the validated order of its input columns"""
+    model: Any
+    features: Tuple[str, ...]
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        missing = [c for c in self.features if c not in df.columns]
+        if missing:
+            logger.warning("Readiness features missing from trainset data (using 0): %s", missing)
+        X = np.ascontiguousarray(df.reindex(columns=list(self.features)).to_numpy(dtype=np.float32, na_value=0.0))
+        with warnings.catch_warnings():
+            # Columns are already in the model's order; sklearn only warns that X has no names
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            if hasattr(self.model, "predict_proba"):
+                preds = np.asarray(self.model.predict_proba(X), dtype=float)
+                if preds.ndim == 2 and preds.shape[1] == 2:
+                    return preds[:, 1]
+                return preds
+            return np.asarray(self.model.predict(X), dtype=float)
+
+_readiness_models: "OrderedDict[Tuple, ReadinessModel]" = OrderedDict()
+_readiness_models_lock = threading.Lock()
+
+def load_readiness_model(model_path: str, features: Optional[Sequence[str]] = None) -> ReadinessModel:
+    """The model at model_path, unpickled once per (path, modification time, features).
+
+    Features are the model's own feature_names_in_ when it has them, else
+    `features` (default READINESS_FEATURES); they are checked against the
+    model's n_features_in_ when it is loaded.
+    """
+    path = os.path.abspath(model_path)
+    key = (path, os.stat(path).st_mtime_ns, tuple(features) if features is not None else None)
+    with _readiness_models_lock:
+        if key in _readiness_models:
+            _readiness_models.move_to_end(key)
+            return _readiness_models[key]
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+        if not hasattr(model, "predict_proba") and not hasattr(model, "predict"):
+            raise TypeError(f"Readiness model at {model_path} has no predict/predict_proba")
+        names = getattr(model, "feature_names_in_", None)
+        if names is not None:
+            if features is not None and list(features) != list(names):
+                raise ValueError(f"Readiness model at {model_path} was fitted on {list(names)}, not {list(features)}")
+            features = names
+        features = tuple(str(c) for c in (features if features is not None else READINESS_FEATURES))
+        n_expected = getattr(model, "n_features_in_", None)
+        if n_expected is not None and int(n_expected) != len(features):
+            raise ValueError(f"Readiness model at {model_path} expects {n_expected} features, got {len(features)}")
+        loaded = ReadinessModel(model, features)
+        _readiness_models[key] = loaded
+        while len(_readiness_models) > READINESS_MODEL_CACHE_SIZE:
+            _readiness_models.popitem(last=False)
+        logger.info("Loaded readiness model from %s (%d features)", model_path, len(features))
+        return loaded
+
 def safe_load_csv(path: str) -> pd.DataFrame:
     if not path or not os.path.exists(path):
         logger.warning("CSV not found: %s (returning empty DataFrame)", path)
         return pd.DataFrame()
     return pd.read_csv(path)
 
-def compute_readiness_from_ml(df: pd.DataFrame, model_path: Optional[str]) -> pd.Series:
+def compute_readiness_from_ml(df: pd.DataFrame, model_path: Optional[str],
+                              features: Optional[Sequence[str]] = None) -> pd.Series:
     n = len(df)
     if n == 0:
         return pd.Series(dtype=float)
     try:
         if model_path and os.path.exists(model_path):
-            with open(model_path, "rb") as f:
-                model = pickle.load(f)
-            numeric = df.select_dtypes(include=[np.number]).fillna(0)
-            if hasattr(model, "predict_proba"):
-                preds = model.predict_proba(numeric)
-                if preds.ndim == 2 and preds.shape[1] == 2:
-                    readiness = preds[:,1]
-                else:
-                    readiness = np.array(preds, dtype=float)
-            else:
-                preds = model.predict(numeric)
-                readiness = np.array(preds, dtype=float)
-            readiness = np.clip(readiness, 0.0, 1.0)
+            readiness = np.clip(load_readiness_model(model_path, features).predict(df), 0.0, 1.0)
             logger.info("Readiness computed from ML model at %s", model_path)
             return pd.Series(readiness, index=df.index)
     except Exception as e:
@@ -79,6 +149,10 @@ def compute_readiness_from_ml(df: pd.DataFrame, model_path: Optional[str]) -> pd
     logger.info("Readiness computed heuristically (no ML model)")
     return readiness
 
+def _column(df: pd.DataFrame, name: str, default) -> pd.Series:
+    """df[name], or a constant column when it is missing"""
+    return df[name] if name in df.columns else pd.Series(default, index=df.index)
+
 def normalize_series(s: pd.Series) -> pd.Series:
     if s.empty:
         return s
@@ -88,28 +162,65 @@ def normalize_series(s: pd.Series) -> pd.Series:
         return pd.Series(0.0, index=s.index)
     return (s - mn) / (mx - mn)
 
-def run_optimization(
-    trainset_csv: str,
-    jobcards_csv: str = None,
-    model_path: Optional[str] = None,
-    weights: Optional[Dict[str, float]] = None,
-    min_peak_trainsets: int = 18,
-    stabling_capacity_field: Optional[str] = "stabling_capacity",
-    depot_field: Optional[str] = "location",
-    id_field: str = "trainset_id",
-    solver_time_limit: int = 30
-) -> Dict[str, Any]:
+def component_scores(df_ts: pd.DataFrame) -> pd.DataFrame:
+    """Normalized utility components per trainset, one column per DEFAULT_WEIGHTS key.
+
+    Expects the readiness, withdrawal_risk, mileage_km and branding columns
+    run_optimization derives; utility is this matrix times the weight vector.
+    """
+    mileage_dev = (df_ts["mileage_km"] - df_ts["mileage_km"].mean()).abs()
+    branding_need = np.maximum(df_ts["branding_min_hours"] - df_ts["branding_hours_today"], 0.0)
+    if "shunting_score" in df_ts.columns:
+        efficiency = normalize_series(df_ts["shunting_score"])
+    else:
+        efficiency = pd.Series(0.5, index=df_ts.index)
+    return pd.DataFrame({
+        "service_readiness": normalize_series(df_ts["readiness"]),
+        "punctuality_protection": 1.0 - normalize_series(df_ts["withdrawal_risk"]),
+        "maintenance_cost": 1.0 - normalize_series(mileage_dev),
+        "revenue_protection": 1.0 - normalize_series(pd.Series(branding_need, index=df_ts.index)),
+        "efficiency": efficiency
+    }, index=df_ts.index).astype(float)
+
+def normalize_weights(weights: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Weights scaled to sum to 1 (DEFAULT_WEIGHTS when None)"""
     if weights is None:
         weights = DEFAULT_WEIGHTS.copy()
     total = sum(weights.values())
     if total <= 0:
         raise ValueError("Weights must sum to > 0")
-    weights = {k: float(v) / total for k, v in weights.items()}
+    return {k: float(v) / total for k, v in weights.items()}
+
+@dataclass
+class InductionData:
+    """Trainset frame with the derived columns run_optimization scores, plus its hard constraints"""
+    df_ts: pd.DataFrame
+    id_field: str
+    blocked: np.ndarray  # certificate or critical-job exclusion per trainset
+    depots: Optional[np.ndarray] = None
+    capacities: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def ids(self):
+        return self.df_ts[self.id_field].astype(str).tolist()
+
+def prepare_induction_data(
+    trainset_csv: str,
+    jobcards_csv: str = None,
+    model_path: Optional[str] = None,
+    depot_field: Optional[str] = "location",
+    id_field: str = "trainset_id",
+    job_store: Optional[JobCardStore] = None
+) -> Optional[InductionData]:
+    """Load and derive everything the induction problem needs; None when there is no trainset data.
+
+    critical_jobs_open comes from job_store when given, else from the store
+    loaded for jobcards_csv, else from the trainset CSV's own column.
+    """
     df_ts = safe_load_csv(trainset_csv)
-    df_jobs = safe_load_csv(jobcards_csv) if jobcards_csv else pd.DataFrame()
     if df_ts.empty:
         logger.error("No trainset data found at %s", trainset_csv)
-        return {"selected_trainsets": [], "pulp_status": "NO_DATA", "objective_value": 0.0, "details": df_ts}
+        return None
     if id_field not in df_ts.columns:
         possible_ids = [c for c in df_ts.columns if "train" in c.lower() and "id" in c.lower()]
         if possible_ids:
@@ -117,107 +228,108 @@ def run_optimization(
             logger.warning("Using %s as id_field", id_field)
         else:
             raise KeyError(f"Trainset ID column not found (expected '{id_field}')")
-    if not df_jobs.empty:
-        job_id_col = next((c for c in df_jobs.columns if "train" in c.lower() and "id" in c.lower()), None)
-        if job_id_col is None:
-            job_id_col = id_field
-        critical_flag = None
-        for c in ["priority", "priority_level", "is_critical"]:
-            if c in df_jobs.columns:
-                critical_flag = c
-                break
-        if critical_flag:
-            crit_cond = df_jobs[critical_flag].astype(str).str.lower().isin(["critical", "1", "true", "yes"])
-            crit_counts = df_jobs.loc[crit_cond].groupby(job_id_col).size().rename("critical_jobs_open")
-            df_ts = df_ts.set_index(id_field).join(crit_counts).reset_index()
-            df_ts["critical_jobs_open"] = df_ts["critical_jobs_open"].fillna(0).astype(int)
-        else:
-            counts = df_jobs.groupby(job_id_col).size().rename("open_jobs_count")
-            df_ts = df_ts.set_index(id_field).join(counts).reset_index()
-            df_ts["critical_jobs_open"] = (df_ts["open_jobs_count"].fillna(0) > 0).astype(int)
+    if job_store is None and jobcards_csv:
+        job_store = load_job_card_store(jobcards_csv)
+        if job_store is None:
+            logger.warning("CSV not found: %s (using critical_jobs_open from trainset data)", jobcards_csv)
+    if job_store is not None:
+        df_ts["critical_jobs_open"] = job_store.critical_open_counts(df_ts[id_field].astype(str))
     else:
-        df_ts["critical_jobs_open"] = df_ts.get("critical_jobs_open", 0).fillna(0).astype(int)
+        df_ts["critical_jobs_open"] = _column(df_ts, "critical_jobs_open", 0).fillna(0).astype(int)
     df_ts["readiness"] = compute_readiness_from_ml(df_ts, model_path)
     if "withdrawal_risk" not in df_ts.columns:
         df_ts["withdrawal_risk"] = 1.0 - df_ts["readiness"]
     mileage_col = next((c for c in df_ts.columns if "mileage" in c.lower()), None)
     if mileage_col is None:
-        df_ts["mileage_km"] = df_ts.get("mileage", 0).fillna(0).astype(float)
+        df_ts["mileage_km"] = _column(df_ts, "mileage", 0).fillna(0).astype(float)
     else:
         df_ts["mileage_km"] = df_ts[mileage_col].fillna(0).astype(float)
     if "branding_hours_today" not in df_ts.columns:
-        df_ts["branding_hours_today"] = df_ts.get("branding_hours", 0).fillna(0).astype(float)
+        df_ts["branding_hours_today"] = _column(df_ts, "branding_hours", 0).fillna(0).astype(float)
     if "branding_min_hours" not in df_ts.columns:
         df_ts["branding_min_hours"] = 0.0
-    prob = LpProblem("KMRL_Induction_Selection", LpMaximize)
-    ids = df_ts[id_field].astype(str).tolist()
-    x = {tid: LpVariable(f"x_{tid}", cat=LpBinary) for tid in ids}
+    blocked = np.zeros(len(df_ts), dtype=bool)
     cert_flag = None
     for c in df_ts.columns:
         if "certificate_valid" in c.lower() or "cert_valid" in c.lower():
             cert_flag = c
             break
     if cert_flag:
-        for _, row in df_ts.iterrows():
-            if int(row.get(cert_flag, 0)) == 0:
-                prob += x[str(row[id_field])] == 0, f"cert_required_{row[id_field]}"
+        blocked |= df_ts[cert_flag].fillna(0).astype(int).to_numpy() == 0
     else:
         cert_days_cols = [c for c in df_ts.columns if "cert_days_left" in c]
         if len(cert_days_cols) >= 1:
-            for _, row in df_ts.iterrows():
-                if any(row.get(c, 999) <= 0 for c in cert_days_cols):
-                    prob += x[str(row[id_field])] == 0, f"cert_days_required_{row[id_field]}"
+            blocked |= (df_ts[cert_days_cols].fillna(999) <= 0).any(axis=1).to_numpy()
         else:
             logger.warning("No certificate info found; can't enforce certificate hard constraint. Be careful!")
-    for _, row in df_ts.iterrows():
-        if int(row.get("critical_jobs_open", 0)) > 0:
-            prob += x[str(row[id_field])] == 0, f"critical_jobs_block_{row[id_field]}"
-    prob += lpSum([x[tid] for tid in ids]) >= int(min_peak_trainsets), "min_peak_trainsets"
+    blocked |= df_ts["critical_jobs_open"].to_numpy() > 0
+    depots, caps = None, {}
     if depot_field in df_ts.columns and "depot_capacities.csv" in os.listdir(os.path.dirname(trainset_csv) or "."):
         try:
             depot_caps = pd.read_csv(os.path.join(os.path.dirname(trainset_csv), "depot_capacities.csv"))
-            caps = depot_caps.set_index("location")["capacity"].to_dict()
-            for loc, cap in caps.items():
-                members = df_ts[df_ts[depot_field] == loc][id_field].astype(str).tolist()
-                if members:
-                    prob += lpSum([x[m] for m in members]) <= int(cap), f"depot_cap_{loc}"
+            caps = {loc: int(cap) for loc, cap in depot_caps.set_index("location")["capacity"].items()}
+            depots = df_ts[depot_field].to_numpy()
         except Exception as e:
             logger.warning("Could not apply depot capacities: %s", e)
-    readiness_norm = normalize_series(df_ts["readiness"])
-    withdrawal_risk_norm = normalize_series(df_ts["withdrawal_risk"])
-    mileage_dev = (df_ts["mileage_km"] - df_ts["mileage_km"].mean()).abs()
-    mileage_norm = normalize_series(mileage_dev)
-    branding_need = np.maximum(df_ts["branding_min_hours"] - df_ts["branding_hours_today"], 0.0)
-    branding_norm = normalize_series(pd.Series(branding_need, index=df_ts.index))
-    if "shunting_score" in df_ts.columns:
-        efficiency_norm = normalize_series(df_ts["shunting_score"])
-    else:
-        efficiency_norm = pd.Series(0.5, index=df_ts.index)
-    service_component = readiness_norm
-    punctuality_component = 1.0 - withdrawal_risk_norm
-    maintenance_component = 1.0 - mileage_norm
-    revenue_component = 1.0 - branding_norm
-    efficiency_component = efficiency_norm
-    utility = (
-        weights["service_readiness"] * service_component +
-        weights["punctuality_protection"] * punctuality_component +
-        weights["maintenance_cost"] * maintenance_component +
-        weights["revenue_protection"] * revenue_component +
-        weights["efficiency"] * efficiency_component
-    )
-    prob += lpSum([utility.iloc[i] * x[str(df_ts.iloc[i][id_field])] for i in range(len(df_ts))]), "Total_Utility"
-    solver = PULP_CBC_CMD(timeLimit=solver_time_limit, msg=False)
-    prob.solve(solver)
-    status = LpStatus.get(prob.status, str(prob.status))
-    selected = [tid for tid in ids if x[tid].value() == 1.0]
-    objective_value = prob.objective.value() if prob.objective is not None else None
+    return InductionData(df_ts, id_field, blocked, depots, caps)
+
+def run_optimization(
+    trainset_csv: str,
+    jobcards_csv: str = None,
+    model_path: Optional[str] = None,
+    weights: Optional[Dict[str, float]] = None,
+    min_peak_trainsets: int = 18,
+    stabling_capacity_field: Optional[str] = "stabling_capacity",
+    depot_field: Optional[str] = "location",
+    id_field: str = "trainset_id",
+    solver_time_limit: int = 30,
+    solver: str = "auto",
+    job_store: Optional[JobCardStore] = None,
+    plan_bays: bool = False,
+    train_data_csv: Optional[str] = None,
+    plan_night_slots: bool = False,
+    night_slot_options: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Select trainsets for induction (see induction_solver; solver is 'auto', 'greedy', 'cbc' or 'ortools').
+
+    With plan_bays and depot capacities, 'bay_plan' places every trainset in
+    a stabling bay (see bay_allocation), inducted ones leaving in decreasing
+    utility order. With plan_night_slots, cleaning and inspection jobs from
+    train_data_csv are scheduled first ('night_slots', see night_slots) and
+    the trainsets they hold are not inducted.
+    """
+    weights = normalize_weights(weights)
+    data = prepare_induction_data(trainset_csv, jobcards_csv, model_path, depot_field, id_field, job_store)
+    if data is None:
+        return {"selected_trainsets": [], "pulp_status": "NO_DATA", "objective_value": 0.0, "details": pd.DataFrame()}
+    df_ts, id_field, ids = data.df_ts, data.id_field, data.ids
+    scores = component_scores(df_ts)
+    utility = pd.Series(scores.to_numpy() @ np.array([weights[k] for k in scores.columns]), index=df_ts.index)
+    blocked = data.blocked
+    night_slots = None
+    if plan_night_slots:
+        night_slots = schedule_night_shift(safe_load_csv(train_data_csv), ids, data.blocked, **(night_slot_options or {}))
+        blocked = blocked | np.isin(ids, night_slots["held_inspection"] + night_slots["held_cleaning"])
+    problem = InductionProblem(ids, utility.to_numpy(), blocked, int(min_peak_trainsets),
+                               data.depots, data.capacities)
+    result = solve_induction(problem, solver, solver_time_limit)
+    status, objective_value = result.status, result.objective_value
+    selected = [tid for tid, chosen in zip(ids, result.selected) if chosen]
     df_ts["selected_for_induction"] = df_ts[id_field].astype(str).isin(selected).astype(int)
     df_ts["utility_score"] = utility.values
-    logger.info("Optimization finished with status %s, objective %s, selected %d trainsets",
-                status, objective_value, len(selected))
-    return {
+    logger.info("Optimization finished with status %s (%s), objective %s, selected %d trainsets",
+                status, result.solver, objective_value, len(selected))
+    output = {
         "selected_trainsets": selected,
         "pulp_status": status,
+        "solver": result.solver,
         "objective_value": objective_value,
         "details": df_ts[[id_field, "selected_for_induction", "utility_score", "readiness", "withdrawal_risk", "mileage_km", "critical_jobs_open"] + ([depot_field] if depot_field in df_ts.columns else [])]
     }
+    if plan_bays and data.capacities:
+        departure_order = df_ts.loc[df_ts["selected_for_induction"] == 1].sort_values(
+            "utility_score", ascending=False, kind="stable")[id_field].astype(str).tolist()
+        output["bay_plan"] = allocate_bays(df_ts, data.capacities, departure_order, id_field, depot_field)
+    if night_slots is not None:
+        output["night_slots"] = night_slots
+    return output
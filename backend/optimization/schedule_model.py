@@ -0,0 +1,313 @@
+"""
+backend/optimization/schedule_model.py
+
+Solver-independent representation of the MetroOptimizer schedule model.
+
+Assignment variables are dense over (train, route, slot) and addressed by
+integer index arithmetic, so every constraint family is generated as a block
+of index rows with NumPy instead of dictionary lookups. Route-level families
+are written on per-(route, slot) aggregates rather than on every train's
+variables: capacity and peak service bound the occupancy (trains on the
+route), headways are sliding windows over a departure indicator.
+"""
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    from ..utils.constants import SERVICE_PATTERNS
+except ImportError:  # backend/ on sys.path (orchestrator, api)
+    from utils.constants import SERVICE_PATTERNS
+
+# Slot length (minutes) per service pattern for variable-resolution models:
+# fine in the peaks, coarse overnight.
+VARIABLE_SLOT_RESOLUTION = {'PEAK': 5, 'OFF_PEAK': 15, 'NIGHT': 30}
+
+def service_pattern(hour: int) -> str:
+    """SERVICE_PATTERNS bucket for an hour of day; unlisted (overnight) hours count as NIGHT"""
+    for pattern in ('PEAK', 'OFF_PEAK'):
+        if hour in SERVICE_PATTERNS[pattern]['hours']:
+            return pattern
+    return 'NIGHT'
+
+@dataclass
+class SlotTable:
+    """Start minute, length and service pattern of every time slot in the horizon"""
+    starts: np.ndarray
+    lengths: np.ndarray
+    patterns: np.ndarray
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def build(cls, time_horizon: int = 24, slot_minutes: int = 5,
+              resolution: Optional[Dict[str, int]] = None) -> 'SlotTable':
+        """Uniform slot_minutes slots, or per-pattern lengths from resolution.
+
+        Slots never straddle an hour boundary, so each one has a single pattern.
+        """
+        horizon = int(time_horizon * 60)
+        starts, lengths, patterns = [], [], []
+        minute = 0
+        while minute < horizon:
+            pattern = service_pattern((minute // 60) % 24)
+            length = int(resolution.get(pattern, slot_minutes)) if resolution else int(slot_minutes)
+            if length <= 0:
+                raise ValueError(f'Slot length must be positive (got {length} for {pattern})')
+            end = min(minute + length, (minute // 60 + 1) * 60 if resolution else horizon, horizon)
+            starts.append(minute)
+            lengths.append(end - minute)
+            patterns.append(pattern)
+            minute = end
+        return cls(np.array(starts, dtype=np.int32), np.array(lengths, dtype=np.int32), np.array(patterns))
+
+    def slice(self, lo: int, hi: int) -> 'SlotTable':
+        """Sub-table of slots [lo, hi), keeping absolute start minutes"""
+        return SlotTable(self.starts[lo:hi], self.lengths[lo:hi], self.patterns[lo:hi])
+
+@dataclass
+class RowBlock:
+    """A family of linear rows: lb <= sum(coef * x[cols]) <= ub.
+
+    cols has one row of variable indices per constraint; -1 entries are padding.
+    coef is either a scalar shared by every entry or an array shaped like cols.
+    """
+    name: str
+    cols: np.ndarray
+    lb: np.ndarray
+    ub: np.ndarray
+    coef: object = 1.0
+
+    def __len__(self):
+        return self.cols.shape[0]
+
+    def rows(self):
+        """Iterate (variable indices, coefficients, lb, ub) with padding stripped"""
+        coefs = np.broadcast_to(np.asarray(self.coef, dtype=float), self.cols.shape)
+        padded = (self.cols < 0).any()
+        for cols, coef, lb, ub in zip(self.cols, coefs, self.lb, self.ub):
+            if padded:
+                keep = cols >= 0
+                cols, coef = cols[keep], coef[keep]
+            yield cols, coef, lb, ub
+
+@dataclass
+class IntervalRules:
+    """Interval-structured rules on each train's busy time (minutes from horizon start).
+
+    shift_minutes: a train's service must fit inside one crew shift of at most
+    this length. crew_capacity: at most this many shifts may overlap at any
+    time. maintenance: flexible blocks (train position, earliest, latest,
+    duration); the block is placed somewhere in [earliest, latest) and the
+    train cannot serve while it runs. Fixed blocks are plain variable bounds
+    and never reach this structure.
+    """
+    shift_minutes: Optional[int] = None
+    crew_capacity: Optional[int] = None
+    maintenance: List[Tuple[int, int, int, int]] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.shift_minutes or self.maintenance)
+
+@dataclass
+class ScheduleModel:
+    """Variables, bounds, rows and objective of one schedule optimization"""
+    train_ids: np.ndarray
+    routes: List[str]
+    slot_table: SlotTable
+    max_load: float = 1000.0
+    blocks: List[RowBlock] = field(default_factory=list)
+    readiness_budget: Optional[np.ndarray] = None  # per-train minutes; overrides the 30% cap
+    previous: Optional[np.ndarray] = None  # (train, route, slot) 0/1 warm-start assignment
+    intervals: Optional[IntervalRules] = None  # native in CP-SAT, linearized for MIP backends
+
+    def __post_init__(self):
+        self.train_ids = np.asarray(self.train_ids).astype(str)
+        self.routes = list(self.routes)
+        self.slots = self.slot_table.starts
+        self.slot_lengths = self.slot_table.lengths
+        self.n_trains = len(self.train_ids)
+        self.n_routes = len(self.routes)
+        self.n_slots = len(self.slots)
+        self.n_assign = self.n_trains * self.n_routes * self.n_slots
+        n_route_slots = self.n_routes * self.n_slots
+        self.n_vars = self.n_assign + 3 * n_route_slots
+
+        # Index arithmetic: assignment v = (i * R + r) * S + s, load_served = n_assign + r * S + s,
+        # occupancy (trains on route r in slot s) = n_assign + R * S + r * S + s,
+        # dispatch (route r has a departure in slot s) = n_assign + 2 * R * S + r * S + s
+        self.assign_index = np.arange(self.n_assign, dtype=np.int64).reshape(
+            self.n_trains, self.n_routes, self.n_slots
+        )
+        self.load_index = self.n_assign + np.arange(self.n_routes * self.n_slots, dtype=np.int64).reshape(
+            self.n_routes, self.n_slots
+        )
+        self.occupancy_index = self.load_index + n_route_slots
+        self.dispatch_index = self.occupancy_index + n_route_slots
+        self.train_idx, self.route_idx, self.slot_idx = (
+            a.ravel() for a in np.indices((self.n_trains, self.n_routes, self.n_slots), dtype=np.int32)
+        )
+
+        self.lower = np.zeros(self.n_vars)
+        self.upper = np.ones(self.n_vars)
+        self.upper[self.load_index.ravel()] = self.max_load
+        self.upper[self.occupancy_index.ravel()] = self.n_trains
+        self.is_integer = np.zeros(self.n_vars, dtype=bool)
+        self.is_integer[:self.n_assign] = True
+        self.is_integer[self.occupancy_index.ravel()] = True
+        self.is_integer[self.dispatch_index.ravel()] = True
+        self.objective = np.zeros(self.n_vars)
+
+    def add_rows(self, name: str, cols: np.ndarray, lb=-np.inf, ub=np.inf, coef=1.0) -> Optional[RowBlock]:
+        cols = np.asarray(cols, dtype=np.int64)
+        if cols.size == 0:
+            return None
+        cols = cols.reshape(cols.shape[0], -1)
+        n = cols.shape[0]
+        if np.ndim(coef):
+            coef = np.asarray(coef, dtype=float).reshape(cols.shape)
+        block = RowBlock(
+            name=name,
+            cols=cols,
+            lb=np.broadcast_to(np.asarray(lb, dtype=float), (n,)),
+            ub=np.broadcast_to(np.asarray(ub, dtype=float), (n,)),
+            coef=coef
+        )
+        self.blocks.append(block)
+        return block
+
+    @property
+    def num_constraints(self) -> int:
+        return sum(len(b) for b in self.blocks)
+
+    def row_bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(lb, ub) of every row, in block order"""
+        if not self.blocks:
+            return np.empty(0), np.empty(0)
+        return np.concatenate([b.lb for b in self.blocks]), np.concatenate([b.ub for b in self.blocks])
+
+    def structure_key(self) -> str:
+        """Digest of everything a loaded solver model is built from except the numbers
+        that can be updated in place: variable bounds, row bounds and objective."""
+        digest = hashlib.sha1()
+        for part in (self.train_ids, np.array(self.routes), self.slots, self.slot_lengths, self.is_integer):
+            digest.update(np.ascontiguousarray(part).tobytes())
+            digest.update(b'|')
+        for block in self.blocks:
+            digest.update(f'{block.name}{block.cols.shape}'.encode())
+            digest.update(np.ascontiguousarray(block.cols).tobytes())
+            digest.update(np.ascontiguousarray(block.coef, dtype=float).tobytes())
+        digest.update(repr(self.intervals).encode())
+        return digest.hexdigest()
+
+    def variable_name(self, v: int) -> str:
+        if v < self.n_assign:
+            i, r, s = self.train_idx[v], self.route_idx[v], self.slot_idx[v]
+            return f'assign_{self.train_ids[i]}_{self.routes[r]}_{self.slots[s]}'
+        kind, offset = divmod(v - self.n_assign, self.n_routes * self.n_slots)
+        r, s = divmod(offset, self.n_slots)
+        return f"{('load', 'occupancy', 'dispatch')[kind]}_{self.routes[r]}_{self.slots[s]}"
+
+    def occupancy(self, values: np.ndarray) -> np.ndarray:
+        """(route, slot) train counts implied by the assignment part of a value vector"""
+        return values[self.assign_index].sum(axis=0)
+
+    def window_rows(self, index: np.ndarray, minutes: int, starts: Optional[np.ndarray] = None,
+                    min_slots: int = 1) -> np.ndarray:
+        """Rows of a (route, slot) aggregate index over every sliding window of the given length.
+
+        One window starts at each slot in `starts` (all slots by default) and
+        covers the slots beginning before start + minutes. Windows running past
+        the end of the model, or covering fewer than min_slots slots, are
+        dropped. Rows are padded with -1 to the widest window.
+        """
+        starts = np.arange(self.n_slots) if starts is None else np.asarray(starts)
+        ends = np.searchsorted(self.slots, self.slots[starts] + minutes, side='left')
+        fits = self.slots[starts] + minutes <= self.slots[-1] + self.slot_lengths[-1]
+        keep = fits & (ends - starts >= min_slots)
+        starts, ends = starts[keep], ends[keep]
+        if starts.size == 0:
+            return np.empty((0, self.n_routes, 0), dtype=np.int64)
+        width = int((ends - starts).max())
+        offsets = starts[:, None] + np.arange(width)
+        slot = np.where(offsets < ends[:, None], offsets, -1)  # (windows, width)
+        rows = np.where(slot >= 0, index[:, np.maximum(slot, 0)], -1)  # (R, windows, width)
+        return rows.transpose(1, 0, 2)  # (windows, route, width)
+
+    def maintenance_starts(self, rule: Tuple[int, int, int, int]) -> np.ndarray:
+        """Slot-aligned start minutes a flexible maintenance block may take"""
+        _, earliest, latest, duration = rule
+        starts = self.slots[(self.slots >= earliest) & (self.slots + duration <= latest)]
+        if starts.size == 0:
+            raise ValueError(f'Maintenance block of {duration} min does not fit in [{earliest}, {latest}) min')
+        return starts
+
+    def linearize_intervals(self):
+        """Binary linearization of the interval rules for MIP backends.
+
+        Returns (n_aux, blocks, maintenance_choices). Row blocks index model
+        variables followed by n_aux auxiliary binaries; maintenance_choices
+        lists, per block, its start-choice indices and start minutes.
+
+        A shift is two monotone step functions per train, b (shift has begun
+        by slot s) and e (shift is over before slot s): a train may only be
+        busy where b - e = 1, and once begun at slot s it must be over by the
+        first slot that no longer fits a shift starting at s.
+        """
+        rules, x = self.intervals, self.assign_index
+        T, S = self.n_trains, self.n_slots
+        ends = self.slots + self.slot_lengths
+        n_aux, blocks, choices = 0, [], []
+
+        def rows(name, cols, lb=-np.inf, ub=np.inf, coef=1.0):
+            cols = np.asarray(cols, dtype=np.int64).reshape(len(cols), -1)
+            n = cols.shape[0]
+            if n:
+                blocks.append(RowBlock(name, cols, np.broadcast_to(np.asarray(lb, dtype=float), (n,)),
+                                       np.broadcast_to(np.asarray(ub, dtype=float), (n,)),
+                                       np.asarray(coef, dtype=float) if np.ndim(coef) else coef))
+
+        if rules.shift_minutes:
+            b = self.n_vars + np.arange(T * S).reshape(T, S)
+            e = b + T * S
+            n_aux = 2 * T * S
+            busy = np.concatenate([x.transpose(0, 2, 1), b[..., None], e[..., None]], axis=2)  # (T, S, R + 2)
+            coef = np.ones(busy.shape)
+            coef[..., -2] = -1
+            rows('shift_covers_service', busy.reshape(T * S, -1), ub=0, coef=coef.reshape(T * S, -1))
+            step = np.ones((T * (S - 1), 2))
+            step[:, 1] = -1
+            for name, index in (('shift_begun_stays', b), ('shift_over_stays', e)):
+                rows(name, np.stack([index[:, 1:], index[:, :-1]], axis=2).reshape(-1, 2), lb=0, coef=step)
+            rows('shift_over_after_begun', np.stack([e, b], axis=2).reshape(-1, 2), ub=0,
+                 coef=np.tile([1.0, -1.0], (T * S, 1)))
+            # First slot that no longer fits a shift starting at each slot
+            beyond = np.searchsorted(ends, self.slots + rules.shift_minutes, side='right')
+            fits = beyond < S
+            pairs = np.stack([e[:, beyond[fits]], b[:, fits]], axis=2).reshape(-1, 2)
+            rows('shift_length', pairs, lb=0, coef=np.tile([1.0, -1.0], (pairs.shape[0], 1)))
+            if rules.crew_capacity is not None:
+                active = np.concatenate([b.T, e.T], axis=1)  # (S, 2T)
+                coef = np.concatenate([np.ones((S, T)), -np.ones((S, T))], axis=1)
+                rows('crew_capacity', active, ub=rules.crew_capacity, coef=coef)
+
+        for rule in rules.maintenance:
+            i, earliest, latest, duration = rule
+            starts = self.maintenance_starts(rule)
+            z = self.n_vars + n_aux + np.arange(starts.size)
+            n_aux += starts.size
+            choices.append((z, starts))
+            rows('maintenance_placed', z[None, :], lb=1, ub=1)
+            slots = np.flatnonzero((self.slots < latest) & (ends > earliest))
+            # Start choices whose block overlaps each slot
+            overlap = (starts[None, :] < ends[slots, None]) & (starts[None, :] + duration > self.slots[slots, None])
+            width = int(overlap.sum(axis=1).max())
+            conflict = np.full((slots.size, self.n_routes + width), -1, dtype=np.int64)
+            conflict[:, :self.n_routes] = x[i][:, slots].T
+            for k, row in enumerate(overlap):
+                hit = z[row]
+                conflict[k, self.n_routes:self.n_routes + hit.size] = hit
+            rows('maintenance_no_overlap', conflict, ub=1)
+        return n_aux, blocks, choices
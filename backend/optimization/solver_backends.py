@@ -0,0 +1,284 @@
+"""
+backend/optimization/solver_backends.py
+
+Solver backends for MetroOptimizer. Each backend loads a ScheduleModel,
+solves it with optional time limit / relative gap / worker count and exposes
+the incumbent as a NumPy array indexed like the model's variables. A loaded
+backend can be re-pointed at another model of the same structure (see
+ScheduleModel.structure_key) with update(), which only pushes the bounds and
+objective coefficients that changed.
+"""
+import os
+from typing import Optional
+import numpy as np
+from ortools.linear_solver import linear_solver_pb2, pywraplp
+from ortools.sat.python import cp_model
+
+def _changed(old_lb, old_ub, new_lb, new_ub) -> np.ndarray:
+    """Positions whose (lb, ub) pair differs"""
+    return np.flatnonzero((old_lb != new_lb) | (old_ub != new_ub))
+
+class MipBackend:
+    """OR-Tools linear solver wrapper (SCIP by default)"""
+    name = 'mip'
+
+    STATUS_NAMES = {
+        pywraplp.Solver.OPTIMAL: 'optimal',
+        pywraplp.Solver.FEASIBLE: 'feasible',
+        pywraplp.Solver.INFEASIBLE: 'infeasible',
+        pywraplp.Solver.UNBOUNDED: 'unbounded',
+        pywraplp.Solver.ABNORMAL: 'abnormal',
+        pywraplp.Solver.NOT_SOLVED: 'not_solved'
+    }
+    NO_TIME_LIMIT_MS = 10 ** 12
+
+    def __init__(self, solver_id: str = 'SCIP'):
+        self.solver = pywraplp.Solver.CreateSolver(solver_id)
+        if not self.solver:
+            raise Exception(f'{solver_id} solver unavailable')
+        self.variables = []
+        self.constraints = []
+        self.n_vars = 0
+        self.maintenance_choices = []
+        self.status = 'not_solved'
+        self._time_limited = False
+
+    def load(self, model):
+        solver = self.solver
+        infinity = solver.infinity()
+        self.n_vars = model.n_vars
+        self.variables = [
+            solver.IntVar(lo, hi, model.variable_name(v)) if model.is_integer[v]
+            else solver.NumVar(lo, hi, model.variable_name(v))
+            for v, (lo, hi) in enumerate(zip(model.lower, model.upper))
+        ]
+        blocks = model.blocks
+        if model.intervals:
+            # No interval variables here: shifts and flexible maintenance become auxiliary binaries
+            n_aux, interval_blocks, self.maintenance_choices = model.linearize_intervals()
+            self.variables += [solver.BoolVar(f'aux_{k}') for k in range(n_aux)]
+            blocks = blocks + interval_blocks
+
+        for block in blocks:
+            for cols, coefs, lb, ub in block.rows():
+                ct = solver.Constraint(-infinity if np.isneginf(lb) else lb, infinity if np.isposinf(ub) else ub)
+                for c, coef in zip(cols, coefs):
+                    ct.SetCoefficient(self.variables[c], coef)
+                self.constraints.append(ct)
+
+        objective = solver.Objective()
+        for v in np.flatnonzero(model.objective):
+            objective.SetCoefficient(self.variables[v], model.objective[v])
+        objective.SetMaximization()
+        self._loaded = (model.lower.copy(), model.upper.copy(), *model.row_bounds(), model.objective.copy())
+
+    def update(self, model):
+        """Take bounds, row bounds and objective from a model with the loaded structure"""
+        infinity = self.solver.infinity()
+        lower, upper, row_lb, row_ub, objective = self._loaded
+        new_lb, new_ub = model.row_bounds()
+        for v in _changed(lower, upper, model.lower, model.upper):
+            self.variables[v].SetBounds(model.lower[v], model.upper[v])
+        for k in _changed(row_lb, row_ub, new_lb, new_ub):
+            self.constraints[k].SetBounds(-infinity if np.isneginf(new_lb[k]) else new_lb[k],
+                                          infinity if np.isposinf(new_ub[k]) else new_ub[k])
+        coefficients = self.solver.Objective()
+        for v in np.flatnonzero(objective != model.objective):
+            coefficients.SetCoefficient(self.variables[v], model.objective[v])
+        self.solver.SetHint([], [])
+        self._loaded = (model.lower.copy(), model.upper.copy(), new_lb, new_ub, model.objective.copy())
+
+    def set_hint(self, indices, values):
+        """Warm-start values for a subset of variables"""
+        self.solver.SetHint([self.variables[v] for v in indices], [float(x) for x in values])
+
+    def solve(self, time_limit: Optional[float] = None, relative_gap: Optional[float] = None,
+              num_workers: Optional[int] = None) -> str:
+        if time_limit:
+            self.solver.SetTimeLimit(max(int(time_limit * 1000), 1))  # SCIP fails on a 0 ms limit
+        elif self._time_limited:
+            self.solver.SetTimeLimit(self.NO_TIME_LIMIT_MS)  # a reused solver keeps its last limit
+        self._time_limited = bool(time_limit)
+        if num_workers:
+            self.solver.SetNumThreads(int(num_workers))
+        params = pywraplp.MPSolverParameters()
+        if relative_gap is not None:
+            params.SetDoubleParam(params.RELATIVE_MIP_GAP, relative_gap)
+        self.status = self.STATUS_NAMES.get(self.solver.Solve(params), 'unknown')
+        return self.status
+
+    def values(self) -> np.ndarray:
+        """All variable values in one call (solution response proto, not per-variable lookups)"""
+        response = linear_solver_pb2.MPSolutionResponse()
+        self.solver.FillSolutionResponseProto(response)
+        return np.array(response.variable_value, dtype=float)[:self.n_vars]
+
+    def maintenance_starts(self):
+        """Chosen start minute of each flexible maintenance block"""
+        return [
+            int(starts[np.argmax([self.variables[v].solution_value() for v in z])])
+            for z, starts in self.maintenance_choices
+        ]
+
+    @property
+    def objective_value(self) -> float:
+        return self.solver.Objective().Value()
+
+class CpSatBackend:
+    """OR-Tools CP-SAT wrapper with parallel search workers.
+
+    Continuous load variables are modelled as integers, which is exact for
+    this model since they only carry integer bounds.
+    """
+    name = 'cp_sat'
+
+    def __init__(self):
+        self.model = cp_model.CpModel()
+        self.solver = cp_model.CpSolver()
+        self.variables = []
+        self.constraints = []
+        self.n_vars = 0
+        self.maintenance_vars = []
+        self.status = 'not_solved'
+
+    def load(self, model):
+        cp = self.model
+        self.n_vars = model.n_vars
+        self.variables = [
+            cp.NewIntVar(int(lo), int(hi), model.variable_name(v))
+            for v, (lo, hi) in enumerate(zip(model.lower, model.upper))
+        ]
+        if model.intervals:
+            self._load_intervals(model)
+
+        for block in model.blocks:
+            if not np.all(np.mod(block.coef, 1) == 0):
+                raise ValueError(f'CP-SAT rows need integer coefficients (block {block.name})')
+            for cols, coefs, lb, ub in block.rows():
+                expr = cp_model.LinearExpr.WeightedSum([self.variables[c] for c in cols], coefs.astype(int).tolist())
+                self.constraints.append(cp.AddLinearConstraint(expr, *self._domain(lb, ub)).Index())
+
+        self._maximize(model.objective)
+        self._loaded = (model.lower.copy(), model.upper.copy(), *model.row_bounds(), model.objective.copy())
+
+    @staticmethod
+    def _domain(lb, ub):
+        return (cp_model.INT_MIN if np.isneginf(lb) else int(np.ceil(lb)),
+                cp_model.INT_MAX if np.isposinf(ub) else int(np.floor(ub)))
+
+    def _maximize(self, objective):
+        terms = np.flatnonzero(objective)
+        self.model.Maximize(cp_model.LinearExpr.WeightedSum(
+            [self.variables[v] for v in terms], objective[terms].tolist()
+        ))
+
+    def update(self, model):
+        """Take bounds, row bounds and objective from a model with the loaded structure.
+
+        Domains are rewritten in the model proto (through the model, not the
+        Constraint wrappers); the objective is replaced whole if any term changed.
+        """
+        proto = self.model.Proto()
+        lower, upper, row_lb, row_ub, objective = self._loaded
+        new_lb, new_ub = model.row_bounds()
+        for v in _changed(lower, upper, model.lower, model.upper):
+            domain = proto.variables[int(v)].domain
+            domain.clear()
+            domain.extend([int(model.lower[v]), int(model.upper[v])])
+        for k in _changed(row_lb, row_ub, new_lb, new_ub):
+            domain = proto.constraints[self.constraints[k]].linear.domain
+            domain.clear()
+            domain.extend(self._domain(new_lb[k], new_ub[k]))
+        if (objective != model.objective).any():
+            self._maximize(model.objective)
+        self.model.ClearHints()
+        self._loaded = (model.lower.copy(), model.upper.copy(), new_lb, new_ub, model.objective.copy())
+
+    def _load_intervals(self, model):
+        """Shifts and flexible maintenance as interval variables.
+
+        Each busy (train, slot) is an optional fixed interval. A train's shift
+        is one interval of at most shift_minutes that must contain all of them,
+        shifts share crew_capacity through a cumulative constraint, and a
+        flexible maintenance block may not overlap the train's busy slots.
+        """
+        cp, rules = self.model, model.intervals
+        starts = model.slots.astype(int).tolist()
+        lengths = model.slot_lengths.astype(int).tolist()
+        ends = [s + l for s, l in zip(starts, lengths)]
+        horizon = ends[-1]
+
+        busy = {}
+        for i in range(model.n_trains):
+            # Every train gets its literals, even if blocked now, so update() may unblock it
+            for s in range(model.n_slots):
+                literal = cp.NewBoolVar(f'busy_{i}_{s}')
+                cp.Add(sum(self.variables[v] for v in model.assign_index[i, :, s]) == literal)
+                busy[i, s] = literal
+
+        if rules.shift_minutes:
+            shifts = []
+            for i in {i for i, _ in busy}:
+                start = cp.NewIntVar(0, horizon, f'shift_start_{i}')
+                size = cp.NewIntVar(0, int(rules.shift_minutes), f'shift_size_{i}')
+                end = cp.NewIntVar(0, horizon, f'shift_end_{i}')
+                shifts.append(cp.NewIntervalVar(start, size, end, f'shift_{i}'))
+                for s in range(model.n_slots):
+                    cp.Add(start <= starts[s]).OnlyEnforceIf(busy[i, s])
+                    cp.Add(end >= ends[s]).OnlyEnforceIf(busy[i, s])
+            if rules.crew_capacity is not None and shifts:
+                cp.AddCumulative(shifts, [1] * len(shifts), int(rules.crew_capacity))
+
+        for rule in rules.maintenance:
+            i, earliest, latest, duration = (int(v) for v in rule)
+            model.maintenance_starts(rule)  # raises when the block cannot fit
+            start = cp.NewIntVar(earliest, latest - duration, f'maintenance_start_{i}')
+            block = cp.NewFixedSizeIntervalVar(start, duration, f'maintenance_{i}')
+            self.maintenance_vars.append(start)
+            served = [
+                cp.NewOptionalFixedSizeIntervalVar(starts[s], lengths[s], busy[i, s], f'slot_{i}_{s}')
+                for s in range(model.n_slots)
+                if (i, s) in busy and starts[s] < latest and ends[s] > earliest
+            ]
+            cp.AddNoOverlap([block] + served)
+
+    def set_hint(self, indices, values):
+        """Warm-start values for a subset of variables"""
+        for v, x in zip(indices, values):
+            self.model.AddHint(self.variables[v], int(round(x)))
+
+    def solve(self, time_limit: Optional[float] = None, relative_gap: Optional[float] = None,
+              num_workers: Optional[int] = None) -> str:
+        self.solver = cp_model.CpSolver()  # parameters start from defaults on every (re-)solve
+        params = self.solver.parameters
+        params.num_workers = int(num_workers or os.cpu_count() or 1)
+        # Sums of Booleans >= 1 (headway windows) are presolved into clauses, which the
+        # default LP leaves out; the full linearization keeps them in the bound. On the
+        # 20-train benchmark fleet a single worker proves optimality in 2.4 s with it and
+        # not within 60 s without. The extra max_lp and core workers join the default
+        # portfolio (8 workers: 3.7 s instead of 7.3 s).
+        params.linearization_level = 2
+        params.extra_subsolvers.extend(['max_lp', 'core'])
+        if time_limit:
+            params.max_time_in_seconds = float(time_limit)
+        if relative_gap is not None:
+            params.relative_gap_limit = float(relative_gap)
+        status = self.solver.Solve(self.model)
+        self.status = self.solver.StatusName(status).lower()
+        return self.status
+
+    def values(self) -> np.ndarray:
+        return np.array(self.solver.ResponseProto().solution, dtype=float)[:self.n_vars]
+
+    def maintenance_starts(self):
+        """Chosen start minute of each flexible maintenance block"""
+        return [int(self.solver.Value(start)) for start in self.maintenance_vars]
+
+    @property
+    def objective_value(self) -> float:
+        return self.solver.ObjectiveValue()
+
+SOLVER_BACKENDS = {
+    MipBackend.name: MipBackend,
+    CpSatBackend.name: CpSatBackend
+}
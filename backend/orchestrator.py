@@ -103,6 +103,9 @@ class KMRLMasterOrchestrator:
             
             print(f"   ✅ Generated data for {len(train_df)} trains")
             
+            # Keep the standby index in step with this run's fleet status
+            self.smart_ai.sync_train_statuses(train_df)
+            
             # Step 2: Train Smart AI Models
             print("\n🧠 Step 2/5: Training Advanced AI Models...")
             self.smart_ai.train_models(schedules_df, train_df, maintenance_df)
@@ -176,12 +179,11 @@ class KMRLMasterOrchestrator:
             emergency_response = None
             if scenario:
                 print(f"   🚨 Running emergency response for: {scenario.get('type', 'unknown')}")
-                available_trains = train_df[train_df['status'] == 'Standby']
+                # Backup trains come from the standby index synced in step 1
                 emergency_response = self.smart_ai.emergency_response(
                     scenario_type=scenario.get('type', 'high_demand'),
                     affected_trains=scenario.get('affected_trains', ['KRISHNA']),
-                    affected_routes=['Red Line'],
-                    available_trains=available_trains
+                    affected_routes=['Red Line']
                 )
             
             # Step 6: Ensemble Final Decision
@@ -199,6 +199,7 @@ PERFORMANCE_BENCHMARKS = {
     'MODEL_TRAINING_MAX_TIME': 60.0,       # seconds
     'GA_OPTIMIZATION_MAX_TIME': 30.0,      # seconds
     'MOO_OPTIMIZATION_MAX_TIME': 15.0,     # seconds
+    'SCHEDULE_OPTIMIZATION_MAX_TIME': 300.0,  # seconds; nightly MetroOptimizer build + solve
     'PREDICTION_MAX_TIME': 1.0,            # seconds
     'API_RESPONSE_MAX_TIME': 5.0           # seconds
 }
@@ -0,0 +1,135 @@
+import copy
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from backend.models.ai_model import SmartMetroAI, DemandForecast
+
+@pytest.fixture(scope="module")
+def schedules():
+    rng = np.random.default_rng(0)
+    n = 300
+    return pd.DataFrame({
+        "train_id": rng.choice(["KRISHNA", "TAPTI", "NILA"], n),
+        "route": rng.choice(["Red Line", "Blue Line", "Green Line"], n),
+        "scheduled_departure": pd.Timestamp("2025-09-01") + pd.to_timedelta(rng.integers(0, 24 * 30, n), unit="h"),
+        "passenger_load": rng.integers(100, 400, n),
+        "delay_minutes": rng.exponential(2.5, n),
+        "weather_condition": rng.choice(["clear", "cloudy", "rainy"], n),
+    })
+
+@pytest.fixture(scope="module")
+def trained_ai(schedules):
+    ai = SmartMetroAI()
+    ai.train_models(schedules, pd.DataFrame(), pd.DataFrame())
+    return ai
+
+def test_forecast_demand_is_batched_per_route(trained_ai):
+    forecast = trained_ai.forecast_demand(days_ahead=30)
+    assert isinstance(forecast, DemandForecast)
+    assert forecast.predicted.shape == (3, 30 * 24)
+    assert (forecast.lower_bound <= forecast.predicted).all()
+    assert (forecast.upper_bound >= forecast.predicted).all()
+    # Single-route view matches the corresponding row of the batched forecast
+    red = trained_ai.predict_demand(days_ahead=30, route="Red Line")
+    i = forecast.routes.index("Red Line")
+    assert [r["predicted_demand"] for r in red] == forecast.predicted[i].tolist()
+    assert trained_ai.get_confidence_intervals(forecast)[0]["prediction"] == int(forecast.predicted.mean(axis=0)[0])
+
+def test_forecast_cache_hits_until_retrain(trained_ai):
+    trained_ai.forecast_cache.clear()
+    before = trained_ai.get_cache_metrics()
+    first = trained_ai.predict_demand(days_ahead=2, route="Blue Line")
+    cached = trained_ai.predict_demand(days_ahead=2, route="Blue Line")
+    assert cached == first and cached is first
+    trained_ai.predict_delays(route="Blue Line", time_of_day="08:00")
+    trained_ai.predict_delays(route="Blue Line", time_of_day="08:00")
+    after = trained_ai.get_cache_metrics()
+    assert after["hits"] - before["hits"] == 2
+    assert after["misses"] - before["misses"] == 2
+    # Cached forecasts are shared and read-only
+    with pytest.raises(TypeError):
+        cached.clear()
+    with pytest.raises(TypeError):
+        cached[0]["predicted_demand"] = 0
+    assert json.loads(json.dumps(cached)) == first
+    copy.deepcopy(cached)[0]["predicted_demand"] = 0  # copies are plain lists and dicts
+    assert trained_ai.predict_demand(days_ahead=2, route="Blue Line") == first
+    trained_ai._invalidate_forecasts()
+    trained_ai.predict_demand(days_ahead=2, route="Blue Line")
+    assert trained_ai.get_cache_metrics()["misses"] - before["misses"] == 3
+
+def test_feature_store_shares_encodings_and_views(trained_ai, schedules):
+    snapshot = trained_ai.features.schedule_features(schedules, snapshot_id="test")
+    X_delay, _ = trained_ai._prepare_delay_features(schedules, "test")
+    X_demand, _ = trained_ai._prepare_demand_features(schedules, "test")
+    assert X_delay.dtype == np.float32
+    assert np.shares_memory(X_delay, snapshot.matrix)
+    assert np.shares_memory(X_demand, snapshot.matrix)
+    assert trained_ai.features.vocabulary("route") == ["Blue Line", "Green Line", "Red Line"]
+    assert trained_ai.features.codes("route", ["Red Line", "Purple Line"]).tolist() == [2, -1]
+    trained_ai.features.release("test")
+
+def test_feature_store_sees_in_place_edits_and_delays_use_route_codes(trained_ai, schedules):
+    frame = schedules.copy()
+    before = trained_ai.features.schedule_features(frame).column("passenger_load").copy()
+    frame["passenger_load"] += 100
+    after = trained_ai.features.schedule_features(frame).column("passenger_load")
+    assert np.allclose(after, before + 100)
+    assert "error" in trained_ai.predict_delays(route="Purple Line")
+    delays = {r: trained_ai.predict_delays(route=r, time_of_day="08:00") for r in ["Red Line", "Blue Line"]}
+    assert all("error" not in d for d in delays.values())
+
+def test_fast_profile_early_stops_and_records_iterations(schedules):
+    ai = SmartMetroAI()
+    ai.train_models(schedules, pd.DataFrame(), pd.DataFrame(), profile="fast", n_jobs=1)
+    perf = ai.get_model_performance()
+    assert perf["training_profile"] == "fast"
+    for name in ("delay_prediction", "demand_forecasting"):
+        assert perf[name]["best_iteration"] is not None
+        assert perf[name]["n_estimators"] < 500
+    # Refits do not inherit early stopping (which would need an eval set)
+    version = ai.model_version
+    ai.incremental_training(schedules.head(100), "schedules")
+    assert ai.model_version == version + 1
+    with pytest.raises(ValueError):
+        ai.train_models(schedules, pd.DataFrame(), pd.DataFrame(), profile="turbo")
+
+def test_time_budget_caps_boosting_rounds(schedules):
+    ai = SmartMetroAI()
+    ai.train_models(schedules, pd.DataFrame(), pd.DataFrame(), time_budget=1e-9)
+    assert ai.get_model_performance()["delay_prediction"]["n_estimators"] == 1
+    # The expired budget does not carry over to later refits
+    ai.incremental_training(schedules.head(100), "schedules")
+    assert ai.delay_model.get_booster().num_boosted_rounds() == 100
+
+def test_emergency_backups_follow_standby_index_updates():
+    ai = SmartMetroAI()
+    for train_id, readiness, depot in [("KRISHNA", 0.95, "Muttom"), ("TAPTI", 0.85, "Kalamassery"),
+                                       ("NILA", 0.90, "Muttom"), ("PADMA", 0.75, "Muttom")]:
+        ai.update_train_status(train_id, "Standby", readiness, depot=depot, record={"train_id": train_id})
+    backups = ai.emergency_response("train_breakdown", ["VAAYU"], ["Red Line"])["backup_trains"]
+    assert [b["train_id"] for b in backups] == ["KRISHNA", "NILA"]
+    ai.update_train_status("KRISHNA", "Active", 0.95)
+    ai.update_train_status("PADMA", "Standby", 0.99)
+    backups = ai.emergency_response("train_breakdown", ["VAAYU"], ["Red Line"], depot="Muttom")["backup_trains"]
+    assert [b["train_id"] for b in backups] == ["PADMA", "NILA"]
+    frame = pd.DataFrame({"train_id": ["A", "B"], "readiness_score": [0.7, 0.92], "location": ["Muttom", "Muttom"]})
+    assert [b["train_id"] for b in ai.emergency_response("weather_disruption", [], [], frame)["backup_trains"]] == ["B"]
+
+def test_sync_train_statuses_updates_only_changes_and_keeps_depots():
+    ai = SmartMetroAI()
+    fleet = pd.DataFrame({
+        "train_id": ["KRISHNA", "TAPTI", "NILA"],
+        "status": ["Standby", "Standby", "Active"],
+        "readiness_score": [0.95, 0.85, 0.9],
+        "location": ["Muttom", "Kalamassery", "Muttom"],
+    })
+    assert ai.sync_train_statuses(fleet) == 3
+    assert ai.sync_train_statuses(fleet) == 0
+    fleet.loc[0, "status"] = "Maintenance"
+    assert ai.sync_train_statuses(fleet) == 1
+    assert [t["train_id"] for t in ai.emergency_response("high_demand", [], [])["backup_trains"]] == ["TAPTI"]
+    # Re-added without a depot, a train stays filed under its last known depot
+    ai.update_train_status("KRISHNA", "Standby", 0.95)
+    assert [t["train_id"] for t in ai.standby_index.best(depot="Muttom")] == ["KRISHNA"]
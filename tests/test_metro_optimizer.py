@@ -0,0 +1,204 @@
+import pandas as pd
+import pytest
+from backend.optimization.optimization import MetroOptimizer
+
+ROUTES = ["Red Line", "Blue Line", "Green Line"]
+
+@pytest.fixture
+def trains():
+    rows = []
+    for i in range(12):
+        rows.append({
+            "train_id": f"T{i:02d}",
+            "status": "Maintenance" if i == 0 else "Standby",
+            "readiness_score": 0.6 if i == 1 else 0.9,
+        })
+    return pd.DataFrame(rows)
+
+def test_schedule_respects_maintenance_and_peak_service(trains):
+    opt = MetroOptimizer()
+    solution = opt.optimize_schedule(trains, ROUTES)
+    schedule = pd.DataFrame(solution["schedule"])
+    assert "T00" not in set(schedule["train_id"])
+    peak = schedule[(schedule["time_slot"] >= 7 * 60) & (schedule["time_slot"] < 10 * 60)]
+    assert peak.groupby(["route", "time_slot"]).size().min() >= 2
+    assert (schedule.groupby(["train_id", "time_slot"]).size() == 1).all()
+    timings = solution["timings"]
+    assert timings["num_variables"] == 12 * 3 * 288 + 3 * 3 * 288
+    assert timings["build_seconds"] >= 0 and timings["solve_seconds"] >= 0
+
+def test_cp_sat_backend_returns_incumbent_with_status(trains):
+    opt = MetroOptimizer()
+    solution = opt.optimize_schedule(trains, ROUTES, backend="cp_sat", num_workers=2,
+                                     time_limit=10, relative_gap=0.01)
+    assert solution["optimization_status"] in ("optimal", "feasible")
+    assert solution["timings"]["backend"] == "cp_sat"
+    schedule = pd.DataFrame(solution["schedule"])
+    assert "T00" not in set(schedule["train_id"])
+    peak = schedule[(schedule["time_slot"] >= 17 * 60) & (schedule["time_slot"] < 20 * 60)]
+    assert peak.groupby(["route", "time_slot"]).size().min() >= 2
+    with pytest.raises(ValueError):
+        opt.optimize_schedule(trains, ROUTES, backend="gurobi")
+
+def test_variable_resolution_shrinks_model_and_keeps_peak_fine(trains):
+    opt = MetroOptimizer()
+    solution = opt.optimize_schedule(trains, ROUTES, resolution="variable")
+    slots = opt.model.slot_table
+    assert slots.lengths.sum() == 24 * 60
+    assert set(slots.lengths[slots.patterns == "PEAK"]) == {5}
+    assert set(slots.lengths[slots.patterns == "NIGHT"]) == {30}
+    assert len(slots) == 6 * 12 + 9 * 4 + 9 * 2
+    half_day = MetroOptimizer().optimize_schedule(trains, ROUTES, time_horizon=12, slot_minutes=10)
+    assert max(a["time_slot"] for a in half_day["schedule"]) < 12 * 60
+
+def test_rolling_horizon_stitches_a_feasible_day(trains):
+    opt = MetroOptimizer()
+    solution = opt.optimize_schedule(trains, ROUTES, backend="cp_sat", num_workers=2,
+                                     rolling_window_hours=2, rolling_overlap_minutes=30)
+    assert solution["timings"]["windows"] == 16
+    schedule = pd.DataFrame(solution["schedule"])
+    assert "T00" not in set(schedule["train_id"])
+    assert (schedule.groupby(["train_id", "time_slot"]).size() == 1).all()
+    peak = schedule[(schedule["time_slot"] >= 17 * 60) & (schedule["time_slot"] < 20 * 60)]
+    assert peak.groupby(["route", "time_slot"]).size().min() >= 2
+    # Low-readiness train stays within 30% of the day across all windows
+    assert schedule[schedule["train_id"] == "T01"]["slot_minutes"].sum() <= 0.3 * 24 * 60
+
+def test_warm_start_reuses_previous_solution_and_penalizes_changes(trains):
+    opt = MetroOptimizer()
+    first = opt.optimize_schedule(trains, ROUTES, backend="cp_sat", num_workers=2)
+    assert first["timings"]["warm_start"] is False
+    # Pull one train out of service; with a stability penalty the rest of the plan should stay put
+    changed = trains.copy()
+    moved = first["schedule"][0]["train_id"]
+    changed.loc[changed["train_id"] == moved, "status"] = "Maintenance"
+    second = opt.optimize_schedule(changed, ROUTES, backend="cp_sat", num_workers=2, stability_penalty=1.0)
+    assert second["timings"]["warm_start"] is True
+    before = {(a["train_id"], a["route"], a["time_slot"]) for a in first["schedule"] if a["train_id"] != moved}
+    after = {(a["train_id"], a["route"], a["time_slot"]) for a in second["schedule"]}
+    assert moved not in {a[0] for a in after}
+    assert before <= after
+
+def test_route_decomposition_solves_routes_in_parallel(trains):
+    routes = ROUTES + ["Yellow", "Purple"]
+    opt = MetroOptimizer()
+    result = opt.optimize_schedule(trains, routes, backend="cp_sat", decompose=True, max_workers=2)
+    timings = result["timings"]
+    assert timings["subproblems"] == len(routes) and timings["workers"] == 2
+    # Every available train is dedicated to exactly one route
+    allocated = [t for ids in result["route_allocation"].values() for t in ids]
+    assert sorted(allocated) == sorted(f"T{i:02d}" for i in range(1, 12))
+    schedule = pd.DataFrame(result["schedule"])
+    assert (schedule.groupby("train_id")["route"].nunique() == 1).all()
+    assert not schedule.duplicated(["train_id", "time_slot"]).any()
+    peak = schedule[schedule["time_slot"].between(8 * 60, 8 * 60 + 55)]
+    assert (peak.groupby(["route", "time_slot"]).size() >= 2).all()
+    assert set(peak["route"]) == set(routes)
+
+def test_headways_are_enforced_on_departures(trains):
+    opt = MetroOptimizer()
+    solution = opt.optimize_schedule(trains, ROUTES, backend="cp_sat", num_workers=2,
+                                     constraints={"min_interval": 15, "max_interval": 20})
+    for route in ROUTES:
+        departures = [t for t in solution["departures"][route] if 7 * 60 <= t < 22 * 60]
+        gaps = pd.Series(departures).diff().dropna()
+        assert gaps.min() >= 15 and gaps.max() <= 20
+    # Peak occupancy is independent of the departure headway
+    schedule = pd.DataFrame(solution["schedule"])
+    peak = schedule[schedule["time_slot"].between(8 * 60, 8 * 60 + 55)]
+    assert (peak.groupby(["route", "time_slot"]).size() >= 2).all()
+
+def test_peak_requirement_is_clamped_to_available_fleet(trains):
+    small = trains.iloc[:6]  # one in maintenance, five available for three routes
+    solution = MetroOptimizer().optimize_schedule(small, ROUTES)
+    schedule = pd.DataFrame(solution["schedule"])
+    peak = schedule[schedule["time_slot"].between(8 * 60, 8 * 60 + 55)]
+    assert len(peak.groupby(["route", "time_slot"])) == len(ROUTES) * 12
+
+def test_previous_solution_covers_its_full_slot_on_a_finer_grid(trains):
+    opt = MetroOptimizer()
+    model = opt._create_variables(trains, ROUTES, opt._create_slot_table(24, slot_minutes=5))
+    previous = {"schedule": [{"train_id": "T02", "route": "Blue Line", "time_slot": 60, "slot_minutes": 30}]}
+    hinted = opt._previous_assignment(model, previous)
+    assert hinted.sum() == 6
+    assert hinted[2, 1, 12:18].all()
+
+def test_route_decomposition_with_fewer_trains_than_routes(trains):
+    small = trains.iloc[:3]  # T00 in maintenance: two trains for three routes
+    result = MetroOptimizer().optimize_schedule(small, ROUTES, backend="cp_sat", decompose=True, max_workers=1)
+    assert len(result["unserved_routes"]) == 1
+    assert result["optimization_status"] == "feasible"
+    served = set(ROUTES) - set(result["unserved_routes"])
+    assert set(pd.DataFrame(result["schedule"])["route"]) == served
+
+def test_service_interval_clamped_to_small_fleet(trains):
+    small = trains.iloc[:3].assign(readiness_score=0.9)  # T00 in maintenance: two trains for three routes
+    constraints = {"max_interval": 5, "min_peak_trains": 1}
+    for backend in ("mip", "cp_sat"):
+        solution = MetroOptimizer().optimize_schedule(small, ROUTES, backend=backend, constraints=constraints)
+        assert solution["optimization_status"] == "optimal"
+        schedule = pd.DataFrame(solution["schedule"])
+        peak = schedule[(schedule["time_slot"] >= 7 * 60) & (schedule["time_slot"] < 10 * 60)]
+        assert (peak.groupby("route")["time_slot"].nunique() == 36).to_dict() == {"Blue Line": True, "Red Line": True}
+
+def test_crew_shifts_and_maintenance_windows_as_intervals(trains):
+    constraints = {"crew_shift_hours": 4, "crew_count": 8, "min_peak_trains": 1, "max_interval": 20,
+                   "maintenance_windows": [("T03", 6, 10, 2), ("T05", 7, 9)]}
+    solution = MetroOptimizer().optimize_schedule(trains, ROUTES, backend="cp_sat", num_workers=2,
+                                                  time_horizon=12, slot_minutes=10, constraints=constraints)
+    schedule = pd.DataFrame(solution["schedule"])
+    spans = schedule.groupby("train_id")["time_slot"].agg(lambda t: t.max() + 10 - t.min())
+    assert spans.max() <= 4 * 60
+    assert schedule.groupby("time_slot")["train_id"].nunique().max() <= 8
+    (block,) = solution["maintenance_schedule"]
+    assert block["train_id"] == "T03" and 360 <= block["start"] <= 480 and block["end"] - block["start"] == 120
+    t03 = schedule.loc[schedule["train_id"] == "T03", "time_slot"]
+    assert not ((t03 + 10 > block["start"]) & (t03 < block["end"])).any()
+    assert not schedule.loc[schedule["train_id"] == "T05", "time_slot"].between(7 * 60, 9 * 60 - 1).any()
+    with pytest.raises(ValueError):
+        MetroOptimizer().optimize_schedule(trains, ROUTES, constraints=constraints, rolling_window_hours=4)
+
+def test_compiled_model_is_updated_in_place_for_same_structure(trains):
+    opt = MetroOptimizer()
+    options = {"time_horizon": 12, "slot_minutes": 10, "warm_start": False}
+    first = opt.optimize_schedule(trains, ROUTES, **options)
+    assert not first["timings"]["model_reused"]
+    changed = trains.copy()
+    changed.loc[0, "status"], changed.loc[3, "status"] = "Standby", "Maintenance"
+    changed.loc[1, "readiness_score"], changed.loc[5, "readiness_score"] = 0.9, 0.5
+    second = opt.optimize_schedule(changed, ROUTES, **options)
+    assert second["timings"]["model_reused"]
+    fresh = MetroOptimizer().optimize_schedule(changed, ROUTES, **options)
+    assert second["objective_value"] == pytest.approx(fresh["objective_value"])
+    schedule = pd.DataFrame(second["schedule"])
+    assert "T03" not in set(schedule["train_id"])
+    assert schedule.loc[schedule["train_id"] == "T05", "slot_minutes"].sum() <= 0.3 * 12 * 60
+    other = opt.optimize_schedule(changed, ROUTES[:2], **options)
+    assert not other["timings"]["model_reused"]
+
+def test_solution_metrics_from_columnar_frame():
+    opt = MetroOptimizer()
+    schedule = pd.DataFrame({
+        "train_id": ["A", "B", "A", "C"],
+        "route": ["Red Line", "Red Line", "Red Line", "Blue Line"],
+        "time_slot": [0, 10, 30, 5],
+    })
+    trains = pd.DataFrame({"train_id": ["A", "B", "C", "D"]})
+    metrics = opt._calculate_solution_metrics(schedule, trains, ROUTES)
+    assert metrics["total_trips"] == 4
+    assert metrics["train_utilization"] == 75.0
+    assert metrics["route_coverage"] == pytest.approx(200 / 3)
+    assert metrics["average_service_interval"] == pytest.approx((15 + 60 + 60) / 3)
+
+def test_benchmark_sweep_compares_to_baseline_and_finds_window_limit(tmp_path):
+    from backend.optimization import benchmark
+    results = benchmark.sweep([4, 8], route_counts=[2], slot_minutes=[30], horizons=[6], window_seconds=60)
+    assert list(results["n_trains"]) == [4, 8] and (results["status"] == "optimal").all()
+    assert (results[["num_variables", "num_constraints", "peak_memory_mb"]] > 0).all().all()
+    path = tmp_path / "baseline.json"
+    benchmark.save_baseline(results, path)
+    compared = benchmark.compare_to_baseline(results, path)
+    assert not compared["regression"].any() and not compared["model_changed"].any()
+    assert benchmark.max_fleet_in_window(results, 60)["max_fleet_in_window"].iloc[0] == 8
+    limit = benchmark.max_fleet_in_window(results, window_seconds=1e-9).iloc[0]
+    assert pd.isna(limit["max_fleet_in_window"]) and limit["first_fleet_over_window"] == 4
@@ -1,5 +1,6 @@
 
 import os
+import pytest
 import pandas as pd
 from backend.optimization.optimization_run import run_optimization
 
@@ -15,3 +16,244 @@ def test_certificates_block_selection(tmp_path):
     res = run_optimization(str(p), jobcards_csv=None, model_path=None, min_peak_trainsets=2)
     # TS2 should not be selected
     assert "TS2" not in res["selected_trainsets"]
+
+def test_greedy_induction_matches_cbc_on_random_instances():
+    import numpy as np
+    from backend.optimization.induction_solver import InductionProblem, solve_greedy, solve_cbc, solve_ortools
+    rng = np.random.default_rng(7)
+    for _ in range(25):
+        n = int(rng.integers(4, 30))
+        depots = rng.choice(["Muttom", "Kalamassery", "Aluva"], size=n)
+        caps = {"Muttom": int(rng.integers(0, 10)), "Kalamassery": int(rng.integers(0, 10))}
+        problem = InductionProblem([f"TS{i}" for i in range(n)], rng.uniform(-0.3, 1.0, size=n),
+                                   rng.random(n) < 0.3, int(rng.integers(0, n)), depots, caps,
+                                   int(rng.integers(0, n)) if rng.random() < 0.5 else None)
+        exact, cbc, in_process = solve_greedy(problem), solve_cbc(problem), solve_ortools(problem)
+        assert in_process.status == cbc.status
+        if cbc.status == "Optimal":
+            assert exact is not None and abs(exact.objective_value - cbc.objective_value) < 1e-6
+            assert abs(in_process.objective_value - cbc.objective_value) < 1e-6
+            assert exact.selected.sum() >= problem.min_selected and not exact.selected[problem.blocked].any()
+        else:
+            assert exact is None
+
+def test_run_optimization_uses_exact_path_with_cbc_fallback(tmp_path):
+    p = tmp_path / "trainsets.csv"
+    pd.DataFrame([
+        {"trainset_id": f"TS{i}", "mileage_km": 20000 + 500 * i, "certificate_valid": int(i != 2),
+         "critical_jobs_open": int(i == 4), "location": "Muttom" if i % 2 else "Kalamassery"}
+        for i in range(8)
+    ]).to_csv(p, index=False)
+    pd.DataFrame({"location": ["Muttom", "Kalamassery"], "capacity": [2, 3]}).to_csv(
+        tmp_path / "depot_capacities.csv", index=False)
+    fast = run_optimization(str(p), min_peak_trainsets=4)
+    cbc = run_optimization(str(p), min_peak_trainsets=4, solver="cbc")
+    assert fast["solver"] == "greedy" and cbc["solver"] == "cbc"
+    assert abs(fast["objective_value"] - cbc["objective_value"]) < 1e-6
+    assert not {"TS2", "TS4"} & set(fast["selected_trainsets"])
+    infeasible = run_optimization(str(p), min_peak_trainsets=6)
+    assert infeasible["solver"] == "cbc" and infeasible["pulp_status"] == "Infeasible"
+    in_process = run_optimization(str(p), min_peak_trainsets=4, solver="ortools")
+    assert in_process["solver"] == "ortools" and abs(in_process["objective_value"] - cbc["objective_value"]) < 1e-6
+    assert run_optimization(str(p), min_peak_trainsets=6, solver="ortools")["pulp_status"] == "Infeasible"
+
+def test_utility_is_component_matrix_times_weights(tmp_path):
+    import numpy as np
+    from backend.optimization.optimization_run import DEFAULT_WEIGHTS, component_scores
+    p = tmp_path / "trainsets.csv"
+    pd.DataFrame({"trainset_id": ["TS1", "TS2", "TS3"], "mileage_km": [1000, 5000, 3000],
+                  "certificate_valid": [1, 1, 0], "shunting_score": [0.2, 0.9, 0.5],
+                  "branding_hours_today": [1.0, 0.0, 2.0], "branding_min_hours": [2.0, 2.0, 2.0]}).to_csv(p, index=False)
+    res = run_optimization(str(p), min_peak_trainsets=1, solver="cbc")
+    details = res["details"]
+    frame = details.assign(branding_hours_today=[1.0, 0.0, 2.0], branding_min_hours=2.0, shunting_score=[0.2, 0.9, 0.5])
+    scores = component_scores(frame)
+    assert list(scores.columns) == list(DEFAULT_WEIGHTS)
+    expected = scores.to_numpy() @ np.array(list(DEFAULT_WEIGHTS.values())) / sum(DEFAULT_WEIGHTS.values())
+    assert np.allclose(details["utility_score"], expected)
+    assert "TS3" not in res["selected_trainsets"]
+
+def test_multi_night_plan_balances_mileage_and_respects_expiry(tmp_path):
+    from datetime import date
+    from backend.optimization.induction_plan import plan_induction_horizon
+    p = tmp_path / "trainsets.csv"
+    names = ["KRISHNA", "TAPTI", "NILA", "SARAYU", "ARUTH", "VAIGAI", "JHANAVI", "DHWANIL"]
+    pd.DataFrame({"trainset_id": names, "mileage_km": [20000, 20400, 20100, 19800, 20300, 19900, 20200, 20050],
+                  "cert_days_left_rolling_stock": [30, 30, 30, 30, 30, 30, 30, 30],
+                  "critical_jobs_open": [0, 0, 0, 0, 0, 0, 0, 1]}).to_csv(p, index=False)
+    mileage = tmp_path / "mileage.csv"
+    pd.DataFrame({"Train ID": [f"Train-{i}" for i in range(1, 9)],
+                  "Average Daily Kilometers": [60, 70, 65, 55, 62, 58, 66, 61]}).to_csv(mileage, index=False)
+    certs = tmp_path / "certs.csv"
+    pd.DataFrame({"Train ID": ["Train-4"], "Expiry Date": ["23-09-2025"]}).to_csv(certs, index=False)
+    options = dict(nights=5, min_peak_trainsets=4, mileage_csv=str(mileage), certificates_csv=str(certs),
+                   plan_start=date(2025, 9, 20))
+    joint = plan_induction_horizon(str(p), **options)
+    greedy = plan_induction_horizon(str(p), method="sequential", **options)
+    assert joint["pulp_status"] == "Optimal"
+    assert joint["mileage_spread"] < greedy["mileage_spread"]
+    plan = joint["plan"]
+    assert (plan.sum() == 4).all()
+    assert plan.loc["SARAYU", ["night_3", "night_4"]].sum() == 0
+    assert plan.loc["DHWANIL"].sum() == 0
+
+def test_weight_sweep_groups_vectors_by_selection(tmp_path):
+    from backend.optimization.induction_sensitivity import simplex_weight_grid, weight_sensitivity
+    p = tmp_path / "trainsets.csv"
+    pd.DataFrame({"trainset_id": [f"TS{i}" for i in range(6)],
+                  "mileage_km": [18000, 26000, 20000, 23000, 21000, 19500],
+                  "certificate_valid": [1, 1, 1, 1, 0, 1], "shunting_score": [0.9, 0.1, 0.5, 0.3, 0.8, 0.2],
+                  "branding_hours_today": [0.0, 3.0, 1.0, 2.0, 0.0, 1.5],
+                  "branding_min_hours": 2.0}).to_csv(p, index=False)
+    grid = simplex_weight_grid(0.25)
+    assert len(grid) == 70 and all(abs(sum(w.values()) - 1) < 1e-9 for w in grid)
+    sweep = weight_sensitivity(str(p), grid, min_peak_trainsets=3)
+    assert sweep["pulp_status"] == "Optimal" and len(sweep["vectors"]) == 70
+    assert sum(s["n_vectors"] for s in sweep["selections"]) == 70
+    for group in sweep["selections"]:
+        weights = grid[group["vector_indices"][0]]
+        single = run_optimization(str(p), weights=weights, min_peak_trainsets=3)
+        assert sorted(single["selected_trainsets"]) == sorted(group["selected_trainsets"])
+        cbc = run_optimization(str(p), weights=weights, min_peak_trainsets=3, solver="cbc")
+        assert abs(cbc["objective_value"] - sweep["vectors"]["objective_value"][group["vector_indices"][0]]) < 1e-6
+        assert "TS4" not in group["selected_trainsets"]
+    cbc = weight_sensitivity(str(p), grid[:10], min_peak_trainsets=3, solver="cbc")
+    assert (abs(cbc["vectors"]["objective_value"] - sweep["vectors"]["objective_value"][:10]) < 1e-6).all()
+
+def test_readiness_model_is_cached_by_path_and_mtime(tmp_path):
+    import pickle
+    import numpy as np
+    from sklearn.linear_model import LogisticRegression
+    from backend.optimization.optimization_run import compute_readiness_from_ml, load_readiness_model
+    df = pd.DataFrame({"mileage_km": [1000.0, 9000.0, 4000.0, 7000.0], "certificate_valid": [1, 0, 1, 1],
+                       "battery_health": [90.0, 40.0, 80.0, 55.0], "trainset_id": ["A", "B", "C", "D"]})
+    features = ["battery_health", "mileage_km"]
+    model = LogisticRegression().fit(df[features].to_numpy(), [1, 0, 1, 0])
+    path = tmp_path / "readiness.pkl"
+    path.write_bytes(pickle.dumps(model))
+    loaded = load_readiness_model(str(path), features)
+    assert loaded is load_readiness_model(str(path), features)
+    readiness = compute_readiness_from_ml(df, str(path), features)
+    assert np.allclose(readiness, model.predict_proba(df[features].to_numpy())[:, 1])
+    os.utime(path, ns=(0, 0))
+    assert load_readiness_model(str(path), features) is not loaded
+    with pytest.raises(ValueError):
+        load_readiness_model(str(path), ["battery_health"])
+
+def test_job_card_store_counts_feed_critical_job_blocking(tmp_path):
+    from backend.optimization.jobcard_store import load_job_card_store
+    trainsets = tmp_path / "trainsets.csv"
+    pd.DataFrame({"trainset_id": ["KRISHNA", "TAPTI", "NILA"], "mileage_km": [20000, 21000, 22000],
+                  "certificate_valid": [1, 1, 1], "critical_jobs_open": [0, 0, 0]}).to_csv(trainsets, index=False)
+    jobcards = tmp_path / "jobcards.csv"
+    pd.DataFrame({"job_id": ["J1", "J2", "J3"], "trainset_id": ["KRISHNA", "TAPTI", "TAPTI"],
+                  "priority": ["critical", "critical", "medium"], "status": ["closed", "open", "in_progress"],
+                  "component": ["brakes", "doors", "hvac"]}).to_csv(jobcards, index=False)
+    pd.DataFrame({"Job Card ID": ["M1", "M2"], "Train ID": ["Train-3", "Train-3"],
+                  "Task Description": ["Inspect brake system", "Check air filter"],
+                  "Status": ["Pending", "Completed"]}).to_csv(tmp_path / "new_job_card_status.csv", index=False)
+    store = load_job_card_store(str(jobcards))
+    assert store is load_job_card_store(str(jobcards))
+    assert store.critical_open("TAPTI") == 1 and store.critical_open("KRISHNA") == 0
+    assert store.count("TAPTI", status="open") == 1 and store.count("TAPTI", priority="medium") == 1
+    assert store.count("NILA", component="brakes") == 1 and store.count("NILA", status="closed") == 1
+    res = run_optimization(str(trainsets), jobcards_csv=str(jobcards), min_peak_trainsets=1)
+    assert "TAPTI" not in res["selected_trainsets"]
+    store.close_card("J2")
+    store.open_card("J4", "Train-1", priority="critical", component="brakes")
+    assert store.critical_open("TAPTI") == 0 and store.count("KRISHNA", component="brakes") == 1
+    res = run_optimization(str(trainsets), jobcards_csv=str(jobcards), min_peak_trainsets=1)
+    assert "TAPTI" in res["selected_trainsets"] and "KRISHNA" not in res["selected_trainsets"]
+
+def test_job_card_exports_without_critical_flag_or_file(tmp_path):
+    from backend.optimization.jobcard_store import load_job_card_store
+    trainsets = tmp_path / "trainsets.csv"
+    pd.DataFrame({"trainset_id": ["KRISHNA", "TAPTI", "NILA"], "mileage_km": [20000, 21000, 22000],
+                  "certificate_valid": [1, 1, 1], "critical_jobs_open": [3, 0, 0]}).to_csv(trainsets, index=False)
+    missing = str(tmp_path / "missing.csv")
+    assert load_job_card_store(missing) is None
+    res = run_optimization(str(trainsets), jobcards_csv=missing, min_peak_trainsets=1,
+                           job_store=load_job_card_store(missing))
+    assert res["selected_trainsets"] and "KRISHNA" not in res["selected_trainsets"]
+    # No priority/priority_level/is_critical column: every unclosed card is critical
+    jobcards = tmp_path / "jobcards.csv"
+    pd.DataFrame({"job_id": ["J1", "J2"], "trainset_id": ["TAPTI", "NILA"],
+                  "status": ["open", "closed"]}).to_csv(jobcards, index=False)
+    store = load_job_card_store(str(jobcards))
+    assert store.critical_open("TAPTI") == 1 and store.critical_open("NILA") == 0
+    res = run_optimization(str(trainsets), jobcards_csv=str(jobcards), min_peak_trainsets=1)
+    assert "TAPTI" not in res["selected_trainsets"] and "KRISHNA" in res["selected_trainsets"]
+
+def test_bay_allocation_matches_brute_force_and_feeds_run_optimization(tmp_path):
+    import itertools
+    import numpy as np
+    from backend.optimization.bay_allocation import allocate_bays, bay_position
+    rng = np.random.default_rng(3)
+    for depth in (2, 3):
+        trains = pd.DataFrame({"trainset_id": list("ABCDE"), "location": "Muttom",
+                               "BayPositionID": rng.integers(1, 7, size=5)})
+        order = ["C", "A", "E"]
+        res = allocate_bays(trains, {"Muttom": 6}, order, line_depth=depth)
+        assert res["status"] == "optimal" and not res["unplaced"]
+        ranks = [order.index(t) + 1 if t in order else 99 for t in trains["trainset_id"]]
+        best = np.inf
+        for bays in itertools.permutations(range(1, 7), 5):
+            lines = {}
+            for rank, bay in zip(ranks, bays):
+                line, position = bay_position(bay, depth)
+                lines.setdefault(line, {})[position] = rank
+            if any(sorted(line) != list(range(depth - len(line), depth)) for line in lines.values()):
+                continue  # trains must stand against the buffer end
+            moves = sum(line[p] > min(line[q] for q in line if q > p) for line in lines.values() for p in line if p < depth - 1)
+            best = min(best, moves + sum(b != c for b, c in zip(bays, trains["BayPositionID"])))
+        assert res["relocations"] + res["morning_moves"] == best
+        assert res["assignments"]["bay"].is_unique
+    p = tmp_path / "trainsets.csv"
+    pd.DataFrame({"trainset_id": [f"TS{i}" for i in range(6)], "mileage_km": [20000 + 300 * i for i in range(6)],
+                  "certificate_valid": 1, "location": ["Muttom"] * 4 + ["Kalamassery"] * 2,
+                  "BayPositionID": [1, 2, 3, 4, 1, 2]}).to_csv(p, index=False)
+    pd.DataFrame({"location": ["Muttom", "Kalamassery"], "capacity": [4, 4]}).to_csv(
+        tmp_path / "depot_capacities.csv", index=False)
+    res = run_optimization(str(p), min_peak_trainsets=3, plan_bays=True)
+    plan = res["bay_plan"]["assignments"]
+    assert sorted(plan["trainset_id"]) == [f"TS{i}" for i in range(6)]
+    assert plan.groupby("depot")["bay"].apply(lambda b: b.is_unique).all()
+    assert res["bay_plan"]["status"] == "optimal" and not res["bay_plan"]["unplaced"]
+
+def test_night_slots_respect_bay_capacity_and_hold_trains_from_induction(tmp_path):
+    from backend.optimization.night_slots import plan_night_shift
+    ids = ["KRISHNA", "TAPTI", "NILA", "SARAYU", "ARUTH"]
+    trainsets = tmp_path / "trainsets.csv"
+    pd.DataFrame({"trainset_id": ids, "mileage_km": [20000, 20500, 21000, 21500, 22000],
+                  "certificate_valid": 1}).to_csv(trainsets, index=False)
+    train_data = tmp_path / "kmrl_train_data.csv"
+    pd.DataFrame({"TrainID": ids, "CleaningRequired": [True, True, True, False, True],
+                  "CleaningPriority": ["High", "High", "High", "Normal", "Normal"],
+                  "PendingInspections": [0, 1, 0, 3, 0]}).to_csv(train_data, index=False)
+    res = plan_night_shift(str(trainsets), str(train_data), min_peak_trainsets=2,
+                           cleaning_bays=1, inspection_bays=1, window_hours=4)
+    slots = res["slots"]
+    done = slots[slots["scheduled"]]
+    for kind in ("cleaning", "inspection"):
+        spans = done[done["job"] == kind]
+        for slot in range(8):
+            assert ((spans["start_slot"] <= slot) & (slot < spans["start_slot"] + spans["minutes"] // 30)).sum() <= 1
+    assert res["held_inspection"] == ["SARAYU"]  # 4.5 h of inspections cannot fit a 4 h window
+    assert len(res["held_cleaning"]) == 1 and res["held_cleaning"][0] in {"KRISHNA", "TAPTI", "NILA"}
+    held = set(res["held_cleaning"] + res["held_inspection"])
+    assert not held & set(res["selected_trainsets"])
+    summary = res["night_shift_summary"]
+    assert summary["held_cleaning"] == 1 and summary["held_inspection"] == 1
+    assert summary["service_released"] + summary["held_standby"] + 2 == summary["total_trains"]
+    res = run_optimization(str(trainsets), min_peak_trainsets=2, train_data_csv=str(train_data), plan_night_slots=True,
+                           night_slot_options={"cleaning_bays": 1, "inspection_bays": 1, "window_hours": 4})
+    assert res["night_slots"]["held_inspection"] == ["SARAYU"] and "SARAYU" not in res["selected_trainsets"]
+
+def test_night_jobs_default_missing_columns_to_no_job():
+    from backend.optimization.night_slots import night_jobs
+    trains = pd.DataFrame({"TrainID": ["KRISHNA", "TAPTI"], "CleaningRequired": [True, False]})
+    jobs = night_jobs(trains)
+    assert jobs["job"].tolist() == ["cleaning"] and not jobs["mandatory"].any()
+    assert night_jobs(trains[["TrainID"]]).empty
+    with pytest.raises(ValueError):
+        night_jobs(trains.rename(columns={"TrainID": "id"}))